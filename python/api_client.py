@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import instrumentation
+
+try:
+    import msgpack # Optional (pip install msgpack): compact binary list responses
+except ImportError:
+    msgpack = None
+
+API_BASE_URL = os.environ.get("COMMAND_MANAGER_API", "http://localhost:3030")
+
+POOL_SIZE = 8          # Keep-alive connections per host; at least TaskRunner's worker count
+GET_RETRIES = 3        # Retries for idempotent GETs (connection errors and 502/503/504)
+RETRY_BACKOFF = 0.3    # Seconds; doubles between retries
+DEFAULT_TIMEOUT = (3.05, 5)  # (connect, read) seconds
+FIRST_PAGE_SIZE = 100  # Items in the first page of a paged list (login payload or full reload): about a screenful
+PAGE_SIZE = 1000       # Items per later page (the server caps pages at 1000)
+MSGPACK_TYPE = "application/msgpack"
+# Preferred response formats; the server falls back to JSON when it cannot send MessagePack
+ACCEPT = f"{MSGPACK_TYPE}, application/json;q=0.9" if msgpack else "application/json"
+COMPRESS_MIN_BYTES = 1024 # Request bodies at least this large are gzipped on the bulk routes
+GZIP_LEVEL = 6         # Most of gzip -9's size at a fraction of its time
+# Bulk routes whose request bodies are sent gzipped (the server inflates them)
+COMPRESSED_ENDPOINTS = frozenset({"/commands/import", "/devices/import", "/commands/bulk-update", "/devices/bulk-update"})
+# Per-endpoint overrides; bulk routes get a longer read timeout
+ENDPOINT_TIMEOUTS = {
+    "/commands/import": (3.05, 60),
+    "/devices/import": (3.05, 60),
+}
+
+def decode_body(resp):
+    """Decodes a response body as MessagePack or JSON, following its Content-Type."""
+    if msgpack is not None and resp.headers.get("Content-Type", "").split(";")[0].strip() == MSGPACK_TYPE:
+        return msgpack.unpackb(resp.content)
+    return resp.json()
+
+
+# ---------------- API CLIENT ---------------- #
+class ApiClient:
+    """Shared HTTP client for the Command Manager REST API.
+
+    A single requests.Session keeps TCP/TLS connections alive between calls, so
+    the login screen and the main app reuse the same pool. The access token is
+    sent in the x-access-token header once set. Responses arrive compressed and, when
+    msgpack is installed, as MessagePack (see decode_body); large bodies to the bulk
+    routes are sent gzipped.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, token=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+        retry = Retry(
+            total=GET_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": ACCEPT, "Connection": "keep-alive"})
+
+        self.token = None
+        self.set_token(token)
+
+    def set_token(self, token):
+        """Sets (or clears) the token sent with every request."""
+        self.token = token
+        if token:
+            self.session.headers["x-access-token"] = token
+        else:
+            self.session.headers.pop("x-access-token", None)
+
+    def request(self, method, endpoint, **kwargs):
+        """Sends a request and returns the raw Response. Raises RequestException on transport errors."""
+        kwargs.setdefault("timeout", ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        with instrumentation.span(f"network {method} {endpoint}") as span:
+            resp = self.session.request(method, f"{self.base_url}{endpoint}", **kwargs)
+            if instrumentation.enabled:
+                span.size = len(resp.content) # Reads the body, so the transfer counts as network time
+        return resp
+
+    def _decode(self, resp, endpoint):
+        with instrumentation.span(f"decode {endpoint}", len(resp.content) if instrumentation.enabled else None):
+            return decode_body(resp)
+
+    def get_json(self, endpoint, params=None):
+        """GETs an endpoint and returns the decoded JSON body. Raises RequestException on failure."""
+        resp = self.request("GET", endpoint, params=params)
+        resp.raise_for_status()
+        return self._decode(resp, endpoint)
+
+    def get_page(self, endpoint, limit, after=None, sort=None):
+        """GETs one page of a list (cursor pagination). The body carries the page, "revision" and "next" (None on the last page)."""
+        params = {"limit": limit}
+        if after:
+            params["after"] = after
+        if sort:
+            params["sort"] = sort
+        return self.get_json(endpoint, params)
+
+    def get_conditional(self, endpoint, etag=None, params=None):
+        """GETs an endpoint with If-None-Match. Returns (body, etag); body is None on 304 Not Modified."""
+        headers = {"If-None-Match": etag} if etag else None
+        resp = self.request("GET", endpoint, params=params, headers=headers)
+        if resp.status_code == 304:
+            return None, etag
+        resp.raise_for_status()
+        return self._decode(resp, endpoint), resp.headers.get("ETag")
+
+    def stream(self, endpoint, params=None, read_timeout=None):
+        """Opens a streaming GET (the /events change feed) and returns the Response for the caller to iterate
+        and close. Not instrumented: the body only ends when the connection does."""
+        resp = self.session.get(f"{self.base_url}{endpoint}", params=params, stream=True,
+                                timeout=(DEFAULT_TIMEOUT[0], read_timeout), headers={"Accept": "text/event-stream"})
+        try:
+            resp.raise_for_status()
+        except requests.HTTPError:
+            resp.close()
+            raise
+        return resp
+
+    def send_json(self, method, endpoint, data):
+        """Sends a JSON body (POST/PUT/DELETE) and returns the decoded JSON body. Raises RequestException on failure."""
+        kwargs = {"json": data}
+        if endpoint in COMPRESSED_ENDPOINTS:
+            body = json.dumps(data, separators=(",", ":")).encode()
+            if len(body) >= COMPRESS_MIN_BYTES:
+                kwargs = {"data": gzip.compress(body, GZIP_LEVEL),
+                          "headers": {"Content-Type": "application/json", "Content-Encoding": "gzip"}}
+        resp = self.request(method, endpoint, **kwargs)
+        resp.raise_for_status()
+        return self._decode(resp, endpoint)
+
+    def close(self):
+        self.session.close()
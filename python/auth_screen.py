@@ -1,11 +1,12 @@
-import requests
+import threading
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from tkinter import messagebox
-# Ensure this import path is correct for your setup
-from command_manager import CommandManagerApp 
+from task_runner import TaskRunner
+from local_cache import open_cache
+import startup
 
-API_BASE_URL = "http://localhost:3030"
+PREWARM_DELAY_MS = 50 # Let the login window paint before loading the HTTP stack and main app in the background
 
 # ---------------- AUTH SCREEN ---------------- #
 class AuthScreen:
@@ -14,11 +15,20 @@ class AuthScreen:
     def __init__(self):
         self.root = ttk.Window(themename="flatly")
         self.root.title("Terminal Command Manager")
-        self.root.geometry("450x350")
+        self.root.geometry("450x380")
         self.root.resizable(False, False) # Fixed size for card layout
 
         self.username_var = ttk.StringVar()
         self.password_var = ttk.StringVar()
+        self.status_var = ttk.StringVar()
+        # Login/signup requests run off the main thread so the window keeps repainting
+        self.runner = TaskRunner(self.root, on_busy_change=self._set_busy)
+        # One pooled client for the whole session; the main app inherits it after login.
+        # Created lazily: importing requests costs about as much as the window itself.
+        self._api = None
+        self._api_lock = threading.Lock()
+        # Last known data per user, for instant (and offline) starts
+        self.cache = open_cache()
         
         # --- Centered Card Layout ---
         main_frame = ttk.Frame(self.root, padding=20, borderwidth=1, relief="solid")
@@ -39,11 +49,42 @@ class AuthScreen:
         btn_frame = ttk.Frame(main_frame)
         btn_frame.pack(fill="x")
 
-        ttk.Button(btn_frame, text="Login", bootstyle="success", command=self.authenticate).pack(side="left", fill="x", expand=True, padx=(0, 5))
-        ttk.Button(btn_frame, text="Sign Up", bootstyle="info-outline", command=self.sign_up).pack(side="right", fill="x", expand=True, padx=(5, 0))
-        
+        self.login_btn = ttk.Button(btn_frame, text="Login", bootstyle="success", command=self.authenticate)
+        self.login_btn.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.signup_btn = ttk.Button(btn_frame, text="Sign Up", bootstyle="info-outline", command=self.sign_up)
+        self.signup_btn.pack(side="right", fill="x", expand=True, padx=(5, 0))
+
+        # Resume the last session straight from the local cache, without a network round trip
+        self.resume_btn = None
+        session = self.cache.last_session() if self.cache else None
+        if session and self._cached_data(*session):
+            self.root.geometry("450x420")
+            self.resume_btn = ttk.Button(main_frame, text=f"Resume as {session[0]}", bootstyle="secondary-outline",
+                                         command=lambda: self._resume(*session))
+            self.resume_btn.pack(fill="x", pady=(10, 0))
+
+        # Busy indicator
+        ttk.Label(main_frame, textvariable=self.status_var, bootstyle="secondary").pack(pady=(10, 0))
+
+        self.root.after_idle(lambda: startup.mark("login window shown"))
+        self.root.after(PREWARM_DELAY_MS, lambda: self.runner.submit(self._prewarm))
         self.root.mainloop()
 
+    @property
+    def api(self):
+        """The shared ApiClient, created (and requests imported) on first use."""
+        with self._api_lock:
+            if self._api is None:
+                from api_client import ApiClient
+                self._api = ApiClient()
+            return self._api
+
+    def _prewarm(self):
+        """Runs on a worker thread while the user types: loads the HTTP client and the main app module."""
+        self.api  # Creates the client (imports requests)
+        import command_manager
+        startup.mark("background imports done")
+
     def _validate_input(self, action="Login"):
         """Helper to validate username and password presence."""
         username = self.username_var.get()
@@ -54,66 +95,131 @@ class AuthScreen:
             return None, None
         return username, password
 
+    def _set_busy(self, busy):
+        """Disables the buttons and shows a status line while a request is in flight."""
+        state = "disabled" if busy else "normal"
+        self.login_btn.configure(state=state)
+        self.signup_btn.configure(state=state)
+        if self.resume_btn:
+            self.resume_btn.configure(state=state)
+        self.status_var.set("Contacting server..." if busy else "")
+
+    def _post(self, endpoint, username, password, **extra):
+        """Blocking POST of the credentials (plus any extra fields); runs on a worker thread. Returns (status_code, body)."""
+        from api_client import decode_body
+        resp = self.api.request("POST", endpoint, json={"username": username, "password": password, **extra})
+        return resp.status_code, decode_body(resp)
+
+    def _login(self, username, password):
+        """POST /login asking for only the first page of each list; the app streams in the rest."""
+        from api_client import FIRST_PAGE_SIZE
+        return self._post("/login", username, password, pageSize=FIRST_PAGE_SIZE)
+
+    def _connection_error(self, e):
+        messagebox.showerror("Error", f"Server error or connection failed: {e}")
+
     def authenticate(self):
         """Attempts to authenticate the user against the server."""
         username, password = self._validate_input("Login")
         if not username: return
-        
-        try:
-            resp = requests.post(
-                f"{API_BASE_URL}/login",
-                json={"username": username, "password": password},
-                timeout=5
-            )
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("success"):
-                    self._transition_to_app(data, username)
-                    return
-                else:
-                    messagebox.showerror("Login Failed", "Invalid username or password")
+
+        self.runner.submit(lambda: self._login(username, password),
+                           on_success=lambda result: self._on_login(result, username),
+                           on_error=lambda e: self._on_login_error(e, username))
+
+    def _on_login_error(self, e, username):
+        """Offers the cached data when the server cannot be reached."""
+        token = self.cache.load_session(username) if self.cache else None
+        from requests.exceptions import ConnectionError
+        if (isinstance(e, ConnectionError) and token and self._cached_data(username, token)
+                and messagebox.askyesno("Server Unreachable",
+                                        f"Could not reach the server.\nOpen the last cached data for '{username}' offline?")):
+            self._resume(username, token)
+            return
+        self._connection_error(e)
+
+    def _on_login(self, result, username):
+        status_code, data = result
+        startup.mark("login response")
+        if status_code == 200:
+            if data.get("success"):
+                self._transition_to_app(data, username)
+                return
             else:
-                 messagebox.showerror("Login Failed", f"Authentication failed with status code {resp.status_code}")
-                 
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Server error or connection failed: {e}")
+                messagebox.showerror("Login Failed", "Invalid username or password")
+        else:
+             messagebox.showerror("Login Failed", f"Authentication failed with status code {status_code}")
 
     def sign_up(self):
         """Attempts to register a new user against the server."""
         username, password = self._validate_input("Sign Up")
         if not username: return
 
-        try:
-            resp = requests.post(
-                f"{API_BASE_URL}/signup",
-                json={"username": username, "password": password},
-                timeout=5
-            )
+        self.runner.submit(lambda: self._post("/signup", username, password),
+                           on_success=lambda result: self._on_sign_up(result, username),
+                           on_error=self._connection_error)
 
-            data = resp.json()
-            if resp.status_code == 201 and data.get("success"):
-                messagebox.showinfo("Success", "Registration successful! You are now logged in.")
-                self._transition_to_app(data, username)
-            elif resp.status_code == 409:
-                messagebox.showwarning("Registration Failed", "Username already taken.")
-            elif data.get("message"):
-                messagebox.showerror("Registration Failed", data["message"])
-            else:
-                messagebox.showerror("Registration Failed", f"Registration failed with status code {resp.status_code}")
+    def _on_sign_up(self, result, username):
+        status_code, data = result
+        if status_code == 201 and data.get("success"):
+            messagebox.showinfo("Success", "Registration successful! You are now logged in.")
+            self._transition_to_app(data, username)
+        elif status_code == 409:
+            messagebox.showwarning("Registration Failed", "Username already taken.")
+        elif data.get("message"):
+            messagebox.showerror("Registration Failed", data["message"])
+        else:
+            messagebox.showerror("Registration Failed", f"Registration failed with status code {status_code}")
+
+    def _cached_data(self, username, token):
+        """Builds a login-shaped payload from the local cache, or returns None if nothing is cached."""
+        commands = self.cache.load_snapshot(username, "commands")
+        devices = self.cache.load_snapshot(username, "devices")
+        if not commands and not devices:
+            return None
+        commands = commands or {"items": [], "revision": None, "etag": None}
+        devices = devices or {"items": [], "revision": None, "etag": None}
+        return {
+            "token": token,
+            "commands": commands["items"],
+            "devices": devices["items"],
+            "revisions": {"commands": commands["revision"], "devices": devices["revision"]},
+            "etags": {"commands": commands["etag"], "devices": devices["etag"]},
+        }
+
+    def _resume(self, username, token):
+        """Opens the app from the cached snapshot; it revalidates against the server in the background."""
+        self._transition_to_app(self._cached_data(username, token), username, fresh=False)
+
+    def _remember(self, data, username):
+        """Saves the session token and the login payload's complete lists to the local cache."""
+        revisions = data.get("revisions") or {}
+        cursors = data.get("cursors") or {}
+        self.cache.save_session(username, data.get("token"))
+        for kind in ("commands", "devices"):
+            if cursors.get(kind):
+                continue # Only a first page; the app caches the list once the rest has loaded
+            self.cache.save_snapshot(username, kind, data.get(kind, []), revisions.get(kind))
 
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Error", f"Server error or connection failed: {e}")
+    def _transition_to_app(self, data, username, fresh=True):
+        """Helper to clear the screen and launch the main application.
 
-    def _transition_to_app(self, data, username):
-        """Helper to clear the screen and launch the main application."""
+        A fresh login payload already carries both lists, so the app paints them
+        directly and skips the initial server refresh; a cached resume revalidates.
+        """
+        from command_manager import CommandManagerApp
         token = data.get("token")
         commands = data.get("commands", [])
         devices = data.get("devices", [])
+        if fresh and self.cache and token:
+            self.runner.submit(lambda: self._remember(data, username))
         
         # Clear the current screen widgets
         for widget in self.root.winfo_children():
             widget.destroy()
             
         # Transition to the main application
-        CommandManagerApp(self.root, commands, devices, token, username)
\ No newline at end of file
+        self.api.set_token(token)
+        CommandManagerApp(self.root, commands, devices, token, username, runner=self.runner, api=self.api,
+                          revisions=data.get("revisions"), etags=data.get("etags"), cache=self.cache,
+                          revalidate=not fresh, cursors=data.get("cursors"))
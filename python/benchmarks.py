@@ -0,0 +1,451 @@
+"""Benchmarks for the client hot paths, run against an in-process stub of the REST API.
+
+    python benchmarks.py [--sizes 1000 10000 100000] [--latency-ms 20] [--bandwidth-mbps 10] [--repeat 5]
+                         [--output results.json] [--baseline previous.json]
+
+UI benchmarks (table refresh, per-keystroke filtering, login to first render) need a
+display; without one, Xvfb is started if it is installed, otherwise they are skipped.
+Results are written as JSON; with --baseline, medians are compared and the exit
+status is 1 if anything got slower than --threshold times its baseline.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from api_client import COMPRESS_MIN_BYTES, FIRST_PAGE_SIZE, GZIP_LEVEL, MSGPACK_TYPE, ApiClient, msgpack
+from exporter import export_records
+from importer import import_records, command_record
+from search_index import SearchIndex
+import reachability
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+REACHABILITY_HOSTS = 2000 # Loopback addresses probed per sweep (Linux routes all of 127/8 to lo)
+KEYSTROKES = ["e", "ec", "ech", "echo", "echo ", "echo 4", "echo 42"] # One filter pass per prefix
+REGRESSION_THRESHOLD = 1.25 # Median slower than this multiple of the baseline counts as a regression
+
+
+def make_commands(n):
+    return [{"id": i, "command": f"echo {i} host-{i % 97}", "description": f"Say {i} on node {i % 13}",
+             "last_used": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}"} for i in range(1, n + 1)]
+
+
+def make_devices(n):
+    return [{"id": str(i), "device": f"device-{i}", "ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"}
+            for i in range(1, n + 1)]
+
+
+# ---------------- STUB SERVER ---------------- #
+class StubApi:
+    """Minimal stand-in for the Express API: login, list (whole or paged), and import routes, with added latency.
+
+    Page cursors are plain offsets into the list, which is enough for lists that do
+    not change while a benchmark walks them. Like the real server it sends MessagePack
+    and gzip when the request accepts them, accepts gzipped request bodies, and counts
+    the response bytes it writes.
+    """
+
+    def __init__(self, latency_ms=0, bandwidth_mbps=None):
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_mbps and bandwidth_mbps * 1e6 / 8 # Bytes per second; None for loopback speed
+        self.data = {"commands": [], "devices": []}
+        self.revisions = {"commands": 1, "devices": 1}
+        self._lock = threading.Lock()
+        self.bytes_sent = 0 # Response body bytes, as sent on the wire
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def load(self, commands=None, devices=None):
+        """Replaces the server's lists (a new revision each time)."""
+        with self._lock:
+            for kind, items in (("commands", commands), ("devices", devices)):
+                if items is not None:
+                    self.data[kind] = items
+                    self.revisions[kind] += 1
+
+    @staticmethod
+    def encode(body, accept="", accept_encoding=""):
+        """Returns (payload, headers) for a response body, negotiated like the server's wireFormat.js."""
+        if msgpack and MSGPACK_TYPE in accept:
+            payload, headers = msgpack.packb(body), {"Content-Type": MSGPACK_TYPE}
+        else:
+            payload, headers = json.dumps(body, separators=(",", ":")).encode(), {"Content-Type": "application/json"}
+        if len(payload) >= COMPRESS_MIN_BYTES and "gzip" in accept_encoding:
+            payload, headers["Content-Encoding"] = gzip.compress(payload, GZIP_LEVEL), "gzip"
+        return payload, headers
+
+    @staticmethod
+    def page(kind, items, start, limit):
+        end = start + limit
+        return {kind: items[start:end], "next": str(end) if end < len(items) else None}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real server
+            disable_nagle_algorithm = True # Small bodies would otherwise wait on delayed ACKs
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=None, etag=None):
+                payload, headers = (b"", {}) if body is None else stub.encode(
+                    body, self.headers.get("Accept", ""), self.headers.get("Accept-Encoding", ""))
+                with stub._lock:
+                    stub.bytes_sent += len(payload)
+                if stub.bandwidth:
+                    time.sleep(len(payload) / stub.bandwidth) # Time the body takes on a link that slow
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(payload)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                time.sleep(stub.latency)
+                url = urlsplit(self.path)
+                kind, query = url.path.strip("/"), parse_qs(url.query)
+                if kind not in stub.data:
+                    return self._send(404, {"success": False})
+                with stub._lock:
+                    rev, items = stub.revisions[kind], stub.data[kind]
+                if "limit" in query:
+                    limit, start = int(query["limit"][0]), int(query.get("after", ["0"])[0])
+                    return self._send(200, {"success": True, "revision": rev, **stub.page(kind, items, start, limit)})
+                etag = f'W/"{kind}-{rev}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, etag=etag)
+                self._send(200, {"success": True, "revision": rev, kind: items}, etag)
+
+            def do_POST(self):
+                time.sleep(stub.latency)
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    raw = gzip.decompress(raw)
+                body = json.loads(raw or b"{}")
+                if self.path == "/login":
+                    with stub._lock:
+                        data, revisions = dict(stub.data), dict(stub.revisions)
+                    response = {"success": True, "token": "bench", **data, "revisions": revisions}
+                    if body.get("pageSize"):
+                        pages = {kind: stub.page(kind, items, 0, body["pageSize"]) for kind, items in data.items()}
+                        response.update({kind: p[kind] for kind, p in pages.items()})
+                        response["cursors"] = {kind: p["next"] for kind, p in pages.items()}
+                    return self._send(200, response)
+                kind = self.path.split("/")[1]
+                if self.path.endswith("/import") and kind in stub.data:
+                    with stub._lock:
+                        stub.data[kind] = stub.data[kind] + body.get(kind, [])
+                        stub.revisions[kind] += 1
+                    return self._send(200, {"success": True, "message": "imported", "duplicates": [], "errors": []})
+                self._send(404, {"success": False})
+
+        return Handler
+
+
+# ---------------- HARNESS ---------------- #
+def measure(fn, repeat):
+    """Runs fn repeat times; returns timing stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples), "max_ms": max(samples),
+            "samples": len(samples)}
+
+
+def ensure_display():
+    """Returns (available, xvfb_process). Starts Xvfb when there is no display but it is installed."""
+    if sys.platform != "linux" or os.environ.get("DISPLAY"):
+        return True, None
+    if not shutil.which("Xvfb"):
+        return False, None
+    display = ":%d" % (90 + os.getpid() % 100)
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x800x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5) # Give the server a moment to accept connections
+    return proc.poll() is None, proc
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# --- HEADLESS BENCHMARKS ---
+
+def bench_search(results, sizes, repeat):
+    """Index build time and per-keystroke query time, without the Treeview."""
+    for n in sizes:
+        records = make_commands(n)
+        index = SearchIndex(["command", "description", "last_used"])
+        results[f"search_index_build/{n}"] = measure(lambda: index.build(records), max(1, repeat // 2))
+        for field in ("command", None):
+            label = field or "any"
+            results[f"search_keystrokes/{label}/{n}"] = measure(
+                lambda: [index.search(q, field) for q in KEYSTROKES], repeat)
+
+
+def bench_export_import(results, sizes, repeat, stub):
+    """Export to NDJSON / gzipped JSON, and streaming import into the stub, as records per second."""
+    api = ApiClient(stub.url, token="bench")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            records = make_commands(n)
+            for name in ("export.ndjson", "export.json.gz"):
+                path = os.path.join(tmp, name)
+                stats = measure(lambda: export_records(path, records, ["id", "command"]), repeat)
+                stats["records_per_s"] = n / (stats["median_ms"] / 1000)
+                stats["bytes"] = os.path.getsize(path)
+                results[f"export/{name.split('.', 1)[1]}/{n}"] = stats
+
+            path = os.path.join(tmp, "export.ndjson")
+
+            def upload(batch):
+                resp = api.send_json("POST", "/commands/import", {"commands": batch})
+                return resp.get("success"), resp.get("message")
+
+            def run_import():
+                stub.load(commands=[])
+                report = import_records(path, command_record, upload)
+                assert report.imported == n, report.summary()
+
+            stats = measure(run_import, max(1, repeat // 2))
+            stats["records_per_s"] = n / (stats["median_ms"] / 1000)
+            results[f"import/ndjson/{n}"] = stats
+    api.close()
+
+
+def bench_reachability(results, repeat):
+    """Full reachability sweep of REACHABILITY_HOSTS devices against a local listening socket."""
+    if not sys.platform.startswith("linux"):
+        print("Reachability benchmark needs Linux loopback aliases: skipped.", file=sys.stderr)
+        return
+    hosts = [f"127.{i // 62500}.{i // 250 % 250}.{i % 250 + 1}" for i in range(REACHABILITY_HOSTS)]
+    with socket.create_server(("", 0), backlog=1024) as server:
+        port = server.getsockname()[1]
+
+        def accept():
+            # Keep the backlog empty across repeats
+            while True:
+                try:
+                    server.accept()[0].close()
+                except OSError:
+                    return
+
+        threading.Thread(target=accept, daemon=True).start()
+
+        def run():
+            found = reachability.sweep(hosts, ports=(port,))
+            assert all(s.state == "up" for s in found.values()), "unexpected probe failure"
+
+        stats = measure(run, repeat)
+    stats["hosts_per_s"] = REACHABILITY_HOSTS / (stats["median_ms"] / 1000)
+    results[f"reachability_sweep/{REACHABILITY_HOSTS}"] = stats
+
+
+def bench_wire_formats(results, sizes, repeat, stub):
+    """Bytes on the wire, fetch time and decode time of a whole list in each response format the client can take."""
+    formats = {"json": ("application/json", "identity"), "json+gzip": ("application/json", "gzip")}
+    if msgpack:
+        formats.update({"msgpack": (MSGPACK_TYPE, "identity"), "msgpack+gzip": (MSGPACK_TYPE, "gzip")})
+    for n in sizes:
+        stub.load(commands=make_commands(n))
+        for name, (accept, encoding) in formats.items():
+            api = ApiClient(stub.url)
+            api.session.headers.update({"Accept": accept, "Accept-Encoding": encoding})
+            before = stub.bytes_sent
+            api.get_json("/commands")
+            wire_bytes = stub.bytes_sent - before
+            stats = measure(lambda: api.get_json("/commands"), repeat)
+            stats["bytes"] = wire_bytes
+            results[f"wire_fetch/{name}/commands/{n}"] = stats
+
+            # Decoding alone: decompress + parse of the body as received
+            payload, headers = stub.encode({"success": True, "commands": stub.data["commands"]}, accept, encoding)
+            compressed = headers.get("Content-Encoding") == "gzip"
+            loads = msgpack.unpackb if accept == MSGPACK_TYPE else json.loads
+            results[f"wire_decode/{name}/commands/{n}"] = measure(
+                lambda: loads(gzip.decompress(payload) if compressed else payload), repeat)
+            api.close()
+
+
+# --- UI BENCHMARKS ---
+
+def bench_pages(results, sizes, repeat, stub):
+    """Fetch and decode time of a whole list against its first page (what a paged load paints first)."""
+    api = ApiClient(stub.url)
+    for n in sizes:
+        stub.load(commands=make_commands(n))
+        results[f"list_full/commands/{n}"] = measure(lambda: api.get_json("/commands"), repeat)
+        results[f"list_first_page/commands/{n}"] = measure(lambda: api.get_page("/commands", FIRST_PAGE_SIZE), repeat)
+    api.close()
+
+
+def _new_app(stub, commands=(), devices=()):
+    from tkinter import Tk
+    from command_manager import CommandManagerApp
+    root = Tk()
+    api = ApiClient(stub.url, token="bench")
+    app = CommandManagerApp(root, list(commands), list(devices), "bench", "bench", api=api, revalidate=False,
+                            reachability_ms=0, live_updates=False)
+    root.update_idletasks()
+    return app
+
+
+def _close_app(app):
+    app.runner.shutdown()
+    app.api.close()
+    app.root.destroy()
+
+
+def bench_ui(results, sizes, repeat, stub):
+    for n in sizes:
+        stub.load(commands=make_commands(n), devices=make_devices(n))
+
+        # Login to first render: POST /login, build the main window, paint the tables
+        def login_to_first_render():
+            api = ApiClient(stub.url)
+            data = api.send_json("POST", "/login", {"username": "bench", "password": "bench"})
+            api.close()
+            _close_app(_new_app(stub, data["commands"], data["devices"]))
+
+        results[f"login_to_first_render/{n}"] = measure(login_to_first_render, max(1, repeat // 2))
+
+        app = _new_app(stub)
+        for kind, refresh in (("commands", app.refresh_commands_table), ("devices", app.refresh_devices_table)):
+            def full_refresh():
+                # Forget the local copy so every pass transfers, merges, indexes and renders the whole list
+                app.revisions[kind], app._etags[kind] = None, None
+                refresh()
+                app.runner.drain(timeout=300)
+                app.root.update_idletasks()
+
+            results[f"refresh/{kind}/{n}"] = measure(full_refresh, repeat)
+
+            def unchanged_refresh():
+                refresh()
+                app.runner.drain(timeout=300)
+                app.root.update_idletasks()
+
+            results[f"refresh_unchanged/{kind}/{n}"] = measure(unchanged_refresh, repeat)
+
+        app.cmd_filter_var.set("any")
+        per_key = []
+        for _ in range(repeat):
+            for query in KEYSTROKES + [""]:
+                start = time.perf_counter()
+                app.cmd_search_var.set(query)
+                app._run_filter("commands", app.render_commands_table)
+                app.root.update_idletasks()
+                per_key.append((time.perf_counter() - start) * 1000)
+        results[f"filter_keystroke/commands/{n}"] = {
+            "median_ms": statistics.median(per_key), "min_ms": min(per_key), "max_ms": max(per_key),
+            "samples": len(per_key)}
+        _close_app(app)
+
+
+# --- REPORTING ---
+
+def compare(results, baseline, threshold):
+    """Prints median changes against a baseline run; returns the names that regressed."""
+    regressed = []
+    print(f"\n{'benchmark':<40}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, stats in sorted(results.items()):
+        old = baseline.get(name)
+        if not old or not old.get("median_ms"):
+            continue
+        ratio = stats["median_ms"] / old["median_ms"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<40}{old['median_ms']:>12.2f}{stats['median_ms']:>12.2f}{ratio:>8.2f}{flag}")
+        if flag:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay the stub server adds to every request")
+    parser.add_argument("--bandwidth-mbps", type=float, help="Link speed the stub server's responses are paced to")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Results file (default: benchmark_results/<timestamp>-<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--no-ui", action="store_true", help="Skip benchmarks that need a display")
+    args = parser.parse_args(argv)
+
+    stub = StubApi(args.latency_ms, args.bandwidth_mbps)
+    results = {}
+    xvfb = None
+    try:
+        bench_search(results, args.sizes, args.repeat)
+        bench_export_import(results, args.sizes, args.repeat, stub)
+        bench_reachability(results, args.repeat)
+        bench_pages(results, args.sizes, args.repeat, stub)
+        bench_wire_formats(results, args.sizes, args.repeat, stub)
+        ui_available, xvfb = (False, None) if args.no_ui else ensure_display()
+        if ui_available:
+            bench_ui(results, args.sizes, args.repeat, stub)
+        elif not args.no_ui:
+            print("No display and no Xvfb: UI benchmarks skipped.", file=sys.stderr)
+    finally:
+        stub.close()
+        if xvfb:
+            xvfb.terminate()
+
+    commit = git_commit()
+    meta = {"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "sizes": args.sizes, "latency_ms": args.latency_ms,
+            "bandwidth_mbps": args.bandwidth_mbps, "repeat": args.repeat,
+            "ui": any(name.startswith("refresh/") for name in results)}
+    output = args.output or os.path.join(
+        "benchmark_results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    for name, stats in sorted(results.items()):
+        size = f"{stats['bytes']:>14,} B" if "bytes" in stats else ""
+        print(f"{name:<40}{stats['median_ms']:>10.2f} ms{size}")
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f)["results"], args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) regressed beyond {args.threshold}x.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
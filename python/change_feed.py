@@ -0,0 +1,146 @@
+import json
+import queue
+import random
+import threading
+import requests
+
+EVENTS_ENDPOINT = "/events"
+READ_TIMEOUT = 60         # Seconds without a byte before the stream counts as dead (the server sends a heartbeat every 25)
+RECONNECT_MIN = 1.0       # Seconds before reconnecting after a drop; doubles per failed attempt
+RECONNECT_MAX = 60.0      # Longest wait between reconnect attempts
+POLL_MS = 250             # How often the main thread picks up received events
+
+
+def parse_events(lines):
+    """Yields (event, data) for each Server-Sent Event in an iterable of decoded lines.
+
+    Comment lines (the server's heartbeats) are skipped; multi-line data is joined with newlines.
+    """
+    event, data = None, []
+    for line in lines:
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event, data = None, []
+        elif not line.startswith(":"):
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+
+
+def _permanent(status_code):
+    """4xx answers (no /events route, bad token) will not change by retrying; 429 will."""
+    return 400 <= status_code < 500 and status_code != 429
+
+
+# ---------------- CHANGE FEED ---------------- #
+class ChangeFeed:
+    """Follows the server's /events stream (Server-Sent Events) on a background thread.
+
+    Each change event, {kind, since, revision, delta, <kind>: items, removed}, is handed to
+    on_change(data) on the Tk main thread. The stream is opened with the revisions that
+    get_revisions() returns at that moment (or newer ones already received), so after a
+    dropped connection the server first sends whatever was missed. Reconnects back off
+    exponentially with jitter; on_state(live) reports the stream going up or down. A 4xx
+    answer (an older server without /events, or a revoked token) stops the feed for good.
+    """
+
+    def __init__(self, root, api, on_change, get_revisions, on_state=None, read_timeout=READ_TIMEOUT):
+        self.root = root
+        self.api = api
+        self.on_change = on_change
+        self.get_revisions = get_revisions
+        self.on_state = on_state
+        self.read_timeout = read_timeout
+        self.live = False # Stream connected (main thread's view)
+
+        self._events = queue.Queue() # ("change", data) / ("state", live) from the feed thread
+        self._stop = threading.Event()
+        self._thread = None
+        self._poll_job = None
+        self._response = None
+        self._received = {} # kind -> newest revision received (feed thread), possibly not yet delivered
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+        self._ensure_polling()
+
+    def stop(self):
+        """Closes the stream; the thread exits once its read returns."""
+        self._stop.set()
+        response = self._response
+        if response is not None:
+            response.close()
+
+    def poll(self):
+        """Delivers the events received so far (called on the main thread; tests call it directly)."""
+        while True:
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "change":
+                self.on_change(payload)
+            elif payload != self.live:
+                self.live = payload
+                if self.on_state:
+                    self.on_state(payload)
+        if self._thread is not None and not self._thread.is_alive() and self._events.empty():
+            self._thread = None
+
+    # --- INTERNALS ---
+
+    def _ensure_polling(self):
+        if self._poll_job is None:
+            self._poll_job = self.root.after(POLL_MS, self._on_poll)
+
+    def _on_poll(self):
+        self._poll_job = None
+        self.poll()
+        if self.running:
+            self._ensure_polling()
+
+    def _params(self):
+        """Revisions to resume from: the app's, or newer ones received but still waiting for the main thread."""
+        params = {}
+        for kind, rev in self.get_revisions().items():
+            known = [r for r in (rev, self._received.get(kind)) if r is not None]
+            if known:
+                params[kind] = max(known)
+        return params
+
+    def _run(self):
+        delay = RECONNECT_MIN
+        while not self._stop.is_set():
+            try:
+                with self.api.stream(EVENTS_ENDPOINT, self._params(), self.read_timeout) as resp:
+                    self._response = resp
+                    self._events.put(("state", True))
+                    delay = RECONNECT_MIN
+                    for event, data in parse_events(resp.iter_lines(decode_unicode=True)):
+                        if event == "change":
+                            change = json.loads(data)
+                            self._received[change.get("kind")] = change.get("revision")
+                            self._events.put(("change", change))
+            except requests.HTTPError as e:
+                if _permanent(e.response.status_code):
+                    break
+            except (requests.RequestException, ValueError, AttributeError):
+                pass # Dropped, timed out or closed by stop(): reconnect unless stopping
+            finally:
+                self._response = None
+            self._events.put(("state", False))
+            self._stop.wait(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, RECONNECT_MAX)
+        self._events.put(("state", False))
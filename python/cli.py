@@ -0,0 +1,356 @@
+# cli.py
+"""Command-line access to the Command Manager data, for terminals and scripts.
+
+Uses the GUI's local cache (session token and last synced lists) and ApiClient,
+without importing tkinter/ttkbootstrap. Lookups read the cache and only go to
+the server with --refresh; requests is imported the first time a command needs it.
+
+    python -m cli login alice
+    python -m cli search commands nginx --format json
+    $(python -m cli print "restart nginx")
+    python -m cli add device web-1 10.0.0.5
+    python -m cli remove commands 12 14
+    python -m cli import devices hosts.ndjson
+    python -m cli export commands backup.csv.gz --refresh
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+from local_cache import open_cache
+from record_store import command_store, device_store
+
+EXIT_OK = 0
+EXIT_ERROR = 1     # API/connection error, nothing cached, or no match
+EXIT_AMBIGUOUS = 3 # `print` matched more than one command
+
+KINDS = {"commands": command_store, "devices": device_store}
+FORMATS = ["tsv", "json", "ndjson"]
+
+
+class CliError(Exception):
+    pass
+
+
+# ---------------- SESSION ---------------- #
+class CliSession:
+    """A user's cached session: the token, the local lists, and an ApiClient created on first use."""
+
+    def __init__(self, cache, username=None):
+        if cache is None:
+            raise CliError("Local cache is unavailable")
+        self.cache = cache
+        if username:
+            token = cache.load_session(username)
+        else:
+            username, token = cache.last_session() or (None, None)
+        if not token:
+            raise CliError(f"Not logged in{f' as {username}' if username else ''}; run `login` first")
+        self.username = username
+        self.token = token
+        self._api = None
+        self._stores = {}
+
+    @property
+    def api(self):
+        if self._api is None:
+            from api_client import ApiClient
+            self._api = ApiClient(token=self.token)
+        return self._api
+
+    def store(self, kind, refresh=False):
+        """The kind's RecordStore, loaded from the cache (and brought up to date first with refresh=True)."""
+        if kind not in self._stores:
+            snapshot = self.cache.load_snapshot(self.username, kind) or {"items": [], "revision": None, "etag": None}
+            self._stores[kind] = (KINDS[kind](snapshot["items"]), snapshot["revision"], snapshot["etag"])
+        if refresh:
+            try:
+                self.sync(kind)
+            except Exception as e:
+                if not _is_connection_error(e):
+                    raise
+                print(f"warning: server unreachable, using cached {kind}", file=sys.stderr)
+        return self._stores[kind][0]
+
+    def sync(self, kind):
+        """Fetches what changed since the cached revision (304 if nothing) and saves the result to the cache."""
+        store, revision, etag = self._stores[kind]
+        params = {"since": revision} if revision is not None else None
+        data, etag = self.api.get_conditional(f"/{kind}", etag, params)
+        if data is None:
+            return
+        if not data.get("success"):
+            raise CliError(data.get("message", f"Failed to fetch {kind}"))
+        store.apply_sync_response(data)
+        self._stores[kind] = (store, data.get("revision"), etag)
+        self.cache.save_snapshot(self.username, kind, store.to_dicts(), data.get("revision"), etag)
+
+    def send(self, method, endpoint, data):
+        """Sends a JSON body and returns the response, raising CliError when the API reports a failure."""
+        response = self.api.send_json(method, endpoint, data)
+        if not response.get("success"):
+            raise CliError(response.get("message", "Operation failed"))
+        return response
+
+
+# ---------------- OUTPUT ---------------- #
+def _fields(kind):
+    from exporter import COMMAND_FIELDS, DEVICE_FIELDS
+    return COMMAND_FIELDS if kind == "commands" else DEVICE_FIELDS
+
+
+def write_records(records, kind, fmt, out=None):
+    """Prints records as TSV (one per line, no header), a JSON array, or NDJSON."""
+    out = out or sys.stdout
+    if fmt == "json":
+        json.dump([r.to_dict() for r in records], out, ensure_ascii=False)
+        out.write("\n")
+    elif fmt == "ndjson":
+        for r in records:
+            out.write(json.dumps(r.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n")
+    else:
+        fields = _fields(kind)
+        for r in records:
+            out.write("\t".join(str(r.get(f, "")).replace("\t", " ").replace("\n", " ") for f in fields) + "\n")
+
+
+def _emit(args, payload):
+    """Prints a command's result: JSON for --format json/ndjson, otherwise its message."""
+    if args.format == "tsv":
+        print(payload.get("message", "OK"))
+    else:
+        print(json.dumps(payload, ensure_ascii=False))
+
+
+# ---------------- COMMANDS ---------------- #
+def cmd_login(args, cache):
+    password = os.environ.get("COMMAND_MANAGER_PASSWORD") or getpass.getpass(f"Password for {args.username}: ")
+    from api_client import ApiClient, decode_body
+    api = ApiClient()
+    resp = api.request("POST", "/login", json={"username": args.username, "password": password})
+    data = decode_body(resp)
+    if resp.status_code != 200 or not data.get("success"):
+        raise CliError(data.get("message", f"Login failed with status code {resp.status_code}"))
+    revisions = data.get("revisions") or {}
+    cache.save_session(args.username, data["token"])
+    for kind in KINDS:
+        cache.save_snapshot(args.username, kind, data.get(kind, []), revisions.get(kind))
+    _emit(args, {"success": True, "message": f"Logged in as {args.username}", "username": args.username,
+                 "commands": len(data.get("commands", [])), "devices": len(data.get("devices", []))})
+
+
+def cmd_logout(args, cache):
+    session = CliSession(cache, args.user)
+    cache.clear_session(session.username)
+    _emit(args, {"success": True, "message": f"Logged out {session.username}"})
+
+
+def cmd_sync(args, cache):
+    session = CliSession(cache, args.user)
+    counts = {kind: len(session.store(kind, refresh=True)) for kind in KINDS}
+    _emit(args, {"success": True, "message": f"{counts['commands']} commands, {counts['devices']} devices", **counts})
+
+
+def cmd_search(args, cache):
+    session = CliSession(cache, args.user)
+    store = session.store(args.kind, refresh=args.refresh)
+    # One query per process: a linear scan beats building the search index first
+    records = store.scan(" ".join(args.query), args.field)
+    write_records(records[:args.limit] if args.limit else records, args.kind, args.format)
+    return EXIT_OK if records else EXIT_ERROR
+
+
+def cmd_print(args, cache):
+    """Prints one command's text, for piping into a shell; matches an id first, then a search."""
+    session = CliSession(cache, args.user)
+    store = session.store("commands", refresh=args.refresh)
+    query = " ".join(args.query)
+    record = store.get(query)
+    matches = [record] if record else store.scan(query)
+    if not matches:
+        print(f"No command matches '{query}'", file=sys.stderr)
+        return EXIT_ERROR
+    if len(matches) > 1 and not args.first:
+        exact = [r for r in matches if r.get("command") == query]
+        if len(exact) != 1:
+            print(f"{len(matches)} commands match '{query}' (use --first or a more specific query):", file=sys.stderr)
+            write_records(matches[:10], "commands", "tsv", sys.stderr)
+            return EXIT_AMBIGUOUS
+        matches = exact
+    print(matches[0].get("command", ""))
+
+
+def cmd_add(args, cache):
+    session = CliSession(cache, args.user)
+    if args.kind == "command":
+        kind, data = "commands", {"command": args.text, "description": args.description}
+    else:
+        kind, data = "devices", {"device": args.name, "ip": args.ip}
+    response = session.send("POST", f"/{kind}/add", data)
+    session.store(kind, refresh=True)
+    _emit(args, response)
+
+
+def cmd_remove(args, cache):
+    session = CliSession(cache, args.user)
+    failed = []
+    for item_id in args.ids:
+        try:
+            session.send("DELETE", f"/{args.kind}/remove", {"id": item_id})
+        except CliError as e:
+            failed.append({"id": item_id, "message": str(e)})
+    session.store(args.kind, refresh=True)
+    removed = len(args.ids) - len(failed)
+    for f in failed:
+        print(f"{f['id']}: {f['message']}", file=sys.stderr)
+    _emit(args, {"success": not failed, "message": f"{removed} {args.kind} removed", "removed": removed, "errors": failed})
+    return EXIT_ERROR if failed else EXIT_OK
+
+
+def cmd_import(args, cache):
+    from importer import import_records, command_record, device_record, device_key
+    session = CliSession(cache, args.user)
+    options = {}
+    if args.kind == "commands":
+        validate = command_record
+
+        def upload(batch):
+            response = session.api.send_json("POST", "/commands/import", {"commands": batch})
+            return response.get("success"), response.get("message")
+    else:
+        validate = device_record
+        options = {"dedupe_key": device_key, "existing": session.store("devices").snapshot()}
+
+        def upload(batch):
+            response = session.api.send_json("POST", "/devices/import", {"devices": batch})
+            errors = [f"{e.get('device') or 'Record'}: {e.get('message', 'rejected')}" for e in response.get("errors", [])]
+            outcome = {"duplicates": len(response.get("duplicates", [])), "errors": errors}
+            return response.get("success"), response.get("message"), outcome
+
+    report = import_records(args.file, validate, upload, **options)
+    if report.imported:
+        session.store(args.kind, refresh=True)
+    ok = not (report.error or report.failed)
+    _emit(args, {"success": ok, "message": report.summary(), "imported": report.imported,
+                 "skipped": report.skipped, "failed": report.failed, "duplicates": report.duplicates})
+    return EXIT_OK if ok else EXIT_ERROR
+
+
+def cmd_export(args, cache):
+    from exporter import export_records
+    session = CliSession(cache, args.user)
+    store = session.store(args.kind, refresh=args.refresh)
+    count = export_records(args.file, store.snapshot(), _fields(args.kind))
+    _emit(args, {"success": True, "message": f"{count} {args.kind} exported", "exported": count})
+
+
+# ---------------- ARGUMENTS ---------------- #
+def build_parser():
+    # Shared options are accepted after the subcommand, where scripts usually put them
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--user", help="cached session to use (default: the most recent login)")
+    common.add_argument("--cache", help="path of the local cache database")
+    common.add_argument("--format", choices=FORMATS, default="tsv", help="output format (default: tsv)")
+    # Same options for nested subcommands ("add command ..."): no defaults, so they do not
+    # overwrite values given before the kind ("add --user bob command ...")
+    nested = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    nested.add_argument("--user", help="cached session to use (default: the most recent login)")
+    nested.add_argument("--cache", help="path of the local cache database")
+    nested.add_argument("--format", choices=FORMATS, help="output format (default: tsv)")
+
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Command Manager from the command line.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("login", help="log in and cache the session and both lists", parents=[common])
+    p.add_argument("username")
+    p.set_defaults(func=cmd_login)
+
+    p = sub.add_parser("logout", help="forget the cached session token", parents=[common])
+    p.set_defaults(func=cmd_logout)
+
+    p = sub.add_parser("sync", help="bring the cached lists up to date with the server", parents=[common])
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("search", help="search cached commands or devices (every term must match)", parents=[common])
+    p.add_argument("kind", choices=KINDS)
+    p.add_argument("query", nargs="*")
+    p.add_argument("--field", help="only match this field (default: any)")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--refresh", action="store_true", help="sync with the server first")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("print", help="print one command's text (by id or search), e.g. for $(...)", parents=[common])
+    p.add_argument("query", nargs="+")
+    p.add_argument("--first", action="store_true", help="take the first match instead of failing when ambiguous")
+    p.add_argument("--refresh", action="store_true", help="sync with the server first")
+    p.set_defaults(func=cmd_print)
+
+    p = sub.add_parser("add", help="add a command or device", parents=[common])
+    add = p.add_subparsers(dest="kind", required=True)
+    a = add.add_parser("command", parents=[nested])
+    a.add_argument("text")
+    a.add_argument("--description", default="")
+    a = add.add_parser("device", parents=[nested])
+    a.add_argument("name")
+    a.add_argument("ip")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("remove", help="remove commands or devices by id", parents=[common])
+    p.add_argument("kind", choices=KINDS)
+    p.add_argument("ids", nargs="+")
+    p.set_defaults(func=cmd_remove)
+
+    p = sub.add_parser("import", help="import a JSON/NDJSON file (optionally gzipped)", parents=[common])
+    p.add_argument("kind", choices=KINDS)
+    p.add_argument("file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="export to JSON, NDJSON or CSV, by file extension (.gz compresses)", parents=[common])
+    p.add_argument("kind", choices=KINDS)
+    p.add_argument("file")
+    p.add_argument("--refresh", action="store_true", help="sync with the server first")
+    p.set_defaults(func=cmd_export)
+    return parser
+
+
+def _is_request_error(e):
+    requests = sys.modules.get("requests") # Only imported once a command has talked to the server
+    return requests is not None and isinstance(e, requests.exceptions.RequestException)
+
+
+def _is_connection_error(e):
+    return _is_request_error(e) and isinstance(e, sys.modules["requests"].exceptions.ConnectionError)
+
+
+def _request_error(e):
+    """The API's message for an HTTP error response, or the exception text."""
+    response = getattr(e, "response", None)
+    try:
+        from api_client import decode_body
+        return decode_body(response)["message"]
+    except Exception:
+        return str(e)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cache = open_cache(args.cache)
+    try:
+        return args.func(args, cache) or EXIT_OK
+    except CliError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except Exception as e:
+        if _is_request_error(e):
+            print(f"error: {_request_error(e)}", file=sys.stderr)
+            return EXIT_ERROR
+        raise
+    finally:
+        if cache:
+            cache.close()
+
+
+# ---------------- START CLI ---------------- #
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,22 +2,73 @@ import ttkbootstrap as ttk
 from ttkbootstrap.dialogs import Messagebox
 from tkinter import filedialog, messagebox 
 from datetime import date
-import json
+import os
 import requests 
 from ttkbootstrap.constants import *
-
-API_BASE_URL = "http://localhost:3030"
+from task_runner import TaskRunner
+from api_client import FIRST_PAGE_SIZE, PAGE_SIZE, ApiClient
+from table_view import TableView
+from record_store import command_store, device_store
+from importer import IMPORT_BATCH_SIZE, import_records, command_record, device_record, device_key
+from exporter import COMMAND_FIELDS, DEVICE_FIELDS, export_records
+from progress_dialog import ProgressDialog
+from mutation_queue import MutationQueue
+import startup
+import instrumentation
+from diagnostics_window import DiagnosticsWindow
+from fanout import default_transport
+from fanout_window import FanoutWindow
+from reachability import RESCAN_INTERVAL_MS, ReachabilityScanner, label as reachability_label
+from change_feed import ChangeFeed
+
+SEARCH_DEBOUNCE_MS = 200   # Quiet period after the last keystroke before the table is re-filtered
+AUTO_REFRESH_MS = 0        # Background server refresh interval; 0 disables it (manual "Refresh Data" only)
+IMPORT_FILETYPES = [("JSON / NDJSON files", "*.json *.ndjson *.jsonl *.gz"), ("All files", "*.*")]
+EXPORT_FILETYPES = [("JSON files", "*.json"), ("NDJSON files", "*.ndjson"), ("CSV files", "*.csv"),
+                    ("Gzipped JSON", "*.json.gz"), ("Gzipped NDJSON", "*.ndjson.gz"), ("Gzipped CSV", "*.csv.gz")]
+PENDING_PREFIX = "pending-" # Id prefix of rows added locally and not yet confirmed by the server
+FLASH_MS = 2500            # How long transient status messages (e.g. "Copied") stay visible
+FEED_LOST_MESSAGE = "Live updates interrupted" # Status while the change feed is down (it keeps reconnecting)
 
 # ---------------- COMMAND MANAGER APP ---------------- #
 class CommandManagerApp:
     """The main application interface for managing commands and devices with persistent storage."""
 
-    def __init__(self, root, commands, devices, token, username):
+    def __init__(self, root, commands, devices, token, username,
+                 search_debounce_ms=SEARCH_DEBOUNCE_MS, auto_refresh_ms=AUTO_REFRESH_MS, runner=None, api=None, revisions=None,
+                 etags=None, cache=None, revalidate=True, reachability_ms=RESCAN_INTERVAL_MS,
+                 transport=None, cursors=None, live_updates=True):
         self.root = root
         self.token = token
-        self.commands = commands
-        self.devices = devices
+        # Typed stores (slotted records + id map + search index) behind self.commands / self.devices
+        self._stores = {"commands": command_store(commands), "devices": device_store(devices)}
         self.username = username
+        self.search_debounce_ms = search_debounce_ms
+        self.auto_refresh_ms = auto_refresh_ms
+        self.reachability_ms = reachability_ms
+        self._filter_jobs = {} # table name -> pending root.after id
+        self._index_builds = set() # Kinds whose search index is being built on a worker
+        self.import_batch_size = IMPORT_BATCH_SIZE
+        self._pending_seq = 0
+        # Shared pooled HTTP client (handed over by the login screen, or our own)
+        self.api = api or ApiClient(token=token)
+        # Server revision/ETag of the local snapshots, so refreshes only transfer what changed
+        self.revisions = {"commands": None, "devices": None, **(revisions or {})}
+        self._etags = dict(etags or {})
+        # Paged loads in progress: kind -> token of the current load (a newer load supersedes it)
+        self._page_loads = {}
+        # Newest revision the change feed announced per list, caught up on once a paged load finishes
+        self._announced = {}
+        # On-disk snapshot store (optional), so the next start and offline use have data
+        self.cache = cache
+        # How "Run on Devices" reaches a device (system ssh by default; see fanout.default_transport)
+        self.transport = transport or default_transport()
+        # Reuse the login screen's worker pool when handed one
+        self.runner = runner or TaskRunner(root)
+        self.runner.on_busy_change = self._set_busy
+        # Outbound edits (last_used bumps) are coalesced and sent in batches; persisted for offline replay
+        self.mutations = MutationQueue(root, self.runner, self._send_updates, store=cache, username=username,
+                                       on_flushed=lambda kind, resp: self._advance_revision(kind, resp.get("revision")))
 
         self.root.title(f"Command Manager - {username}")
         self.root.geometry("1200x750")
@@ -28,14 +79,53 @@ class CommandManagerApp:
 
         # Application Header (Optional but nice)
         ttk.Label(self.root, text="Command Management Console", font=("Helvetica", 16, "bold"), bootstyle="primary").pack(pady=(10, 5))
+        # Busy indicator, only placed while requests are in flight
+        self.busy_bar = ttk.Progressbar(self.root, mode="indeterminate", bootstyle="info-striped", length=140)
+        # Connection status (e.g. working offline from the local cache)
+        self.status_var = ttk.StringVar()
+        ttk.Label(self.root, textvariable=self.status_var, bootstyle="warning").place(x=20, y=16)
 
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill="both", expand=True, padx=15, pady=10)
         # Note: Frames inside the notebook inherit the theme's default background.
 
+        # Device reachability (TCP probes on its own event loop thread); fills the Devices tab's Status column
+        self.scanner = ReachabilityScanner(self.root, self._on_reachability, interval_ms=reachability_ms)
+
         self.create_commands_tab()
         self.create_devices_tab()
 
+        # Hidden performance panel
+        self.root.bind("<Control-Shift-D>", lambda e: DiagnosticsWindow(self.root))
+
+        startup.mark("tables rendered")
+        self.root.after_idle(self._first_paint)
+
+        # The tables were painted from the snapshot we were given; revalidate it in the background
+        # unless it came straight from the server (a fresh login payload)
+        if revalidate:
+            self._sync_async("commands", self.render_commands_table, quiet=True)
+            self._sync_async("devices", self.render_devices_table, quiet=True)
+        # A paged login payload carried only the first page of each list; the rest streams in behind it
+        cursors = cursors or {}
+        if cursors.get("commands"):
+            self._load_pages("commands", self.render_commands_table, after=cursors["commands"])
+        if cursors.get("devices"):
+            self._load_pages("devices", self.render_devices_table, after=cursors["devices"])
+        # Server-pushed changes keep both tables live without polling
+        self.feed = ChangeFeed(self.root, self.api, self._on_feed_change, lambda: dict(self.revisions),
+                               on_state=self._on_feed_state)
+        if live_updates:
+            self.feed.start()
+        self._schedule_auto_refresh()
+        if reachability_ms:
+            self.scanner.start(self._device_hosts)
+
+    def _first_paint(self):
+        startup.mark("first table painted")
+        if startup.enabled:
+            startup.report()
+
     def _setup_treeview_style(self):
         """Configures the custom styling for the Treeviews."""
         # --- UI CHANGE: Switched theme from 'flatly' to 'darkly' ---
@@ -53,58 +143,447 @@ class CommandManagerApp:
         self.style.map("Custom.Treeview", background=[("selected", self.style.colors.primary)])
 
     # --- API HELPERS ---
+    # _get/_call perform the raw HTTP round trip and are safe to run on a worker thread.
+    # Anything that touches Tk (dialogs, tables) happens in the _handle_* callbacks on the main thread.
 
-    def _fetch_data(self, endpoint, success_message="Data refreshed."):
-        """Helper function to fetch data from the API."""
-        try:
-            resp = requests.get(
-                f"{API_BASE_URL}{endpoint}",
-                params={"token": self.token},
-                timeout=5
-            )
-            resp.raise_for_status() 
-            data = resp.json()
-            if data.get("success"):
-                return data
-            else:
-                messagebox.showerror("API Error", data.get("message", "Failed to fetch data."))
-                return None
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Connection Error", f"Failed to connect to server: {e}")
-            return None
+    def _get(self, endpoint):
+        """Performs a blocking GET and returns the decoded JSON body. Raises RequestException on failure."""
+        return self.api.get_json(endpoint)
 
-    def _send_data(self, endpoint, data, success_message="Operation successful."):
-        """Helper function to send data to the API (POST/DELETE/PUT)."""
+    def _call(self, endpoint, data):
+        """Performs a blocking POST/DELETE/PUT and returns the decoded JSON body. Raises RequestException on failure."""
         method = "POST"
         if endpoint.endswith('/remove'):
             method = "DELETE"
         elif endpoint.endswith('/update'):
              method = "PUT"
-        
-        # Payload includes token for req.body.token check
-        payload = {"token": self.token, **data}
-        # Query params include token as a robust fallback for req.query.token check
-        query_params = {"token": self.token} 
 
+        # The token travels in the x-access-token header set by ApiClient
+        return self.api.send_json(method, endpoint, data)
+
+    def _handle_fetch(self, data):
+        """Returns the fetched payload if the API reported success, otherwise shows the error."""
+        if data.get("success"):
+            return data
+        messagebox.showerror("API Error", data.get("message", "Failed to fetch data."))
+        return None
+
+    def _handle_send(self, response_data, success_message):
+        """Shows the outcome of a POST/DELETE/PUT and returns whether it succeeded."""
+        if response_data.get("success"):
+            Messagebox.show_info("Success", success_message) 
+            return True
+        messagebox.showerror("API Error", response_data.get("message", "Operation failed."))
+        return False
+
+    def _handle_connection_error(self, e):
+        messagebox.showerror("Connection Error", f"Failed to connect to server: {e}")
+
+    def _fetch_data(self, endpoint, success_message="Data refreshed."):
+        """Helper function to fetch data from the API (blocking)."""
         try:
-            resp = requests.request(
-                method,
-                f"{API_BASE_URL}{endpoint}",
-                json=payload,
-                params=query_params,
-                timeout=5
-            )
-            resp.raise_for_status()
-            response_data = resp.json()
-            if response_data.get("success"):
-                Messagebox.show_info("Success", success_message) 
-                return True
-            else:
-                messagebox.showerror("API Error", response_data.get("message", "Operation failed."))
-                return False
+            with instrumentation.span(f"fetch {endpoint}"):
+                return self._handle_fetch(self._get(endpoint))
+        except requests.exceptions.RequestException as e:
+            self._handle_connection_error(e)
+            return None
+
+    def _send_data(self, endpoint, data, success_message="Operation successful."):
+        """Helper function to send data to the API (POST/DELETE/PUT, blocking)."""
+        try:
+            with instrumentation.span(f"send {endpoint}"):
+                return self._handle_send(self._call(endpoint, data), success_message)
         except requests.exceptions.RequestException as e:
-            messagebox.showerror("Connection Error", f"Failed to connect to server: {e}")
+            self._handle_connection_error(e)
             return False
+
+    @property
+    def commands(self):
+        return self._stores["commands"]
+
+    @commands.setter
+    def commands(self, items):
+        self._stores["commands"].replace(items)
+
+    @property
+    def devices(self):
+        return self._stores["devices"]
+
+    @devices.setter
+    def devices(self, items):
+        self._stores["devices"].replace(items)
+
+    def _sync_async(self, kind, on_change, quiet=False):
+        """Brings self.commands / self.devices up to date with the server in the background.
+
+        Sends the last ETag (304 when nothing changed) and the last revision, so the server
+        only returns items changed since then; those are merged into the local snapshot.
+        on_change() runs on the main thread only if the snapshot actually changed.
+        With quiet=True a connection failure only flags the app as offline instead of
+        showing a dialog. Without a revision to start from the list is loaded page by page.
+        """
+        if kind in self._page_loads:
+            return # A paged load is already bringing this list up to date
+        endpoint = f"/{kind}"
+        etag = self._etags.get(kind)
+        since = self.revisions.get(kind)
+        if since is None:
+            self._load_pages(kind, on_change, quiet=quiet)
+            return
+        params = {"since": since}
+
+        def done(result):
+            self.status_var.set("")
+            data, new_etag = result
+            if data is None:
+                return # 304 Not Modified
+            if not self._handle_fetch(data):
+                return
+            self._etags[kind] = new_etag
+            self.revisions[kind] = data.get("revision")
+            with instrumentation.span(f"merge {kind}", len(data.get(kind, []))):
+                # Deltas patch the store's id map and search index in place; full lists replace it
+                self._stores[kind].apply_sync_response(data)
+            on_change()
+            self._persist(kind)
+
+        def failed(e):
+            self._sync_failed(e, quiet)
+
+        self.runner.submit(lambda: self.api.get_conditional(endpoint, etag, params), on_success=done,
+                           on_error=failed, key=endpoint)
+
+    def _sync_failed(self, e, quiet):
+        if quiet and isinstance(e, requests.exceptions.ConnectionError):
+            self.status_var.set("Offline - showing cached data")
+        else:
+            self._handle_connection_error(e)
+
+    def _load_pages(self, kind, on_change, quiet=False, after=None):
+        """Loads a whole commands/devices list page by page (cursor pagination) in the background.
+
+        The first page replaces the local snapshot and is painted at once; each later page
+        is appended to the store and the table as it arrives, while the next one is already
+        being fetched. With `after` (a paged login payload's cursor) the snapshot already
+        holds the first page and every page is appended. The revision reported with the
+        first page is kept, so the next delta sync also covers anything that changed
+        while the pages were loading.
+        """
+        endpoint = f"/{kind}"
+        load = object()
+        self._page_loads[kind] = load
+
+        def fetch(cursor):
+            limit = PAGE_SIZE if cursor else FIRST_PAGE_SIZE
+            self.runner.submit(lambda: self.api.get_page(endpoint, limit, cursor),
+                               on_success=lambda data: page(data, first=cursor is None), on_error=failed, key=endpoint)
+
+        def page(data, first):
+            if self._page_loads.get(kind) is not load:
+                return # Superseded by a newer load
+            if not self._handle_fetch(data):
+                del self._page_loads[kind]
+                return
+            self.status_var.set("")
+            cursor = data.get("next")
+            if cursor:
+                fetch(cursor) # Overlap the next request with painting this page
+            items = data.get(kind, [])
+            with instrumentation.span(f"page {kind}", len(items)):
+                if first:
+                    self.revisions[kind], self._etags[kind] = data.get("revision"), None
+                    self._stores[kind].replace(items)
+                    on_change()
+                else:
+                    self._append_page(kind, items, on_change)
+            if not cursor:
+                del self._page_loads[kind]
+                self._persist(kind)
+                if (self._announced.get(kind) or 0) > (self.revisions.get(kind) or 0):
+                    self._sync_async(kind, on_change, quiet=True) # Changes pushed while the pages loaded
+
+        def failed(e):
+            if self._page_loads.get(kind) is not load:
+                return
+            del self._page_loads[kind]
+            # The snapshot is incomplete: the next sync starts over instead of asking for a delta
+            self.revisions[kind], self._etags[kind] = None, None
+            self._sync_failed(e, quiet)
+
+        fetch(after)
+
+    def _append_page(self, kind, items, on_change):
+        """Adds a page to the store and appends the rows matching the current search to the table."""
+        store = self._stores[kind]
+        added = store.extend(items)
+        if len(added) < len(items):
+            on_change() # Some ids were already present (changed in place): re-render in full
+            return
+        table, query, field = self._table_filter(kind)
+        if query.strip():
+            added = store.scan(query, None if field == "any" else field, rows=added)
+        table.append_rows(added)
+
+    # --- LIVE UPDATES ---
+
+    def _on_feed_change(self, data):
+        """Applies a change pushed by the server (see change_feed.py) to the store and the table."""
+        kind = data.get("kind")
+        if kind not in self._stores:
+            return
+        on_change = getattr(self, f"render_{kind}_table")
+        revision, current = data.get("revision"), self.revisions.get(kind)
+        self._announced[kind] = revision
+        if kind in self._page_loads or (revision is not None and current is not None and revision <= current):
+            return # A paged load is running (it catches up when done), or we already have this revision
+        if data.get("delta") and data.get("since") != current:
+            # The delta starts elsewhere than our snapshot (e.g. our own change moved it on): fetch ours instead
+            self._sync_async(kind, on_change, quiet=True)
+            return
+        self.revisions[kind], self._etags[kind] = revision, None
+        with instrumentation.span(f"merge {kind}", len(data.get(kind, []))):
+            self._stores[kind].apply_sync_response(data)
+        on_change()
+        self._persist(kind)
+
+    def _on_feed_state(self, live):
+        if not live:
+            self.status_var.set(FEED_LOST_MESSAGE)
+        elif self.status_var.get() == FEED_LOST_MESSAGE:
+            self.status_var.set("")
+
+    def _table_filter(self, kind):
+        """The table showing a list, and its current search text and field."""
+        if kind == "commands":
+            return self.cmd_table, self.cmd_search_var.get(), self.cmd_filter_var.get() or "command"
+        return self.dev_table, self.dev_search_var.get(), self.dev_filter_var.get() or "device"
+
+    def _persist(self, kind):
+        """Writes the current commands/devices snapshot to the local cache on a worker thread."""
+        if not self.cache or kind in self._page_loads:
+            return # Incomplete lists are cached once their paged load finishes
+        store = self._stores[kind]
+        rows = [r for r in store.snapshot() if not self._is_pending(r)]
+        revision, etag = self.revisions.get(kind), self._etags.get(kind)
+        self.runner.submit(lambda: self.cache.save_snapshot(self.username, kind, store.to_dicts(rows), revision, etag),
+                           key=f"cache:{kind}")
+
+    def _send_async(self, endpoint, data, success_message="Operation successful.", on_success=None):
+        """Sends data to the API on a worker thread; on_success(response) runs on the main thread."""
+        def done(response_data):
+            if self._handle_send(response_data, success_message) and on_success:
+                on_success(response_data)
+
+        self.runner.submit(lambda: self._call(endpoint, data), on_success=done,
+                           on_error=self._handle_connection_error)
+
+    # --- OPTIMISTIC MUTATIONS ---
+    # Adds and removes are applied to the local store and table first, then confirmed
+    # with a single request. Stores swap whole records, never change one in place, so
+    # background tasks holding a snapshot() stay consistent.
+
+    def _swap_row(self, kind, key, row):
+        """Replaces the local row with id key by row (the server's copy), or drops it when row is None."""
+        store = self._stores[kind]
+        if row is None or store.get(row.get("id")) is not None:
+            # Rejected, or a refresh already brought in the confirmed row
+            store.remove(key)
+        elif store.set(key, row) is None:
+            # A refresh replaced the snapshot meanwhile; make sure the confirmed row is in it
+            store.append(row)
+        getattr(self, f"render_{kind}_table")()
+
+    def _restore_row(self, kind, row, position):
+        """Puts a row whose removal failed back where it was."""
+        store = self._stores[kind]
+        if store.get(row.get("id")) is not None:
+            return
+        store.insert(len(store) if position is None else min(position, len(store)), row)
+        getattr(self, f"render_{kind}_table")()
+
+    def _pending_id(self):
+        """Placeholder id for a row the server has not created yet."""
+        self._pending_seq += 1
+        return f"{PENDING_PREFIX}{self._pending_seq}"
+
+    def _is_pending(self, row):
+        return str(row.get("id")).startswith(PENDING_PREFIX)
+
+    def _advance_revision(self, kind, revision):
+        """Moves the snapshot's revision forward after our own mutation, if nothing else changed in between."""
+        current = self.revisions.get(kind)
+        if revision is not None and current is not None and revision == current + 1:
+            self.revisions[kind] = revision
+        # Otherwise the next refresh fetches the delta since the old revision, which includes our change
+
+    def _touch(self, kind, row, fields):
+        """Applies field changes to a row locally and queues them for the server (coalesced, write-behind)."""
+        if all(row.get(k) == v for k, v in fields.items()):
+            return
+        self._stores[kind].update(row.get("id"), **fields)
+        getattr(self, f"render_{kind}_table")()
+        if not self._is_pending(row):
+            self.mutations.update(kind, row.get("id"), fields)
+
+    def _send_updates(self, kind, updates):
+        """Blocking PUT of queued edits; runs on a worker thread for the mutation queue."""
+        return self.api.send_json("PUT", f"/{kind}/bulk-update", {"updates": updates})
+
+    def _mutate_async(self, kind, endpoint, data, undo, on_confirm=None):
+        """Sends a mutation already applied locally; undo() reverts it if the server rejects it or is unreachable."""
+        def done(response_data):
+            if not response_data.get("success"):
+                undo()
+                messagebox.showerror("API Error", response_data.get("message", "Operation failed."))
+                return
+            if on_confirm:
+                on_confirm(response_data)
+            self._advance_revision(kind, response_data.get("revision"))
+            self._persist(kind)
+
+        def failed(e):
+            undo()
+            self._handle_connection_error(e)
+
+        self.runner.submit(lambda: self._call(endpoint, data), on_success=done, on_error=failed)
+
+    def _run_import(self, title, validate, upload, refresh, **options):
+        """Streams a file through import_records on a worker thread, with a progress/cancel dialog."""
+        file_path = filedialog.askopenfilename(filetypes=IMPORT_FILETYPES)
+        if not file_path: return
+
+        dialog = ProgressDialog(self.root, title)
+
+        def progress(report, fraction):
+            dialog.report(fraction, f"{report.imported} imported, {report.skipped} skipped, {report.failed} failed")
+
+        def work():
+            with instrumentation.span(title.lower(), os.path.getsize(file_path)):
+                return import_records(file_path, validate, upload, batch_size=self.import_batch_size,
+                                      progress=progress, cancel=dialog.cancel_event, **options)
+
+        def done(report):
+            dialog.close()
+            if report.imported:
+                refresh()
+            if report.imported or report.cancelled or report.duplicates:
+                Messagebox.show_info("Import Complete", report.summary())
+            elif report.error or report.failed:
+                messagebox.showerror(title, report.summary())
+            else:
+                messagebox.showwarning(title, "No valid records found in the file.")
+
+        def failed(e):
+            dialog.close()
+            messagebox.showerror(title, f"Import failed: {e}")
+
+        self.runner.submit(work, on_success=done, on_error=failed)
+
+    def _run_export(self, title, records, fields, noun):
+        """Writes records to a user-chosen file on a worker thread, with a progress/cancel dialog."""
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=EXPORT_FILETYPES)
+        if not file_path: return
+
+        dialog = ProgressDialog(self.root, title)
+
+        def progress(done, total):
+            dialog.report(done / total, f"{done} of {total} {noun} written")
+
+        def done(count):
+            dialog.close()
+            if count is not None:
+                Messagebox.show_info("Exported", f"{count} {noun} exported!")
+
+        def failed(e):
+            dialog.close()
+            messagebox.showerror("Error", f"Failed to export {noun}: {e}")
+
+        def work():
+            with instrumentation.span(title.lower(), len(records)):
+                return export_records(file_path, records, fields, progress, dialog.cancel_event)
+
+        self.runner.submit(work, on_success=done, on_error=failed)
+
+    def _flash(self, message):
+        """Shows a short-lived message in the status line instead of a modal dialog."""
+        self.status_var.set(message)
+        self.root.after(FLASH_MS, lambda: self.status_var.get() == message and self.status_var.set(""))
+
+    def _set_busy(self, busy):
+        """Shows the header progress bar while any API call is in flight."""
+        if busy:
+            self.busy_bar.place(relx=1.0, x=-20, y=16, anchor="ne")
+            self.busy_bar.start(15)
+        else:
+            self.busy_bar.stop()
+            self.busy_bar.place_forget()
+
+    # --- LOCAL SEARCH / SCHEDULING ---
+
+    def _search(self, kind, query, field):
+        """Searches the local commands/devices store; field "any" matches every indexed field.
+
+        The search index is never built here: until a worker has built it (see _index_async)
+        the rows are scanned, so a fresh snapshot paints without waiting for an index.
+        """
+        store = self._stores[kind]
+        if not query.strip():
+            return store.snapshot()
+        field = None if field == "any" else field
+        with instrumentation.span(f"filter {kind}") as span:
+            if store.indexed:
+                found = store.search(query, field)
+            else:
+                found = store.scan(query, field)
+                self._index_async(kind)
+            span.size = len(found)
+        return found
+
+    def _index_async(self, kind):
+        """Builds a list's search index on a worker thread and installs it if the list did not change meanwhile."""
+        if kind in self._index_builds:
+            return
+        self._index_builds.add(kind)
+        store = self._stores[kind]
+        generation, rows = store.generation, store.snapshot()
+
+        def build():
+            with instrumentation.span(f"index {kind}", len(rows)):
+                return store.new_index(rows)
+
+        def done(index):
+            self._index_builds.discard(kind)
+            store.install_index(index, generation) # If stale, the next search starts another build
+
+        def failed(e):
+            self._index_builds.discard(kind)
+
+        self.runner.submit(build, on_success=done, on_error=failed)
+
+    def _schedule_filter(self, table, render):
+        """Debounces a re-filter of the local snapshot, cancelling any pass still waiting to run."""
+        pending = self._filter_jobs.pop(table, None)
+        if pending:
+            self.root.after_cancel(pending)
+        self._filter_jobs[table] = self.root.after(self.search_debounce_ms, lambda: self._run_filter(table, render))
+
+    def _run_filter(self, table, render):
+        """Runs the debounced filter pass for a table."""
+        self._filter_jobs.pop(table, None)
+        render()
+
+    def _schedule_auto_refresh(self):
+        """Re-syncs both tables with the server on a fixed interval, if enabled."""
+        if not self.auto_refresh_ms:
+            return
+
+        def tick():
+            if not self.feed.live: # While the change feed is connected the tables are already current
+                self.refresh_commands_table()
+                self.refresh_devices_table()
+            self._schedule_auto_refresh()
+
+        self.root.after(self.auto_refresh_ms, tick)
     
     # ---------------- COMMANDS TAB ---------------- #
 
@@ -125,10 +604,12 @@ class CommandManagerApp:
         
         ttk.Label(search_frame, text="Filter By:", bootstyle="secondary").grid(row=0, column=2, padx=(0, 10), sticky="w")
         self.cmd_filter_var = ttk.StringVar(value="command")
-        filter_options = ["command", "description", "last_used"] 
+        filter_options = ["command", "description", "last_used", "any"] 
         ttk.OptionMenu(search_frame, self.cmd_filter_var, "command", *filter_options).grid(row=0, column=3, sticky="ew")
         
-        self.cmd_search_var.trace_add("write", lambda n, i, m: self.refresh_commands_table())
+        # Keystrokes only filter the in-memory snapshot; the server is hit by "Refresh Data" alone
+        self.cmd_search_var.trace_add("write", lambda n, i, m: self._schedule_filter("commands", self.render_commands_table))
+        self.cmd_filter_var.trace_add("write", lambda n, i, m: self._schedule_filter("commands", self.render_commands_table))
 
         # --- Button Bar ---
         btn_frame = ttk.Frame(self.tab_commands, padding=(0, 10))
@@ -138,6 +619,7 @@ class CommandManagerApp:
         ttk.Button(btn_frame, text="Add Command", bootstyle="success", command=self.open_add_command_window).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Remove Command", bootstyle="danger", command=self.remove_command).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Refresh Data", bootstyle="info", command=self.refresh_commands_table).pack(side="left", padx=(15, 5))
+        ttk.Button(btn_frame, text="Run on Devices", bootstyle="warning", command=self.run_on_devices).pack(side="left", padx=5)
         
         # UI FIX: Used light-outline for export/import for high contrast on dark theme
         ttk.Button(btn_frame, text="Export JSON", bootstyle="light-outline", command=self.export_commands).pack(side="right", padx=5)
@@ -147,55 +629,37 @@ class CommandManagerApp:
         table_frame = ttk.Frame(self.tab_commands)
         table_frame.pack(fill="both", expand=True)
 
-        self.cmd_tree = ttk.Treeview(table_frame, show="headings", style="Custom.Treeview")
-        self.cmd_tree.pack(fill="both", expand=True)
-        self.cmd_tree.bind("<Double-1>", self.copy_command)
+        self.cmd_table = TableView(table_frame, [
+            ("id", "ID", 50, NO),
+            ("command", "Command", 400, YES),
+            ("description", "Description", 450, YES),
+            ("last_used", "Last Used", 150, NO),
+        ])
+        self.cmd_table.pack(fill="both", expand=True)
+        self.cmd_table.bind("<Double-1>", self.copy_command)
+        self.cmd_tree = self.cmd_table.tree
         
         # FIX: Configure tags with dark backgrounds and light foreground for contrast
         self.cmd_tree.tag_configure("odd", background="#2a2a2a", foreground="white")
         self.cmd_tree.tag_configure("even", background="#1e1e1e", foreground="white")
         
-        self.refresh_commands_table()
+        # Paint the snapshot we already have; __init__ re-syncs it in the background
+        self.render_commands_table()
     
     def refresh_commands_table(self):
-        """Fetches commands from the API, filters, and repopulates the Treeview."""
-        
-        api_data = self._fetch_data("/commands", "Commands list fetched.")
-        if api_data:
-            self.commands = api_data.get("commands", [])
-        else:
-            self.commands = self.commands or [] 
+        """Syncs commands with the API in the background, then filters and repopulates the Treeview."""
+        self._sync_async("commands", self.render_commands_table)
 
-        search = self.cmd_search_var.get().lower()
+    def render_commands_table(self):
+        """Filters the local command snapshot and repopulates the Treeview (no network)."""
+        search = self.cmd_search_var.get()
         col = self.cmd_filter_var.get() or "command"
-        
-        for item in self.cmd_tree.get_children():
-            self.cmd_tree.delete(item)
             
-        filtered = [c for c in self.commands if search in str(c.get(col, "")).lower()]
-        
-        columns = ["id", "command", "description", "last_used"] 
-        self.cmd_tree["columns"] = columns
-        
-        # Setup columns and headings
-        self.cmd_tree.heading("id", text="ID", anchor="center")
-        self.cmd_tree.column("id", width=50, stretch=NO, anchor="w")
-        
-        self.cmd_tree.heading("command", text="Command", anchor="center")
-        self.cmd_tree.column("command", width=400, stretch=YES, anchor="w")
+        filtered = self._search("commands", search, col)
         
-        self.cmd_tree.heading("description", text="Description", anchor="center")
-        self.cmd_tree.column("description", width=450, stretch=YES, anchor="w")
-
-        self.cmd_tree.heading("last_used", text="Last Used", anchor="center")
-        self.cmd_tree.column("last_used", width=150, stretch=NO, anchor="w")
-            
-        # Insert data with alternating tags
-        for i, c in enumerate(filtered):
-            tag = "odd" if i % 2 == 0 else "even"
-            self.cmd_tree.insert("", "end", 
-                                 values=[c.get("id", ""), c.get("command", ""), c.get("description", ""), c.get("last_used", "")], 
-                                 tags=(tag,))
+        # Large result sets are virtualized by the TableView
+        with instrumentation.span("render commands", len(filtered)):
+            self.cmd_table.set_rows(filtered)
 
     def open_add_command_window(self):
         """Opens a top-level window to add a new command."""
@@ -214,7 +678,7 @@ class CommandManagerApp:
             entries[f].pack(fill="x", pady=(0, 10), padx=5)
 
         def save_cmd():
-            """Saves the new command via API and updates the table."""
+            """Adds the command to the table immediately and saves it via API."""
             cmd_text = entries["command"].get()
             desc_text = entries["description"].get()
             
@@ -226,76 +690,88 @@ class CommandManagerApp:
                 "command": cmd_text,
                 "description": desc_text,
             }
-            
-            if self._send_data("/commands/add", data, "Command added successfully."):
-                win.destroy()
-                self.refresh_commands_table()
+
+            # Show the row right away; the server's copy (with its real id) replaces it when confirmed
+            pending = {"id": self._pending_id(), **data, "last_used": date.today().isoformat()}
+            self.commands.append(pending)
+            self.render_commands_table()
+            win.destroy()
+
+            self._mutate_async("commands", "/commands/add", data,
+                               undo=lambda: self._swap_row("commands", pending["id"], None),
+                               on_confirm=lambda resp: self._swap_row("commands", pending["id"], resp.get("command")))
 
         ttk.Button(main_frame, text="Save Command", bootstyle="success", command=save_cmd).pack(pady=10, fill="x")
 
     def copy_command(self, event):
         """Copies the selected command text to the clipboard."""
-        row = self.cmd_tree.focus()
+        row = self.cmd_table.selected_row()
         if not row: return
         
-        cmd = self.cmd_tree.item(row)["values"][1] 
+        cmd = row.get("command", "")
         self.root.clipboard_clear()
         self.root.clipboard_append(cmd)
-        self.root.update()
-        Messagebox.show_info("Copied", f"Command copied:\n{cmd}")
+        self._flash(f"Copied: {cmd}")
+        # Usage tracking goes through the write-behind queue, so copying never waits on the network
+        self._touch("commands", row, {"last_used": date.today().isoformat()})
+
+    def run_on_devices(self):
+        """Runs the selected command on every device selected in the Devices tab, in parallel."""
+        row = self.cmd_table.selected_row()
+        devices = self.dev_table.selected_rows()
+        if not row:
+            messagebox.showwarning("No selection", "Select a command to run")
+            return
+        if not devices:
+            messagebox.showwarning("No devices", "Select one or more devices in the Devices tab")
+            return
 
-    def import_commands(self):
-        """Opens a dialog to import commands from a JSON file and sends them to the API."""
-        file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
-        if not file_path: return
-        
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to read/parse JSON file: {e}")
+        cmd = row.get("command", "")
+        if not messagebox.askyesno("Confirm Run", f"Run '{cmd}' on {len(devices)} device(s)?"):
             return
-            
-        commands_to_import = [{"command": c.get("command"), "description": c.get("description", "")}
-                              for c in data if c.get("command")]
+        FanoutWindow(self.root, cmd, devices, self.transport, on_finished=self._save_run)
+        self._touch("commands", row, {"last_used": date.today().isoformat()})
 
-        if not commands_to_import:
-            messagebox.showwarning("Import Failed", "No valid commands found in the file.")
+    def _save_run(self, job):
+        """Keeps each host's exit code, duration and output tail in the local run history."""
+        if not self.cache:
             return
+        results = list(job.results.values())
+        self.runner.submit(lambda: self.cache.save_run(self.username, job.command, job.started_at, results))
 
-        api_data = {"commands": commands_to_import}
-        
-        if self._send_data("/commands/import", api_data, f"{len(commands_to_import)} commands imported successfully."):
-            self.refresh_commands_table()
+    def import_commands(self):
+        """Opens a dialog to import commands from a JSON/NDJSON file and uploads them in batches."""
+        def upload(batch):
+            response_data = self._call("/commands/import", {"commands": batch})
+            return response_data.get("success"), response_data.get("message")
+
+        self._run_import("Import Commands", command_record, upload, self.refresh_commands_table)
 
     def export_commands(self):
-        """Opens a dialog to export all locally held commands to a JSON file."""
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
-        if not file_path: return
-        
-        try:
-            with open(file_path, "w") as f:
-                json.dump(self.commands, f, indent=4) 
-            Messagebox.show_info("Exported", f"{len(self.commands)} commands exported!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export commands: {e}")
+        """Opens a dialog to export all locally held commands to JSON, NDJSON or CSV (optionally gzipped)."""
+        self._run_export("Export Commands", self.commands.snapshot(), COMMAND_FIELDS, "commands")
 
     def remove_command(self):
         """Removes the selected command via API."""
-        row = self.cmd_tree.focus()
+        row = self.cmd_table.selected_row()
         if not row:
             messagebox.showwarning("No selection", "Select a command to remove")
             return
             
-        values = self.cmd_tree.item(row)["values"]
-        cmd_id = values[0]
-        cmd_name = values[1]
+        if self._is_pending(row):
+            messagebox.showwarning("Please wait", "This command is still being saved.")
+            return
+
+        cmd_id = row.get("id")
+        cmd_name = row.get("command", "")
         
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to remove '{cmd_name}' (ID: {cmd_id})?"):
             data = {"id": cmd_id}
-            
-            if self._send_data("/commands/remove", data, f"Command '{cmd_name}' removed."):
-                self.refresh_commands_table()
+            position = self.commands.position(cmd_id)
+            self.commands.remove(cmd_id)
+            self.render_commands_table()
+            self._mutate_async("commands", "/commands/remove", data,
+                               undo=lambda: self._restore_row("commands", row, position))
 
     # ---------------- DEVICES TAB ---------------- #
     
@@ -316,10 +792,11 @@ class CommandManagerApp:
         
         ttk.Label(search_frame, text="Filter By:", bootstyle="secondary").grid(row=0, column=2, padx=(0, 10), sticky="w")
         self.dev_filter_var = ttk.StringVar(value="device")
-        filter_options = ["device", "ip"] 
+        filter_options = ["device", "ip", "any"] 
         ttk.OptionMenu(search_frame, self.dev_filter_var, "device", *filter_options).grid(row=0, column=3, sticky="ew")
         
-        self.dev_search_var.trace_add("write", lambda n, i, m: self.refresh_devices_table())
+        self.dev_search_var.trace_add("write", lambda n, i, m: self._schedule_filter("devices", self.render_devices_table))
+        self.dev_filter_var.trace_add("write", lambda n, i, m: self._schedule_filter("devices", self.render_devices_table))
 
         # --- Button Bar ---
         btn_frame = ttk.Frame(self.tab_devices, padding=(0, 10))
@@ -329,6 +806,7 @@ class CommandManagerApp:
         ttk.Button(btn_frame, text="Add Device", bootstyle="success", command=self.open_add_device_window).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Remove Device", bootstyle="danger", command=self.remove_device).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Refresh Data", bootstyle="info", command=self.refresh_devices_table).pack(side="left", padx=(15, 5))
+        ttk.Button(btn_frame, text="Check Reachability", bootstyle="info-outline", command=self.check_reachability).pack(side="left", padx=5)
         
         # UI FIX: Changed to light-outline for better visibility on dark theme
         ttk.Button(btn_frame, text="Import JSON", bootstyle="light-outline", command=self.import_devices).pack(side="right", padx=5)
@@ -338,50 +816,46 @@ class CommandManagerApp:
         # --- Table Area ---
         table_frame = ttk.Frame(self.tab_devices)
         table_frame.pack(fill="both", expand=True)
-        self.dev_tree = ttk.Treeview(table_frame, show="headings", style="Custom.Treeview")
-        self.dev_tree.pack(fill="both", expand=True)
-        self.dev_tree.bind("<Double-1>", self.copy_device_ip)
+        self.dev_table = TableView(table_frame, [
+            ("id", "ID", 50, NO), # Include ID for removal
+            ("device", "Device", 400, YES),
+            ("ip", "IP Address", 350, YES),
+            ("status", "Status", 100, NO),
+        ], formatters={"status": lambda row: reachability_label(self.scanner.status(row.get("ip")))})
+        self.dev_table.pack(fill="both", expand=True)
+        self.dev_table.bind("<Double-1>", self.copy_device_ip)
+        self.dev_tree = self.dev_table.tree
         
         # FIX: Configure tags with dark backgrounds and light foreground for contrast
         self.dev_tree.tag_configure("odd", background="#2a2a2a", foreground="white")
         self.dev_tree.tag_configure("even", background="#1e1e1e", foreground="white")
         
-        self.refresh_devices_table()
+        self.render_devices_table()
 
     def refresh_devices_table(self):
-        """Fetches devices from the API, filters, and repopulates the Treeview."""
-        
-        api_data = self._fetch_data("/devices", "Devices list fetched.")
-        if api_data:
-            self.devices = api_data.get("devices", [])
-        else:
-            self.devices = self.devices or []
-        
-        search = self.dev_search_var.get().lower()
+        """Syncs devices with the API in the background, then filters and repopulates the Treeview."""
+        self._sync_async("devices", self.render_devices_table)
+
+    def render_devices_table(self):
+        """Filters the local device snapshot and repopulates the Treeview (no network)."""
+        search = self.dev_search_var.get()
         col = self.dev_filter_var.get() or "device"
-        
-        for item in self.dev_tree.get_children():
-            self.dev_tree.delete(item)
             
-        filtered = [d for d in self.devices if search in str(d.get(col, "")).lower()]
-        
-        columns = ["id", "device", "ip"] # Include ID for removal
-        self.dev_tree["columns"] = columns
-        
-        self.dev_tree.heading("id", text="ID", anchor="center")
-        self.dev_tree.column("id", width=50, stretch=NO, anchor="w")
-        
-        self.dev_tree.heading("device", text="Device", anchor="center")
-        self.dev_tree.column("device", width=400, stretch=YES, anchor="w")
+        filtered = self._search("devices", search, col)
         
-        self.dev_tree.heading("ip", text="IP Address", anchor="center")
-        self.dev_tree.column("ip", width=450, stretch=YES, anchor="w")
-            
-        for i, d in enumerate(filtered):
-            tag = "odd" if i % 2 == 0 else "even"
-            self.dev_tree.insert("", "end", 
-                                 values=[d.get("id", ""), d.get("device", ""), d.get("ip", "")], 
-                                 tags=(tag,))
+        with instrumentation.span("render devices", len(filtered)):
+            self.dev_table.set_rows(filtered)
+
+    def _device_hosts(self):
+        return [d.get("ip") for d in self.devices]
+
+    def check_reachability(self):
+        """Probes every device now, ignoring cached results; the Status column fills in as they arrive."""
+        self.scanner.scan(self._device_hosts(), force=True)
+
+    def _on_reachability(self, results):
+        with instrumentation.span("render reachability", len(results)):
+            self.dev_table.refresh()
 
     def open_add_device_window(self):
         """Opens a top-level window to add a new device."""
@@ -400,7 +874,7 @@ class CommandManagerApp:
             entries[f].pack(fill="x", pady=(0, 10), padx=5)
 
         def save_dev():
-            """Saves the new device via API and updates the table."""
+            """Adds the device to the table immediately and saves it via API."""
             dev_name = entries["device"].get()
             ip_addr = entries["ip"].get()
             
@@ -409,81 +883,61 @@ class CommandManagerApp:
                 return
 
             data = {"device": dev_name, "ip": ip_addr}
-            
-            if self._send_data("/devices/add", data, "Device added successfully."):
-                win.destroy()
-                self.refresh_devices_table()
+
+            pending = {"id": self._pending_id(), **data}
+            self.devices.append(pending)
+            self.render_devices_table()
+            win.destroy()
+
+            self._mutate_async("devices", "/devices/add", data,
+                               undo=lambda: self._swap_row("devices", pending["id"], None),
+                               on_confirm=lambda resp: self._swap_row("devices", pending["id"], resp.get("device")))
 
         ttk.Button(main_frame, text="Save Device", bootstyle="success", command=save_dev).pack(pady=10, fill="x")
 
     def copy_device_ip(self, event):
         """Copies the selected device's IP address to the clipboard."""
-        row = self.dev_tree.focus()
+        row = self.dev_table.selected_row()
         if not row: return
         
-        ip = self.dev_tree.item(row)["values"][2] 
+        ip = row.get("ip", "")
         self.root.clipboard_clear()
         self.root.clipboard_append(ip)
-        self.root.update()
-        Messagebox.show_info("Copied", f"IP copied:\n{ip}")
+        self._flash(f"Copied: {ip}")
 
     def import_devices(self):
-        """Opens a dialog to import devices from a JSON file and sends them to the API."""
-        file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
-        if not file_path: return
-        
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to read/parse JSON file: {e}")
-            return
-            
-        devices_to_import = [{"device": d.get("device"), "ip": d.get("ip")}
-                             for d in data if d.get("device") and d.get("ip")]
+        """Opens a dialog to import devices from a JSON/NDJSON file and uploads them in batches."""
+        def upload(batch):
+            response_data = self._call("/devices/import", {"devices": batch})
+            errors = [f"{e.get('device') or 'Record'}: {e.get('message', 'rejected')}" for e in response_data.get("errors", [])]
+            outcome = {"duplicates": len(response_data.get("duplicates", [])), "errors": errors}
+            return response_data.get("success"), response_data.get("message"), outcome
 
-        if not devices_to_import:
-            messagebox.showwarning("Import Failed", "No valid devices found in the file.")
-            return
+        self._run_import("Import Devices", device_record, upload, self.refresh_devices_table,
+                         dedupe_key=device_key, existing=self.devices.snapshot())
 
-        # --- FIX: Iterate and call the single ADD endpoint for each device ---
-        success_count = 0
-        for device_data in devices_to_import:
-            # Note: This is less efficient than a bulk API, but functional
-            if self._send_data("/devices/add", device_data, f"Device {device_data['device']} added."):
-                success_count += 1
-        
-        # Only refresh and show summary if any devices were attempted
-        if success_count > 0:
-            Messagebox.show_info("Import Complete", f"{success_count} device(s) successfully imported.")
-            self.refresh_devices_table()
-        # --- END FIX ---
-            
     def export_devices(self):
-        """Opens a dialog to export all locally held devices to a JSON file."""
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
-        if not file_path: return
-        
-        try:
-            with open(file_path, "w") as f:
-                json.dump(self.devices, f, indent=4)
-            Messagebox.show_info("Exported", f"{len(self.devices)} devices exported!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export devices: {e}")
-            
+        """Opens a dialog to export all locally held devices to JSON, NDJSON or CSV (optionally gzipped)."""
+        self._run_export("Export Devices", self.devices.snapshot(), DEVICE_FIELDS, "devices")
+
     def remove_device(self):
         """Removes the selected device via API."""
-        row = self.dev_tree.focus()
+        row = self.dev_table.selected_row()
         if not row:
             messagebox.showwarning("No selection", "Select a device to remove")
             return
             
-        values = self.dev_tree.item(row)["values"]
-        dev_id = values[0]
-        dev_name = values[1]
+        if self._is_pending(row):
+            messagebox.showwarning("Please wait", "This device is still being saved.")
+            return
+
+        dev_id = row.get("id")
+        dev_name = row.get("device", "")
         
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to remove '{dev_name}' (ID: {dev_id})?"):
             data = {"id": dev_id}
-            
-            if self._send_data("/devices/remove", data, f"Device '{dev_name}' removed."):
-                self.refresh_devices_table()
\ No newline at end of file
+            position = self.devices.position(dev_id)
+            self.devices.remove(dev_id)
+            self.render_devices_table()
+            self._mutate_async("devices", "/devices/remove", data,
+                               undo=lambda: self._restore_row("devices", row, position))
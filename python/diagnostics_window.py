@@ -0,0 +1,54 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+from tkinter import filedialog, messagebox
+import instrumentation
+
+REFRESH_MS = 1000 # How often the open window re-reads the histograms
+
+COLUMNS = [("op", "Operation", 240), ("count", "Count", 70), ("mean", "Mean ms", 80), ("p50", "p50 ms", 80),
+           ("p95", "p95 ms", 80), ("max", "Max ms", 80), ("size", "Mean size", 90)]
+
+# ---------------- DIAGNOSTICS WINDOW ---------------- #
+class DiagnosticsWindow:
+    """Hidden performance panel (Ctrl+Shift+D): per-operation timings recorded by instrumentation."""
+
+    def __init__(self, root):
+        self.win = ttk.Toplevel(root)
+        self.win.title("Diagnostics")
+        self.win.geometry("780x420")
+
+        controls = ttk.Frame(self.win, padding=10)
+        controls.pack(fill="x")
+        self.enabled_var = ttk.BooleanVar(value=instrumentation.enabled)
+        ttk.Checkbutton(controls, text="Record timings", variable=self.enabled_var, bootstyle="round-toggle",
+                        command=lambda: instrumentation.set_enabled(self.enabled_var.get())).pack(side="left")
+        ttk.Button(controls, text="Dump JSON...", bootstyle="secondary-outline", command=self.dump).pack(side="right")
+        ttk.Button(controls, text="Reset", bootstyle="danger-outline",
+                   command=lambda: (instrumentation.reset(), self.refresh())).pack(side="right", padx=5)
+
+        self.tree = ttk.Treeview(self.win, show="headings", columns=[c[0] for c in COLUMNS])
+        for name, heading, width in COLUMNS:
+            self.tree.heading(name, text=heading, anchor="center")
+            self.tree.column(name, width=width, stretch=name == "op", anchor="w" if name == "op" else "e")
+        self.tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        self.refresh()
+
+    def refresh(self):
+        try:
+            self.tree.delete(*self.tree.get_children())
+        except tk.TclError:
+            return # Window was closed
+        for name, s in instrumentation.snapshot().items():
+            self.tree.insert("", "end", values=(name, s["count"], f"{s['mean_ms']:.2f}", f"{s['p50_ms']:.2f}",
+                                                f"{s['p95_ms']:.2f}", f"{s['max_ms']:.2f}", f"{s['mean_size']:.0f}"))
+        self.win.after(REFRESH_MS, self.refresh)
+
+    def dump(self):
+        path = filedialog.asksaveasfilename(parent=self.win, defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json")])
+        if not path: return
+        try:
+            instrumentation.dump(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to write diagnostics: {e}", parent=self.win)
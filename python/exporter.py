@@ -0,0 +1,97 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+EXPORT_FLUSH_RECORDS = 1000 # Records encoded per write (and per progress report)
+COMMAND_FIELDS = ["id", "command", "description", "last_used"] # CSV export columns
+DEVICE_FIELDS = ["id", "device", "ip"]
+INTERNAL_FIELDS = frozenset({"rev"}) # Server bookkeeping (delta-sync revision), never exported
+
+# Format inferred from the file name; a trailing .gz adds gzip compression
+FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+_encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def _compact(record):
+    """Encodes a dict or store record (record_store.Record) without its internal fields."""
+    return _encode({k: v for k, v in record.items() if k not in INTERNAL_FIELDS})
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def format_for(path):
+    """Returns (format, compressed) for an export path; unknown extensions export compact JSON."""
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    return FORMATS.get(os.path.splitext(name)[1], "json"), compressed
+
+
+def _chunks(records, fmt, fields):
+    """Yields (text, records encoded) pieces of the file, EXPORT_FLUSH_RECORDS records at a time."""
+    batches = (records[i:i + EXPORT_FLUSH_RECORDS] for i in range(0, len(records), EXPORT_FLUSH_RECORDS))
+
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        yield buf.getvalue(), 0
+        for batch in batches:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(batch)
+            yield buf.getvalue(), len(batch)
+    elif fmt == "ndjson":
+        for batch in batches:
+            yield "".join(_compact(r) + "\n" for r in batch), len(batch)
+    else:
+        # One record per line inside the array: still a single JSON value, but far smaller than indent=4
+        yield "[", 0
+        for i, batch in enumerate(batches):
+            yield ("\n" if i == 0 else ",\n") + ",\n".join(_compact(r) for r in batch), len(batch)
+        yield "\n]\n", 0
+
+
+def export_records(path, records, fields, progress=None, cancel=None):
+    """Writes records (a list of dicts) to path in the format its name implies.
+
+    JSON and NDJSON keep every key of each record except INTERNAL_FIELDS; CSV writes
+    only fields, in order.
+    The file is written to a temporary sibling and renamed into place, so an
+    interrupted or cancelled export never leaves a truncated file behind.
+    progress(done, total) is called as records are written; setting the cancel
+    event abandons the export. Returns the number of records written, or None if
+    cancelled.
+    """
+    fmt, compressed = format_for(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".export-", suffix=".tmp", dir=directory)
+    total = len(records)
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if compressed else raw
+            with io.TextIOWrapper(stream, encoding="utf-8", newline="") as out:
+                done = 0
+                for text, count in _chunks(records, fmt, fields):
+                    if cancel is not None and cancel.is_set():
+                        raise _Cancelled()
+                    out.write(text)
+                    done += count
+                    if progress and count:
+                        progress(done, total)
+        os.replace(tmp_path, path)
+    except _Cancelled:
+        os.remove(tmp_path)
+        return None
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return total
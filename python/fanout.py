@@ -0,0 +1,260 @@
+import asyncio
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from reachability import _valid_host
+
+MAX_PARALLEL = 20       # Hosts running the command at once
+HOST_TIMEOUT = 30.0     # Seconds per host, connection included, before the process is killed
+OUTPUT_LIMIT = 64 * 1024 # Characters of each host's output kept in the result (the tail)
+POLL_MS = 100           # How often the main thread picks up output while a run is in progress
+SSH_CONNECT_TIMEOUT = 10 # Seconds
+
+# status: "ok" (exit code 0), "failed" (non-zero exit), "timeout", "error" (could not start), "cancelled"
+HostResult = namedtuple("HostResult", ["host", "status", "exit_code", "duration_ms", "output"])
+
+
+# ---------------- TRANSPORTS ---------------- #
+# A transport turns (host, command) into the argv of a local process, plus any
+# environment variables it needs (env(host)); its combined stdout/stderr is
+# streamed back as that host's output. Hosts never go into a shell string.
+
+class SshTransport:
+    """Runs the command on the host through the system ssh client (keys/agent only, no password prompts)."""
+
+    def __init__(self, user=None, port=None, options=(), connect_timeout=SSH_CONNECT_TIMEOUT):
+        self.user = user
+        self.port = port
+        self.options = list(options)
+        self.connect_timeout = connect_timeout
+
+    def argv(self, host, command):
+        if not _valid_host(host):
+            raise ValueError(f"Invalid host: {host!r}")
+        args = ["ssh", "-o", "BatchMode=yes", "-o", f"ConnectTimeout={self.connect_timeout}"]
+        if self.port:
+            args += ["-p", str(self.port)]
+        for option in self.options:
+            args += ["-o", option]
+        # "--" ends ssh's options, so nothing from the device list is parsed as one
+        return args + ["--", f"{self.user}@{host}" if self.user else host, command]
+
+    def env(self, host):
+        return None # Inherit the app's environment
+
+
+class LocalTransport:
+    """Runs the command in a local shell instead of on the device, with $FANOUT_HOST set (dry runs and tests)."""
+
+    def argv(self, host, command):
+        if sys.platform == "win32":
+            return ["cmd", "/c", command]
+        return ["sh", "-c", command]
+
+    def env(self, host):
+        # Passed as a variable, not spliced into the shell string, so "x&calc" stays a host name
+        return {**os.environ, "FANOUT_HOST": host}
+
+
+def default_transport():
+    """Transport chosen by COMMAND_MANAGER_TRANSPORT ("ssh", the default, or "local")."""
+    if os.environ.get("COMMAND_MANAGER_TRANSPORT", "ssh") == "local":
+        return LocalTransport()
+    return SshTransport(user=os.environ.get("COMMAND_MANAGER_SSH_USER") or None)
+
+
+# ---------------- RUNNER ---------------- #
+def _kill(proc):
+    """Kills the process and anything it started (e.g. the shell's children), which may hold the output pipe open."""
+    try:
+        if sys.platform == "win32":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def run_host(host, command, transport, on_output, timeout=HOST_TIMEOUT, cancel=None):
+    """Runs command for one host, calling on_output(host, text) per line; returns its HostResult."""
+    start = time.perf_counter()
+    tail = []
+    size = 0
+
+    def result(status, exit_code=None):
+        output = "".join(tail)[-OUTPUT_LIMIT:]
+        return HostResult(host, status, exit_code, round((time.perf_counter() - start) * 1000, 1), output)
+
+    if cancel is not None and cancel.is_set():
+        return result("cancelled")
+    try:
+        proc = await asyncio.create_subprocess_exec(*transport.argv(host, command), env=transport.env(host),
+                                                    stdin=asyncio.subprocess.DEVNULL,
+                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                                                    start_new_session=sys.platform != "win32")
+    except (OSError, ValueError) as e: # ValueError: the transport rejected the host
+        on_output(host, f"{e}\n")
+        tail.append(f"{e}\n")
+        return result("error")
+
+    async def pump():
+        nonlocal size
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                return await proc.wait()
+            text = line.decode("utf-8", "replace")
+            on_output(host, text)
+            tail.append(text)
+            size += len(text)
+            if size > 2 * OUTPUT_LIMIT: # Keep memory bounded for chatty hosts
+                joined = "".join(tail)[-OUTPUT_LIMIT:]
+                tail[:], size = [joined], len(joined)
+
+    try:
+        code = await asyncio.wait_for(pump(), timeout)
+    except asyncio.TimeoutError:
+        _kill(proc)
+        await proc.wait()
+        return result("timeout")
+    except asyncio.CancelledError:
+        _kill(proc)
+        await proc.wait()
+        raise
+    return result("ok" if code == 0 else "failed", code)
+
+
+async def fan_out(hosts, command, transport, on_output, on_result, parallel=MAX_PARALLEL, timeout=HOST_TIMEOUT,
+                  cancel=None):
+    """Runs command for every host, at most `parallel` at once; on_result(result) is called as each finishes."""
+    limit = asyncio.Semaphore(parallel)
+
+    async def one(host):
+        async with limit:
+            on_result(await run_host(host, command, transport, on_output, timeout, cancel))
+
+    await asyncio.gather(*(one(host) for host in hosts))
+
+
+def run(hosts, command, transport=None, parallel=MAX_PARALLEL, timeout=HOST_TIMEOUT, on_output=None):
+    """Blocking fan-out; returns {host: HostResult} (scripts and tests)."""
+    results = {}
+    asyncio.run(fan_out(list(dict.fromkeys(hosts)), command, transport or default_transport(),
+                        on_output or (lambda host, text: None), lambda r: results.__setitem__(r.host, r),
+                        parallel, timeout))
+    return results
+
+
+# ---------------- FAN-OUT JOB ---------------- #
+class FanoutJob:
+    """One fan-out run in the background: an asyncio loop on its own thread, results on the Tk main thread.
+
+    on_output([(host, text), ...]) and on_result(HostResult) are called on the main
+    thread, output batched every POLL_MS so a results pane can stream it; on_finished(results)
+    follows once every host is done. cancel() kills running processes and skips the rest.
+    """
+
+    def __init__(self, root, hosts, command, transport, on_output, on_result, on_finished=None,
+                 parallel=MAX_PARALLEL, timeout=HOST_TIMEOUT):
+        self.root = root
+        self.hosts = list(dict.fromkeys(hosts))
+        self.command = command
+        self.transport = transport
+        self.on_output = on_output
+        self.on_result = on_result
+        self.on_finished = on_finished
+        self.parallel = parallel
+        self.timeout = timeout
+        self.results = {}
+        self.started_at = None
+
+        self._events = queue.Queue() # ("output", host, text) / ("result", HostResult) / ("done",)
+        self._cancel = threading.Event()
+        self._thread = None
+        self._finished = False
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="fanout", daemon=True)
+        self._thread.start()
+        self.root.after(POLL_MS, self._on_poll)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def drain(self, timeout=30.0):
+        """Blocks until the run is finished and delivered (tests/scripts)."""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError("Timed out waiting for the fan-out run")
+        self._poll()
+
+    # --- INTERNALS ---
+
+    def _run(self):
+        async def main():
+            task = asyncio.ensure_future(fan_out(self.hosts, self.command, self.transport,
+                                                 lambda host, text: self._events.put(("output", host, text)),
+                                                 lambda r: self._events.put(("result", r)),
+                                                 self.parallel, self.timeout, self._cancel))
+            while not task.done():
+                if self._cancel.is_set():
+                    task.cancel() # Kills the running processes (run_host re-raises after killing)
+                    break
+                await asyncio.wait([task], timeout=0.1)
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        try:
+            asyncio.run(main())
+        finally:
+            self._events.put(("done",))
+
+    def _on_poll(self):
+        self._poll()
+        if not self._finished:
+            self.root.after(POLL_MS, self._on_poll)
+
+    def _poll(self):
+        output = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "output":
+                output.append(event[1:])
+                continue
+            self._flush_output(output)
+            if event[0] == "result":
+                self.results[event[1].host] = event[1]
+                self.on_result(event[1])
+            elif not self._finished:
+                self._finish()
+        self._flush_output(output)
+
+    def _flush_output(self, output):
+        if output:
+            self.on_output(list(output))
+            output.clear()
+
+    def _finish(self):
+        self._finished = True
+        # Hosts that never got to run (or were killed) when the run was cancelled
+        for host in self.hosts:
+            if host not in self.results:
+                self.results[host] = HostResult(host, "cancelled", None, None, "")
+                self.on_result(self.results[host])
+        if self.on_finished:
+            self.on_finished(self.results)
@@ -0,0 +1,120 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from fanout import FanoutJob
+
+COLUMNS = [("device", "Device", 200), ("ip", "IP Address", 140), ("status", "Status", 90),
+           ("exit", "Exit", 60), ("time", "Time (s)", 80)]
+
+# ---------------- FAN-OUT WINDOW ---------------- #
+class FanoutWindow:
+    """Runs one command on many devices and streams each host's output into a results pane.
+
+    The host list shows status, exit code and duration as hosts finish; the output
+    pane shows every host's output as it arrives, or only the selected host's.
+    """
+
+    def __init__(self, root, command, devices, transport, on_finished=None, **options):
+        self.devices = {}  # ip -> device names sharing it
+        for d in devices:
+            self.devices.setdefault(d.get("ip"), []).append(d.get("device", ""))
+        self.output = {ip: [] for ip in self.devices}
+        self.shown = None  # ip whose output the pane shows; None shows every host, prefixed
+        self.on_finished = on_finished
+
+        self.win = ttk.Toplevel(root)
+        self.win.title(f"Run: {command}")
+        self.win.geometry("900x600")
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+
+        header = ttk.Frame(self.win, padding=10)
+        header.pack(fill="x")
+        self.summary_var = ttk.StringVar(value=f"Running on {len(self.devices)} hosts...")
+        ttk.Label(header, textvariable=self.summary_var).pack(side="left")
+        self.cancel_btn = ttk.Button(header, text="Cancel", bootstyle="danger-outline", command=self.cancel)
+        self.cancel_btn.pack(side="right")
+        ttk.Button(header, text="All Output", bootstyle="secondary-outline",
+                   command=lambda: self.show(None)).pack(side="right", padx=5)
+
+        panes = ttk.Panedwindow(self.win, orient=VERTICAL)
+        panes.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        self.tree = ttk.Treeview(panes, show="headings", columns=[c[0] for c in COLUMNS], height=10)
+        for name, heading, width in COLUMNS:
+            self.tree.heading(name, text=heading, anchor="center")
+            self.tree.column(name, width=width, stretch=name == "device", anchor="w")
+        for ip, names in self.devices.items():
+            self.tree.insert("", "end", iid=ip, values=(", ".join(names), ip, "running", "", ""))
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self.show(self.tree.focus() or None))
+        panes.add(self.tree, weight=1)
+
+        self.text = tk.Text(panes, wrap="none", height=15, font=("Consolas", 10))
+        self.text.configure(state="disabled")
+        panes.add(self.text, weight=2)
+
+        self.job = FanoutJob(root, list(self.devices), command, transport, self._on_output, self._on_result,
+                             self._on_finished, **options)
+        self.job.start()
+
+    def show(self, ip):
+        """Switches the output pane to one host (or every host when ip is None)."""
+        self.shown = ip
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        if ip is None:
+            self.text.insert("end", "".join(f"[{ip}] {line}" for ip, lines in self.output.items() for line in lines))
+        else:
+            self.text.insert("end", "".join(self.output.get(ip, [])))
+        self.text.configure(state="disabled")
+
+    def cancel(self):
+        self.job.cancel()
+        self.cancel_btn.configure(state="disabled")
+        self.summary_var.set("Cancelling...")
+
+    def close(self):
+        if not self.job.finished:
+            self.job.cancel()
+        self.win.destroy()
+
+    # --- JOB CALLBACKS ---
+
+    def _on_output(self, batch):
+        for ip, text in batch:
+            self.output.setdefault(ip, []).append(text)
+        if self.shown is None:
+            shown = "".join(f"[{ip}] {text}" for ip, text in batch)
+        else:
+            shown = "".join(text for ip, text in batch if ip == self.shown)
+        if shown:
+            try:
+                self.text.configure(state="normal")
+                self.text.insert("end", shown)
+                self.text.see("end")
+                self.text.configure(state="disabled")
+            except tk.TclError:
+                pass # Window was closed
+
+    def _on_result(self, result):
+        exit_code = "" if result.exit_code is None else result.exit_code
+        duration = "" if result.duration_ms is None else f"{result.duration_ms / 1000:.1f}"
+        try:
+            self.tree.set(result.host, "status", result.status)
+            self.tree.set(result.host, "exit", exit_code)
+            self.tree.set(result.host, "time", duration)
+            done = len(self.job.results)
+            self.summary_var.set(f"{done} of {len(self.devices)} hosts done")
+        except tk.TclError:
+            pass
+
+    def _on_finished(self, results):
+        counts = {}
+        for r in results.values():
+            counts[r.status] = counts.get(r.status, 0) + 1
+        try:
+            self.summary_var.set("Finished: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+            self.cancel_btn.configure(state="disabled")
+        except tk.TclError:
+            pass
+        if self.on_finished:
+            self.on_finished(self.job)
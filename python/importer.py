@@ -0,0 +1,188 @@
+import codecs
+import gzip
+import json
+import os
+import re
+
+CHUNK_SIZE = 1 << 16           # Bytes read from disk per step
+IMPORT_BATCH_SIZE = 500        # Max records per upload request
+IMPORT_BATCH_BYTES = 64 * 1024 # Max (approximate) JSON bytes per upload request; keeps under the server's body limit
+MAX_RECORD_CHARS = 1 << 20     # A single record larger than this means the file is malformed
+
+_SKIP = re.compile(r"[\s,]*")  # Whitespace and array separators between records
+
+
+def iter_records(path, progress=None):
+    """Yields the JSON values of a file one at a time, without loading the whole file.
+
+    Accepts a JSON array of records or NDJSON (one record per line), either of which
+    may be gzip-compressed. progress(bytes_read, total_bytes) is called after each chunk.
+    Raises ValueError on malformed input.
+    """
+    total = os.path.getsize(path)
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+
+    with open(path, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+        raw.seek(0)
+        stream = gzip.GzipFile(fileobj=raw) if compressed else raw
+
+        buf, pos = "", 0
+        in_array = None # Decided by the first non-blank character
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            buf = buf[pos:] + text.decode(chunk, final=not chunk)
+            pos = 0
+            while True:
+                pos = _SKIP.match(buf, pos).end()
+                if pos >= len(buf):
+                    break
+                if in_array is None:
+                    in_array = buf[pos] == "["
+                    if in_array:
+                        pos += 1
+                        continue
+                if in_array and buf[pos] == "]":
+                    if progress:
+                        progress(total, total)
+                    return
+                try:
+                    value, pos = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if not chunk or len(buf) - pos > MAX_RECORD_CHARS:
+                        raise ValueError(f"Malformed JSON near byte {raw.tell()}: {e.msg}") from None
+                    break # Record continues in the next chunk
+                yield value
+            if progress:
+                progress(raw.tell(), total)
+            if not chunk:
+                if in_array:
+                    raise ValueError("Unexpected end of file inside JSON array")
+                return
+
+
+# --- RECORD VALIDATION ---
+
+def command_record(raw):
+    """Returns the importable fields of a command, or None if it is invalid."""
+    if not isinstance(raw, dict) or not raw.get("command"):
+        return None
+    return {"command": str(raw["command"]), "description": str(raw.get("description") or "")}
+
+
+def device_record(raw):
+    """Returns the importable fields of a device, or None if it is invalid."""
+    if not isinstance(raw, dict) or not raw.get("device") or not raw.get("ip"):
+        return None
+    return {"device": str(raw["device"]), "ip": str(raw["ip"])}
+
+
+def device_key(record):
+    """Identity used to spot duplicate devices: case-insensitive name plus IP (same rule as the server)."""
+    return (str(record.get("device", "")).strip().lower(), str(record.get("ip", "")).strip())
+
+
+# ---------------- IMPORT ---------------- #
+class ImportReport:
+    """Running totals for an import; also the final result."""
+
+    def __init__(self):
+        self.imported = 0   # Records the server accepted
+        self.skipped = 0    # Records that failed validation
+        self.failed = 0     # Records in batches, or individual records, the server rejected
+        self.duplicates = 0 # Records already present (locally or on the server)
+        self.batches = 0
+        self.batch_errors = [] # (batch number, message)
+        self.item_errors = []  # Messages about individual records the server rejected
+        self.cancelled = False
+        self.error = None   # Parse error that stopped the import early
+
+    def summary(self):
+        lines = [f"{self.imported} imported, {self.skipped} skipped (invalid), {self.failed} failed."]
+        if self.duplicates:
+            lines.append(f"{self.duplicates} duplicates were not imported again.")
+        if self.cancelled:
+            lines.append("Import was cancelled; records after that point were not sent.")
+        if self.error:
+            lines.append(f"Stopped early: {self.error}")
+        for number, message in self.batch_errors[:10]:
+            lines.append(f"Batch {number}: {message}")
+        if len(self.batch_errors) > 10:
+            lines.append(f"...and {len(self.batch_errors) - 10} more failed batches.")
+        for message in self.item_errors[:10]:
+            lines.append(message)
+        if len(self.item_errors) > 10:
+            lines.append(f"...and {len(self.item_errors) - 10} more rejected records.")
+        return "\n".join(lines)
+
+
+def import_records(path, validate, upload, batch_size=IMPORT_BATCH_SIZE, batch_bytes=IMPORT_BATCH_BYTES,
+                   progress=None, cancel=None, dedupe_key=None, existing=()):
+    """Streams records from path, validates them, and uploads them in bounded batches.
+
+    upload(batch) sends one list of records and returns (ok, message), or
+    (ok, message, outcome) when the server reports per-record results; outcome is a
+    dict with "duplicates" (count) and "errors" (messages), and the remaining records
+    count as imported. An exception counts as a failed batch. A failed batch is
+    recorded and the import carries on.
+    With dedupe_key, records whose key was already seen in the file or in existing
+    (records already held locally) are counted as duplicates and never sent.
+    progress(report, fraction) is called as the file is read. Setting the cancel
+    event stops before the next record. Runs entirely on the calling thread.
+    """
+    report = ImportReport()
+    batch, size = [], 0
+
+    seen = {dedupe_key(r) for r in existing} if dedupe_key else None
+
+    def flush():
+        report.batches += 1
+        outcome = None
+        try:
+            ok, message, *rest = upload(batch)
+            outcome = rest[0] if rest else None
+        except Exception as e:
+            ok, message = False, str(e)
+        if ok and outcome:
+            duplicates, errors = outcome.get("duplicates", 0), outcome.get("errors", [])
+            report.duplicates += duplicates
+            report.failed += len(errors)
+            report.item_errors.extend(errors)
+            report.imported += len(batch) - duplicates - len(errors)
+        elif ok:
+            report.imported += len(batch)
+        else:
+            report.failed += len(batch)
+            report.batch_errors.append((report.batches, message or "rejected"))
+
+    def on_progress(done, total):
+        if progress:
+            progress(report, done / total if total else 1.0)
+
+    try:
+        for raw in iter_records(path, on_progress):
+            if cancel is not None and cancel.is_set():
+                report.cancelled = True
+                break
+            record = validate(raw)
+            if record is None:
+                report.skipped += 1
+                continue
+            if seen is not None:
+                key = dedupe_key(record)
+                if key in seen:
+                    report.duplicates += 1
+                    continue
+                seen.add(key)
+            batch.append(record)
+            size += len(json.dumps(record))
+            if len(batch) >= batch_size or size >= batch_bytes:
+                flush()
+                batch, size = [], 0
+    except ValueError as e:
+        report.error = str(e)
+
+    if batch and not report.cancelled:
+        flush()
+    return report
@@ -0,0 +1,136 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+log = logging.getLogger("command_manager.perf")
+
+# Off by default; COMMAND_MANAGER_PROFILE=1 turns it on from the start, the diagnostics window toggles it
+enabled = os.environ.get("COMMAND_MANAGER_PROFILE", "") not in ("", "0")
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+# ---------------- HISTOGRAM ---------------- #
+class Histogram:
+    """Latency distribution and payload sizes for one operation."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.total_size = 0 # Bytes for network/decode spans, rows for filter/render spans
+        self.max_size = 0
+
+    def add(self, ms, size):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if size is not None:
+            self.total_size += size
+            self.max_size = max(self.max_size, size)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (0-100), capped at the observed max."""
+        target = self.count * p / 100
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": self.max_ms,
+            "mean_size": self.total_size / self.count if self.count else 0,
+            "max_size": self.max_size,
+            "buckets": {str(b): n for b, n in zip(BUCKETS_MS, self.counts) if n},
+        }
+
+
+# ---------------- SPANS ---------------- #
+class _Span:
+    __slots__ = ("name", "size", "start")
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, (time.perf_counter() - self.start) * 1000, self.size)
+        return False
+
+
+class _NullSpan:
+    """Shared do-nothing span handed out while instrumentation is off."""
+    __slots__ = ()
+    size = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass # Callers may set .size once they know it
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, size=None):
+    """Times a with-block as one sample of operation `name`; set .size on the span if it is known only later."""
+    return _Span(name, size) if enabled else _NULL_SPAN
+
+
+def record(name, ms, size=None):
+    """Adds a measurement taken elsewhere."""
+    if not enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(ms, size)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(json.dumps({"op": name, "ms": round(ms, 3), "size": size}))
+
+
+def set_enabled(on):
+    global enabled
+    enabled = bool(on)
+
+
+def snapshot():
+    """Returns {operation: summary dict} for everything recorded so far."""
+    with _lock:
+        return {name: h.summary() for name, h in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def dump(path):
+    """Writes the current snapshot to a JSON file."""
+    with open(path, "w") as f:
+        json.dump({"timestamp": time.time(), "operations": snapshot()}, f, indent=2)
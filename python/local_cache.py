@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+APP_DIR_NAME = "CommandGrimoire"
+CACHE_FILE = "cache.sqlite3"
+RUN_HISTORY_LIMIT = 5000 # Fan-out host results kept per user (oldest dropped first)
+
+
+def default_data_dir():
+    """Per-user application data directory (override with COMMAND_MANAGER_DATA)."""
+    override = os.environ.get("COMMAND_MANAGER_DATA")
+    if override:
+        return override
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, APP_DIR_NAME)
+
+
+# ---------------- LOCAL CACHE ---------------- #
+class LocalCache:
+    """SQLite store of each user's last known commands/devices, session token, queued edits and run history.
+
+    Lets the app paint its tables from disk before the server answers, and keep
+    search and copy working while the server is unreachable. Safe to use from
+    worker threads; all access goes through one connection guarded by a lock.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(default_data_dir(), exist_ok=True)
+            path = os.path.join(default_data_dir(), CACHE_FILE)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    username   TEXT NOT NULL,
+                    kind       TEXT NOT NULL,
+                    revision   INTEGER,
+                    etag       TEXT,
+                    payload    TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (username, kind)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    username   TEXT PRIMARY KEY,
+                    token      TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS mutations (
+                    username TEXT NOT NULL,
+                    kind     TEXT NOT NULL,
+                    item_id  TEXT NOT NULL,
+                    fields   TEXT NOT NULL,
+                    seq      INTEGER NOT NULL,
+                    PRIMARY KEY (username, kind, item_id)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    username    TEXT NOT NULL,
+                    started_at  REAL NOT NULL,
+                    command     TEXT NOT NULL,
+                    host        TEXT NOT NULL,
+                    status      TEXT NOT NULL,
+                    exit_code   INTEGER,
+                    duration_ms REAL,
+                    output      TEXT
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_by_user ON runs (username, started_at)")
+
+    # --- SNAPSHOTS ---
+
+    def save_snapshot(self, username, kind, items, revision=None, etag=None):
+        """Stores the full commands/devices list for a user, replacing the previous one."""
+        payload = json.dumps(items, separators=(",", ":"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (username, kind, revision, etag, payload, time.time()))
+
+    def load_snapshot(self, username, kind):
+        """Returns {"items", "revision", "etag", "updated_at"} for a user's list, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, revision, etag, updated_at FROM snapshots WHERE username = ? AND kind = ?",
+                (username, kind)).fetchone()
+        if not row:
+            return None
+        return {"items": json.loads(row[0]), "revision": row[1], "etag": row[2], "updated_at": row[3]}
+
+    # --- SESSIONS ---
+
+    def save_session(self, username, token):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (username, token, time.time()))
+
+    def load_session(self, username):
+        """Returns the saved token for username, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT token FROM sessions WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def last_session(self):
+        """Returns (username, token) of the most recent login, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT username, token FROM sessions ORDER BY updated_at DESC LIMIT 1").fetchone()
+        return tuple(row) if row else None
+
+    def clear_session(self, username):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE username = ?", (username,))
+
+    # --- MUTATION QUEUE ---
+    # Field updates not yet acknowledged by the server, one coalesced row per item.
+    # seq orders writes: a save never overwrites a newer one, and a delete only
+    # removes the version that was actually sent.
+
+    def save_mutation(self, username, kind, item_id, fields, seq):
+        """Stores the merged pending fields of an item, unless a newer version is already stored."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO mutations VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (username, kind, item_id) DO UPDATE
+                   SET fields = excluded.fields, seq = excluded.seq WHERE excluded.seq > mutations.seq""",
+                (username, kind, json.dumps(item_id), json.dumps(fields), seq))
+
+    def delete_mutations(self, username, sent):
+        """Removes delivered mutations; sent is a list of (kind, item_id, seq)."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM mutations WHERE username = ? AND kind = ? AND item_id = ? AND seq <= ?",
+                [(username, kind, json.dumps(item_id), seq) for kind, item_id, seq in sent])
+
+    def load_mutations(self, username):
+        """Returns the pending mutations as [(kind, item_id, fields, seq)], oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, item_id, fields, seq FROM mutations WHERE username = ? ORDER BY seq",
+                (username,)).fetchall()
+        return [(kind, json.loads(item_id), json.loads(fields), seq) for kind, item_id, fields, seq in rows]
+
+    # --- RUN HISTORY ---
+    # One row per host of each fan-out run: exit code, duration and the tail of its output.
+
+    def save_run(self, username, command, started_at, results):
+        """Stores the HostResults of a finished run and trims the user's history to RUN_HISTORY_LIMIT rows."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(username, started_at, command, r.host, r.status, r.exit_code, r.duration_ms, r.output)
+                 for r in results])
+            self._conn.execute(
+                """DELETE FROM runs WHERE username = ? AND rowid NOT IN
+                   (SELECT rowid FROM runs WHERE username = ? ORDER BY started_at DESC, rowid DESC LIMIT ?)""",
+                (username, username, RUN_HISTORY_LIMIT))
+
+    def load_runs(self, username, limit=100):
+        """Returns the user's most recent host results, newest first, as dicts."""
+        with self._lock:
+            cursor = self._conn.execute(
+                """SELECT started_at, command, host, status, exit_code, duration_ms, output FROM runs
+                   WHERE username = ? ORDER BY started_at DESC, rowid LIMIT ?""", (username, limit))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_cache(path=None):
+    """Opens the local cache, or returns None if the data directory is unusable."""
+    try:
+        return LocalCache(path)
+    except (OSError, sqlite3.Error):
+        return None
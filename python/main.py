@@ -1,7 +1,13 @@
 # main.py
 
-from auth_screen import AuthScreen
+import startup
+import sys
 
 # ---------------- START APP ---------------- #
 if __name__ == "__main__":
-    AuthScreen()
\ No newline at end of file
+    # --profile-startup prints how long it took to reach the login window and the first table
+    startup.enabled = "--profile-startup" in sys.argv[1:]
+    startup.mark("main started")
+    from auth_screen import AuthScreen
+    startup.mark("auth_screen imported")
+    AuthScreen()
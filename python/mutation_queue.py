@@ -0,0 +1,127 @@
+import requests
+
+FLUSH_INTERVAL_MS = 5000   # Pending edits are sent this long after the first one is queued
+FLUSH_SIZE = 50            # ...or as soon as this many items have pending edits
+MAX_RETRY_MS = 60000       # Cap on the back-off while the server is unreachable
+BATCH_LIMIT = 500          # Items per request (the server's bulk-update limit)
+
+
+# ---------------- MUTATION QUEUE ---------------- #
+class MutationQueue:
+    """Write-behind queue of field updates to commands/devices (e.g. last_used bumps).
+
+    Updates to the same item are coalesced into one pending entry (later values
+    win) and sent in batches through send(kind, updates), on a timer or once the
+    queue fills. Entries are persisted in the local cache when one is given, so
+    they survive a restart and are replayed when the server is reachable again.
+    Runs on the Tk main thread; requests go through the TaskRunner. The local cache
+    is written in place (single-row SQLite writes), so a delivered entry can never
+    be deleted before its save has landed and come back on the next start.
+    """
+
+    def __init__(self, root, runner, send, store=None, username=None, interval_ms=FLUSH_INTERVAL_MS,
+                 flush_size=FLUSH_SIZE, on_flushed=None):
+        self.root = root
+        self.runner = runner
+        self.send = send
+        self.store = store
+        self.username = username
+        self.interval_ms = interval_ms
+        self.flush_size = flush_size
+        self.on_flushed = on_flushed # on_flushed(kind, response) after the server accepted a batch
+
+        self._pending = {}   # (kind, item_id) -> (fields, seq)
+        self._seq = 0
+        self._inflight = set() # kinds with a request outstanding
+        self._timer = None
+        self._delay = interval_ms
+
+        if store:
+            for kind, item_id, fields, seq in store.load_mutations(username):
+                self._pending[(kind, item_id)] = (fields, seq)
+                self._seq = max(self._seq, seq)
+        if self._pending:
+            self._schedule(0) # Replay what was left over from the last session
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending(self, kind, item_id):
+        """Returns the fields still waiting to be sent for an item, or None."""
+        entry = self._pending.get((kind, item_id))
+        return dict(entry[0]) if entry else None
+
+    def update(self, kind, item_id, fields):
+        """Queues field changes for an item, merging them with any not yet sent."""
+        entry = self._pending.get((kind, item_id))
+        merged = {**entry[0], **fields} if entry else dict(fields)
+        self._seq += 1
+        seq = self._seq
+        self._pending[(kind, item_id)] = (merged, seq)
+        if self.store:
+            self.store.save_mutation(self.username, kind, item_id, merged, seq)
+
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+        else:
+            self._schedule(self.interval_ms)
+
+    def flush(self):
+        """Sends every pending entry now (one request per kind, at most BATCH_LIMIT items each)."""
+        self._cancel_timer()
+        kinds = {kind for kind, _ in self._pending} - self._inflight
+        for kind in kinds:
+            batch = [(item_id, fields, seq) for (k, item_id), (fields, seq) in self._pending.items()
+                     if k == kind][:BATCH_LIMIT]
+            updates = [{"id": item_id, **fields} for item_id, fields, _ in batch]
+            self._inflight.add(kind)
+            self.runner.submit(lambda kind=kind, updates=updates: self.send(kind, updates),
+                               on_success=lambda resp, kind=kind, batch=batch: self._sent(kind, batch, resp),
+                               on_error=lambda e, kind=kind, batch=batch: self._failed(kind, batch, e))
+
+    # --- INTERNALS ---
+
+    def _schedule(self, delay_ms):
+        if self._timer is None:
+            self._timer = self.root.after(delay_ms, self._on_timer)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+
+    def _on_timer(self):
+        self._timer = None
+        self.flush()
+
+    def _settle(self, kind, batch):
+        """Drops the sent versions of the batch's entries; edits queued since then stay pending."""
+        for item_id, _, seq in batch:
+            entry = self._pending.get((kind, item_id))
+            if entry and entry[1] == seq:
+                del self._pending[(kind, item_id)]
+        if self.store:
+            self.store.delete_mutations(self.username, [(kind, item_id, seq) for item_id, _, seq in batch])
+
+    def _sent(self, kind, batch, response):
+        self._inflight.discard(kind)
+        # Rejected batches are dropped too: resending the same edits would only fail again
+        self._settle(kind, batch)
+        self._delay = self.interval_ms
+        if response.get("success") and self.on_flushed:
+            self.on_flushed(kind, response)
+        if self._pending:
+            self._schedule(self.interval_ms)
+
+    def _failed(self, kind, batch, e):
+        self._inflight.discard(kind)
+        response = getattr(e, "response", None)
+        # 400/413: the batch itself is invalid. Other errors (including the 404 an expired token gets) may pass later.
+        if isinstance(e, requests.exceptions.HTTPError) and response is not None and response.status_code in (400, 413):
+            self._settle(kind, batch)
+            if self._pending:
+                self._schedule(self.interval_ms)
+            return
+        # Unreachable or failing server: keep everything and retry with exponential back-off
+        self._delay = min(self._delay * 2, MAX_RETRY_MS)
+        self._schedule(self._delay)
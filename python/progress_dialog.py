@@ -0,0 +1,61 @@
+import threading
+import tkinter as tk
+import ttkbootstrap as ttk
+
+POLL_MS = 100 # How often the window picks up progress reported by the worker
+
+# ---------------- PROGRESS DIALOG ---------------- #
+class ProgressDialog:
+    """Small window with a progress bar and a Cancel button for a long background job.
+
+    The worker thread calls report() and checks cancel_event; it never touches Tk.
+    The window polls the last reported values on the main thread.
+    """
+
+    def __init__(self, root, title):
+        self.cancel_event = threading.Event()
+        self._fraction = 0.0
+        self._text = "Starting..."
+        self._closed = False
+
+        self.win = ttk.Toplevel(root)
+        self.win.title(title)
+        self.win.geometry("420x150")
+        self.win.resizable(False, False)
+        self.win.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        main_frame = ttk.Frame(self.win, padding=20)
+        main_frame.pack(fill="both", expand=True)
+
+        self.text_var = ttk.StringVar(value=self._text)
+        ttk.Label(main_frame, textvariable=self.text_var).pack(fill="x")
+        self.bar = ttk.Progressbar(main_frame, mode="determinate", maximum=100, bootstyle="success-striped")
+        self.bar.pack(fill="x", pady=10)
+        self.cancel_btn = ttk.Button(main_frame, text="Cancel", bootstyle="danger-outline", command=self.cancel)
+        self.cancel_btn.pack()
+
+        self._poll()
+
+    def report(self, fraction, text):
+        """Records progress; safe to call from any thread."""
+        self._fraction = fraction
+        self._text = text
+
+    def cancel(self):
+        self.cancel_event.set()
+        self._text = "Cancelling..."
+        self.cancel_btn.configure(state="disabled")
+
+    def close(self):
+        self._closed = True
+        try:
+            self.win.destroy()
+        except tk.TclError:
+            pass
+
+    def _poll(self):
+        if self._closed:
+            return
+        self.bar["value"] = self._fraction * 100
+        self.text_var.set(self._text)
+        self.win.after(POLL_MS, self._poll)
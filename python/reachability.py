@@ -0,0 +1,222 @@
+import asyncio
+import errno
+import ipaddress
+import queue
+import threading
+import time
+from collections import namedtuple
+
+PORTS = (22,)              # TCP ports probed on each device; the first that accepts marks it up
+PROBE_TIMEOUT = 1.0        # Seconds per host before it counts as down
+MAX_CONCURRENCY = 256      # Hosts probed at once (each holds one socket per port)
+RESULT_TTL = 120           # Seconds a result is reused before the host is probed again
+RESCAN_INTERVAL_MS = 60000 # Background sweep interval; 0 disables it (only stale hosts are probed)
+POLL_MS = 100              # How often the main thread picks up results while a sweep runs
+
+# state: "up" (a port accepted), "closed" (the host refused every port), "down" (no answer in time),
+# "invalid" (not an IP address or host name); latency_ms is the fastest connect or refusal
+Status = namedtuple("Status", ["state", "latency_ms", "port", "checked_at"])
+
+_REFUSED = {errno.ECONNREFUSED, errno.ECONNRESET}
+
+
+def _valid_host(host):
+    # A leading "-" would read as an option to tools (ssh, ping) given the host
+    if not host or host.startswith("-") or any(c.isspace() for c in host):
+        return False
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        # Dotted quads that fail to parse (e.g. 300.1.1.1) are typos, not host names
+        return not host.replace(".", "").isdigit()
+
+
+async def _connect(host, port, timeout):
+    """Returns (state, latency_ms) for one TCP connect attempt."""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except asyncio.TimeoutError:
+        return "down", None
+    except OSError as e:
+        if isinstance(e, ConnectionRefusedError) or e.errno in _REFUSED:
+            return "closed", (time.perf_counter() - start) * 1000
+        return "down", None
+    latency = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return "up", latency
+
+
+async def probe(host, ports=PORTS, timeout=PROBE_TIMEOUT):
+    """Probes every port of a host at once and returns its Status."""
+    if not _valid_host(host):
+        return Status("invalid", None, None, time.time())
+    results = await asyncio.gather(*(_connect(host, port, timeout) for port in ports))
+    for state in ("up", "closed"):
+        hits = [(latency, port) for (s, latency), port in zip(results, ports) if s == state]
+        if hits:
+            latency, port = min(hits)
+            return Status(state, round(latency, 1), port if state == "up" else None, time.time())
+    return Status("down", None, None, time.time())
+
+
+async def scan(hosts, on_result, ports=PORTS, timeout=PROBE_TIMEOUT, concurrency=MAX_CONCURRENCY, cancel=None):
+    """Probes hosts with at most `concurrency` in flight, calling on_result(host, status) as each finishes."""
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(host):
+        async with limit:
+            if cancel is not None and cancel.is_set():
+                return
+            on_result(host, await probe(host, ports, timeout))
+
+    await asyncio.gather(*(one(host) for host in hosts))
+
+
+def sweep(hosts, ports=PORTS, timeout=PROBE_TIMEOUT, concurrency=MAX_CONCURRENCY):
+    """Blocking scan; returns {host: Status} (scripts and tests)."""
+    results = {}
+    asyncio.run(scan(list(dict.fromkeys(hosts)), results.__setitem__, ports, timeout, concurrency))
+    return results
+
+
+def label(status):
+    """Short text for the Devices table's Status column."""
+    if status is None:
+        return ""
+    if status.state == "up":
+        return f"up {status.latency_ms:.0f} ms"
+    return status.state
+
+
+# ---------------- REACHABILITY SCANNER ---------------- #
+class ReachabilityScanner:
+    """Keeps a TTL cache of device reachability, refreshed by background sweeps.
+
+    Each sweep runs an asyncio event loop on its own thread, so hundreds of slow
+    hosts never tie up the TaskRunner's workers. Results are keyed by address
+    (devices sharing an IP are probed once) and handed to on_results({host: Status})
+    on the Tk main thread in batches as they arrive, so the table fills in while
+    the sweep is still running. Only one sweep runs at a time; a request made
+    meanwhile starts as soon as it finishes.
+    """
+
+    def __init__(self, root, on_results, ports=PORTS, timeout=PROBE_TIMEOUT, concurrency=MAX_CONCURRENCY,
+                 ttl=RESULT_TTL, interval_ms=RESCAN_INTERVAL_MS):
+        self.root = root
+        self.on_results = on_results
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.interval_ms = interval_ms
+
+        self._results = {}    # host -> Status (main thread only)
+        self._done = queue.Queue() # (host, Status) from the sweep thread; None marks the end of a sweep
+        self._thread = None
+        self._cancel = threading.Event()
+        self._next = None     # Hosts requested while a sweep was running
+        self._poll_job = None
+        self._timer = None
+
+    def status(self, host):
+        """The last known Status of a host (possibly older than the TTL), or None."""
+        return self._results.get(host)
+
+    def stale(self, hosts):
+        """The hosts without a result younger than the TTL, without duplicates."""
+        now = time.time()
+        return [h for h in dict.fromkeys(hosts)
+                if h not in self._results or now - self._results[h].checked_at >= self.ttl]
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def scan(self, hosts, force=False):
+        """Probes the given hosts (only the stale ones unless force) in the background."""
+        hosts = list(dict.fromkeys(hosts)) if force else self.stale(hosts)
+        if not hosts:
+            return
+        if self.running:
+            self._next = list(dict.fromkeys((self._next or []) + hosts))
+            return
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._run, args=(hosts,), name="reachability", daemon=True)
+        self._thread.start()
+        self._ensure_polling()
+
+    def start(self, get_hosts):
+        """Sweeps get_hosts() now and then every interval_ms (if enabled)."""
+        self.scan(get_hosts())
+        if self.interval_ms:
+            self._arm(get_hosts)
+
+    def stop(self):
+        """Cancels the periodic sweep and the probes not yet started."""
+        self._cancel.set()
+        self._next = None
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+
+    def drain(self, timeout=10.0):
+        """Blocks until the running (and any queued) sweep is finished and delivered (tests/scripts)."""
+        deadline = time.monotonic() + timeout
+        while self.running:
+            self._thread.join(max(0, deadline - time.monotonic()))
+            if self._thread.is_alive():
+                raise TimeoutError("Timed out waiting for the reachability sweep")
+            self._poll()
+
+    # --- INTERNALS ---
+
+    def _arm(self, get_hosts):
+        def tick():
+            self._timer = None
+            self.scan(get_hosts())
+            self._arm(get_hosts)
+
+        self._timer = self.root.after(self.interval_ms, tick)
+
+    def _run(self, hosts):
+        try:
+            asyncio.run(scan(hosts, lambda host, status: self._done.put((host, status)), self.ports, self.timeout,
+                             self.concurrency, self._cancel))
+        finally:
+            self._done.put(None)
+
+    def _ensure_polling(self):
+        if self._poll_job is None:
+            self._poll_job = self.root.after(POLL_MS, self._on_poll)
+
+    def _on_poll(self):
+        self._poll_job = None
+        self._poll()
+        if self.running:
+            self._ensure_polling()
+
+    def _poll(self):
+        batch, finished = {}, False
+        while True:
+            try:
+                item = self._done.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+            else:
+                batch[item[0]] = item[1]
+        self._results.update(batch)
+        if batch:
+            self.on_results(batch)
+        if finished:
+            self._thread = None
+            queued, self._next = self._next, None
+            if queued:
+                self.scan(queued)
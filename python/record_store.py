@@ -0,0 +1,289 @@
+import sys
+from search_index import SearchIndex
+
+_MISSING = object()
+
+
+# ---------------- RECORDS ---------------- #
+class Record:
+    """Compact, read-only row: a fixed set of slots instead of a per-row dict.
+
+    Behaves like the JSON dict it came from for reads (get, [], ==), so the table,
+    search index, exporter and importer treat records and dicts alike. Fields
+    listed in INTERNED share one string object across rows (dates, descriptions).
+    Unknown keys from the server are kept in `extra`. Changing a record means
+    building a new one with replace(); stores swap whole records, so snapshots
+    handed to worker threads never change underneath them.
+    """
+    __slots__ = ("extra",)
+    FIELDS = ()
+    INTERNED = frozenset()
+    _field_set = frozenset()
+
+    def __init__(self, data):
+        for field in self.FIELDS:
+            value = data.get(field)
+            if field in self.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, field, value)
+        extra = {k: v for k, v in data.items() if k not in self._field_set}
+        object.__setattr__(self, "extra", extra or None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; use replace()")
+
+    def get(self, field, default=None):
+        if field in self._field_set:
+            value = getattr(self, field)
+        else:
+            value = self.extra.get(field) if self.extra else None
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        value = self.get(field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return self.get(field) is not None
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self):
+        """The record as a plain JSON-ready dict (fields that were never set are left out)."""
+        data = {f: getattr(self, f) for f in self.FIELDS if getattr(self, f) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def replace(self, **fields):
+        """Returns a copy with some fields changed."""
+        return type(self)({**self.to_dict(), **fields})
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return self.to_dict() == other if isinstance(other, dict) else NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def _record_type(name, fields, interned=()):
+    return type(name, (Record,), {"__slots__": tuple(fields), "FIELDS": tuple(fields),
+                                  "INTERNED": frozenset(interned), "_field_set": frozenset(fields)})
+
+
+CommandRecord = _record_type("CommandRecord", ["id", "command", "description", "last_used", "rev"],
+                             interned=["description", "last_used"])
+DeviceRecord = _record_type("DeviceRecord", ["id", "device", "ip", "rev"])
+
+
+# ---------------- RECORD STORE ---------------- #
+class RecordStore:
+    """The client's copy of one list (commands or devices), in display order.
+
+    Holds Record objects plus an id -> position map, so lookups and removals by id
+    do not scan the list, and owns the list's SearchIndex, which is built on the
+    first search after a full sync (or on a worker, see new_index) and patched as
+    rows are added, changed or removed. Ids are matched as strings, like the server's delta responses.
+    Mutate only on the main thread; give workers snapshot().
+    """
+
+    def __init__(self, kind, record_type, search_fields, items=()):
+        self.kind = kind
+        self.record_type = record_type
+        self._index = SearchIndex(search_fields)
+        self._generation = 0 # Bumped by every write, so an index built from an older snapshot can be told apart
+        self.replace(items)
+
+    # --- READS ---
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, position):
+        return self._rows[position]
+
+    def __eq__(self, other):
+        if isinstance(other, RecordStore):
+            other = other._rows
+        return self._rows == list(other) if isinstance(other, (list, tuple)) else NotImplemented
+
+    __hash__ = None
+
+    def get(self, item_id):
+        """Returns the record with this id, or None."""
+        position = self._pos.get(str(item_id))
+        return None if position is None else self._rows[position]
+
+    def position(self, item_id):
+        return self._pos.get(str(item_id))
+
+    def snapshot(self):
+        """A list of the current records that later changes to the store will not affect."""
+        return list(self._rows)
+
+    def to_dicts(self, rows=None):
+        return [r.to_dict() for r in (self._rows if rows is None else rows)]
+
+    @property
+    def indexed(self):
+        return self._indexed
+
+    def build_index(self):
+        self._index.build(self._rows)
+        self._indexed = True
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def new_index(self, rows):
+        """Builds a search index over rows (a snapshot()) without touching the store; safe on a worker."""
+        index = SearchIndex(self._index.fields)
+        index.build(rows)
+        return index
+
+    def install_index(self, index, generation):
+        """Adopts an index built by new_index() from the snapshot taken at `generation`.
+        Returns False (and keeps the current one) if the store has been written since."""
+        if generation != self._generation:
+            return False
+        self._index, self._indexed = index, True
+        return True
+
+    def search(self, query, field=None):
+        """Records matching every term of query in field (or in any search field when None)."""
+        if not self._indexed:
+            self.build_index()
+        return self._index.search(query, field)
+
+    def scan(self, query, field=None, rows=None):
+        """Same results as search(), from one pass over the rows (or over `rows` only, e.g. a page just added);
+        cheaper than building the index for a single query."""
+        terms = query.lower().split()
+        fields = self._index.fields if field is None else [field]
+        return [r for r in (self._rows if rows is None else rows)
+                if all(any(t in str(r.get(f, "")).lower() for f in fields) for t in terms)]
+
+    # --- WRITES ---
+
+    def replace(self, items):
+        """Replaces the whole list (a full sync); the search index is rebuilt on the next search."""
+        self._rows = [self._coerce(item) for item in items]
+        self._reindex_positions()
+        self._indexed = False
+        self._generation += 1
+
+    def append(self, item):
+        record = self._coerce(item)
+        self._generation += 1
+        self._pos[str(record.get("id"))] = len(self._rows)
+        self._rows.append(record)
+        if self._indexed:
+            self._index.add(record)
+        return record
+
+    def extend(self, items):
+        """Appends a page of items; one whose id is already present replaces that record in place.
+        Returns the records appended."""
+        appended = []
+        for item in items:
+            if not self.set(item.get("id"), item):
+                appended.append(self.append(item))
+        return appended
+
+    def insert(self, position, item):
+        """Inserts at a position; the index cannot keep that order, so it is rebuilt on the next search."""
+        record = self._coerce(item)
+        self._rows.insert(position, record)
+        self._reindex_positions(position)
+        self._indexed = False
+        self._generation += 1
+        return record
+
+    def set(self, item_id, item):
+        """Replaces the record with id item_id in place (item may carry a different id)."""
+        position = self._pos.get(str(item_id))
+        if position is None:
+            return None
+        old, record = self._rows[position], self._coerce(item)
+        self._generation += 1
+        self._rows[position] = record
+        if str(record.get("id")) != str(item_id):
+            del self._pos[str(item_id)]
+            self._pos[str(record.get("id"))] = position
+            if self._indexed:
+                self._index.remove(old.get("id"))
+        if self._indexed:
+            self._index.add(record)
+        return record
+
+    def update(self, item_id, **fields):
+        """Changes fields of a record (by building a new one); returns it, or None if the id is unknown."""
+        record = self.get(item_id)
+        return None if record is None else self.set(item_id, record.replace(**fields))
+
+    def remove(self, *item_ids):
+        """Removes records by id; unknown ids are ignored. Returns the number removed."""
+        doomed = {str(i) for i in item_ids} & self._pos.keys()
+        if not doomed:
+            return 0
+        self._generation += 1
+        if self._indexed:
+            for key in doomed:
+                self._index.remove(self._rows[self._pos[key]].get("id"))
+        first = min(self._pos[key] for key in doomed)
+        if len(doomed) == 1:
+            del self._rows[first]
+        else:
+            self._rows[first:] = [r for r in self._rows[first:] if str(r.get("id")) not in doomed]
+        for key in doomed:
+            del self._pos[key]
+        self._reindex_positions(first)
+        return len(doomed)
+
+    def apply_delta(self, changed, removed_ids):
+        """Merges a delta: changed items replace theirs in place or are appended; removals win."""
+        for item in changed:
+            if not self.set(item.get("id"), item):
+                self.append(item)
+        self.remove(*removed_ids)
+
+    def apply_sync_response(self, data):
+        """Applies a GET /commands or /devices body: a full list, or a delta merged by apply_delta()."""
+        if data.get("delta"):
+            self.apply_delta(data.get(self.kind, []), data.get("removed", []))
+        else:
+            self.replace(data.get(self.kind, []))
+
+    # --- INTERNALS ---
+
+    def _coerce(self, item):
+        return item if type(item) is self.record_type else self.record_type(item)
+
+    def _reindex_positions(self, start=0):
+        if start == 0:
+            self._pos = {}
+        rows = self._rows
+        for position in range(start, len(rows)):
+            self._pos[str(rows[position].get("id"))] = position
+
+
+def command_store(items=()):
+    return RecordStore("commands", CommandRecord, ["command", "description", "last_used"], items)
+
+
+def device_store(items=()):
+    return RecordStore("devices", DeviceRecord, ["device", "ip"], items)
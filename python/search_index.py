@@ -0,0 +1,150 @@
+import sys
+from collections import defaultdict
+
+GRAM = 3  # Trigram index; shorter terms fall back to scanning the token vocabulary
+
+_EMPTY = frozenset()
+
+
+def _grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+# ---------------- SEARCH INDEX ---------------- #
+class SearchIndex:
+    """Substring search index over a few text fields of a list of records (dicts).
+
+    Field values are lowercased and split into whitespace-separated tokens once,
+    when a record is added. The index has two levels:
+
+    * token -> keys of the records whose field contains that token (per field)
+    * trigram -> tokens containing it, over the shared token vocabulary
+
+    A query is split on whitespace and every term must appear as a substring of the
+    chosen field, or of any indexed field when field is None. Since a term holds no
+    whitespace, it is a substring of a field exactly when it is a substring of one
+    of the field's tokens, so a lookup only touches the (small) vocabulary and the
+    postings of the matching tokens. Terms shorter than a trigram scan the
+    vocabulary instead.
+
+    Results come back in the order records were added, which is the table order.
+    """
+
+    def __init__(self, fields, key="id"):
+        self.fields = list(fields)
+        self.key = key
+        self.clear()
+
+    def clear(self):
+        self._records = {}  # key -> record, in insertion (display) order
+        self._tokens = {}   # key -> per-field token sets, parallel to self.fields
+        self._pos = {}      # key -> insertion sequence, for ordering results
+        self._seq = 0
+        self._postings = [defaultdict(set) for _ in self.fields] # per field: token -> keys
+        self._vocab = {}    # token -> number of (record, field) pairs using it
+        self._grams = defaultdict(set) # trigram -> tokens containing it
+
+    def __len__(self):
+        return len(self._records)
+
+    def build(self, records):
+        """Replaces the index contents with records."""
+        self.clear()
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """Indexes a record, replacing any existing record with the same key in place."""
+        key = record.get(self.key)
+        if key in self._records:
+            self._unindex(key)
+        else:
+            self._pos[key] = self._seq
+            self._seq += 1
+        self._records[key] = record
+
+        # Interned so a token repeated across thousands of records is stored once
+        tokens = tuple(tuple({sys.intern(t) for t in str(record.get(f, "")).lower().split()}) for f in self.fields)
+        self._tokens[key] = tokens
+        for postings, field_tokens in zip(self._postings, tokens):
+            for token in field_tokens:
+                postings[token].add(key)
+                count = self._vocab.get(token, 0)
+                if not count:
+                    for gram in _grams(token):
+                        self._grams[gram].add(token)
+                self._vocab[token] = count + 1
+
+    def remove(self, key):
+        """Drops a record from the index; unknown keys are ignored."""
+        if key not in self._records:
+            return
+        self._unindex(key)
+        del self._records[key]
+        del self._pos[key]
+
+    def get(self, key):
+        return self._records.get(key)
+
+    def search(self, query, field=None):
+        """Returns the records matching every whitespace-separated term of query."""
+        terms = query.lower().split()
+        if not terms:
+            return list(self._records.values())
+
+        cols = range(len(self.fields)) if field is None else [self.fields.index(field)]
+        candidates = None
+        # Longest terms first: they match the fewest tokens
+        for term in sorted(terms, key=len, reverse=True):
+            matched = self._match(term, cols)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                break
+
+        if len(candidates) == len(self._records):
+            return list(self._records.values())
+        return [self._records[k] for k in sorted(candidates, key=self._pos.__getitem__)]
+
+    # --- INTERNALS ---
+
+    def _unindex(self, key):
+        for postings, field_tokens in zip(self._postings, self._tokens.pop(key)):
+            for token in field_tokens:
+                keys = postings[token]
+                keys.discard(key)
+                if not keys:
+                    del postings[token]
+                count = self._vocab[token] - 1
+                if count:
+                    self._vocab[token] = count
+                    continue
+                del self._vocab[token]
+                for gram in _grams(token):
+                    tokens = self._grams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._grams[gram]
+
+    def _tokens_containing(self, term):
+        if len(term) < GRAM:
+            return [t for t in self._vocab if term in t]
+        lists = sorted((self._grams.get(g, _EMPTY) for g in _grams(term)), key=len)
+        hits = lists[0]
+        for tokens in lists[1:]:
+            if not hits:
+                return ()
+            hits = hits & tokens
+        if len(term) == GRAM:
+            return hits
+        # Sharing every trigram does not guarantee the whole substring; verify
+        return [t for t in hits if term in t]
+
+    def _match(self, term, cols):
+        """Returns the keys of records whose cols contain term."""
+        found = set()
+        for token in self._tokens_containing(term):
+            for c in cols:
+                keys = self._postings[c].get(token)
+                if keys:
+                    found |= keys
+        return found
@@ -0,0 +1,23 @@
+import sys
+import time
+
+# Startup timeline, printed when main.py runs with --profile-startup. Recording a
+# mark is cheap, so callers mark unconditionally.
+_START = time.perf_counter()
+_marks = []     # (label, seconds since start, modules loaded)
+enabled = False
+
+
+def mark(label):
+    """Records that a startup milestone was reached."""
+    _marks.append((label, time.perf_counter() - _START, len(sys.modules)))
+
+
+def report(file=None):
+    """Prints the startup timeline: elapsed time, time since the previous mark, and loaded modules."""
+    file = file or sys.stderr
+    print(f"{'milestone':<32}{'total ms':>10}{'step ms':>10}{'modules':>9}", file=file)
+    previous = 0.0
+    for label, elapsed, modules in _marks:
+        print(f"{label:<32}{elapsed * 1000:>10.1f}{(elapsed - previous) * 1000:>10.1f}{modules:>9}", file=file)
+        previous = elapsed
@@ -0,0 +1,292 @@
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+VIRTUAL_THRESHOLD = 2000  # Above this many rows only the visible window is materialized
+OVERSCAN = 10             # Extra rows kept above and below the visible window
+
+# ---------------- TABLE VIEW ---------------- #
+class TableView:
+    """A Treeview plus scrollbar that displays a list of row dicts.
+
+    Small tables are rendered in full and kept in sync by reconciling against the
+    previous render: items are keyed by the row's id, and only inserted, removed,
+    changed or moved rows touch the Treeview, so selection and scroll position
+    survive a refresh. Large tables switch to virtual scrolling:
+    only the visible rows (plus a little overscan) exist as Treeview items, and
+    those items are recycled with new values as the user scrolls. Callers should
+    resolve selections through selected_row()/selected_rows() rather than reading
+    item values, since a recycled item shows different rows over time.
+
+    columns is a list of (key, heading, width, stretch) tuples; formatters maps a
+    column key to a function computing its text from the row (for values that are
+    not stored on the row, such as a device's reachability).
+    """
+
+    def __init__(self, parent, columns, key="id", style="Custom.Treeview",
+                 virtual_threshold=VIRTUAL_THRESHOLD, overscan=OVERSCAN, formatters=None):
+        self.key = key
+        self.formatters = formatters or {}
+        self.style = style
+        self.columns = [c[0] for c in columns]
+        self.virtual_threshold = virtual_threshold
+        self.overscan = overscan
+
+        self.frame = ttk.Frame(parent)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(self.frame, show="headings", style=style, columns=self.columns)
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        # Columns and headings are configured once, not on every render
+        for name, heading, width, stretch in columns:
+            self.tree.heading(name, text=heading, anchor="center")
+            self.tree.column(name, width=width, stretch=stretch, anchor="w")
+
+        self.rows = []
+        self.virtual = False
+        self._offset = 0      # Index of the first visible row (virtual mode)
+        self._window = []     # Row indices currently materialized, in slot order (virtual mode)
+        self._item_rows = {}  # Treeview item id -> row dict
+        self._rendered = {}   # Treeview item id -> (values, tag) last written (full mode)
+        self._selected_keys = set()
+
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        self.tree.bind("<Configure>", lambda e: self.virtual and self._render_window(), add="+")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel, add="+")
+        self.tree.bind("<Up>", lambda e: self._on_arrow(-1), add="+")
+        self.tree.bind("<Down>", lambda e: self._on_arrow(1), add="+")
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def bind(self, sequence, func):
+        self.tree.bind(sequence, func, add="+")
+
+    # --- DATA ---
+
+    def set_rows(self, rows):
+        """Displays rows (a list of dicts), choosing full or virtual rendering by size."""
+        self.rows = rows
+        virtual = len(rows) > self.virtual_threshold
+        if virtual != self.virtual:
+            self._clear()
+            self.virtual = virtual
+        if virtual:
+            self._offset = min(self._offset, max(0, len(rows) - 1))
+            self._render_window()
+        else:
+            self._render_full()
+
+    def append_rows(self, rows):
+        """Adds rows at the end (e.g. a page that just arrived) without reconciling the rows already shown."""
+        if not rows:
+            return
+        start = len(self.rows)
+        self.rows = self.rows + rows
+        if self.virtual or len(self.rows) > self.virtual_threshold:
+            self.set_rows(self.rows) # Virtual rendering only touches the visible window
+            return
+        keys = [str(row.get(self.key)) for row in rows]
+        if len(set(keys)) != len(keys) or any(iid in self._rendered for iid in keys):
+            self._render_full() # Repeated ids; let reconciliation sort them out
+            return
+        for index, (iid, row) in enumerate(zip(keys, rows), start):
+            values = tuple(self.row_values(row))
+            tag = "odd" if index % 2 == 0 else "even"
+            self.tree.insert("", "end", iid=iid, values=values, tags=(tag,))
+            self._rendered[iid] = (values, tag)
+            self._item_rows[iid] = row
+
+    def selected_row(self):
+        """Returns the row dict under the focus cursor, or None."""
+        return self._item_rows.get(self.tree.focus())
+
+    def selected_rows(self):
+        """Returns the row dicts of every selected row, in table order.
+
+        In virtual mode this includes selected rows scrolled out of the window, which
+        have no Treeview item.
+        """
+        if not self.virtual:
+            return self._shown_selection()
+        self._on_select()
+        return [row for row in self.rows if row.get(self.key) in self._selected_keys]
+
+    def refresh(self):
+        """Re-renders the current rows, e.g. after a computed column changed; only changed items are touched."""
+        self.set_rows(self.rows)
+
+    def row_values(self, row):
+        return [self.formatters[c](row) if c in self.formatters else row.get(c, "") for c in self.columns]
+
+    # --- FULL RENDERING ---
+
+    def _clear(self):
+        self.tree.delete(*self.tree.get_children())
+        self._item_rows = {}
+        self._rendered = {}
+        self._window = []
+
+    def _render_full(self):
+        """Reconciles the Treeview with self.rows, applying only the operations that changed."""
+        item_ids = [str(row.get(self.key)) for row in self.rows]
+        if len(set(item_ids)) != len(item_ids):
+            # Ids are not unique (should not happen with server data); fall back to a rebuild
+            self._rebuild_full()
+            return
+
+        wanted = set(item_ids)
+        current = list(self.tree.get_children())
+        removed = [iid for iid in current if iid not in wanted]
+        if removed:
+            self.tree.delete(*removed)
+            for iid in removed:
+                self._rendered.pop(iid, None)
+            current = [iid for iid in current if iid in wanted]
+
+        # Walk the new order against the surviving old order. Items already in the right
+        # relative position stay put; others are moved or inserted at their new index.
+        moved = set()
+        j = 0
+        for index, (iid, row) in enumerate(zip(item_ids, self.rows)):
+            while j < len(current) and current[j] in moved:
+                j += 1
+            values = tuple(self.row_values(row))
+            tag = "odd" if index % 2 == 0 else "even"
+
+            if iid not in self._rendered:
+                self.tree.insert("", index, iid=iid, values=values, tags=(tag,))
+                self._rendered[iid] = (values, tag)
+                continue
+
+            if j < len(current) and current[j] == iid:
+                j += 1
+            else:
+                self.tree.move(iid, "", index)
+                moved.add(iid)
+
+            old_values, old_tag = self._rendered[iid]
+            if old_values != values:
+                self.tree.item(iid, values=values)
+            if old_tag != tag: # Zebra tags only change for rows whose parity shifted
+                self.tree.item(iid, tags=(tag,))
+            self._rendered[iid] = (values, tag)
+
+        self._item_rows = dict(zip(item_ids, self.rows))
+        self._restore_selection()
+
+    def _rebuild_full(self):
+        self._clear()
+        for i, row in enumerate(self.rows):
+            tag = "odd" if i % 2 == 0 else "even"
+            iid = self.tree.insert("", "end", values=self.row_values(row), tags=(tag,))
+            self._item_rows[iid] = row
+        self._restore_selection()
+
+    # --- VIRTUAL RENDERING ---
+
+    def _visible_count(self):
+        rowheight = int(ttk.Style().lookup(self.style, "rowheight") or 20)
+        height = self.tree.winfo_height()
+        if height <= 1: # Not mapped yet; fall back to the configured height
+            return int(self.tree.cget("height"))
+        return max(1, height // rowheight)
+
+    def _render_window(self):
+        total = len(self.rows)
+        visible = self._visible_count()
+        self._offset = max(0, min(self._offset, total - visible))
+        start = max(0, self._offset - self.overscan)
+        end = min(total, self._offset + visible + self.overscan)
+        self._window = list(range(start, end))
+
+        # Recycle existing items; only grow or shrink the pool when the window size changes
+        slots = list(self.tree.get_children())
+        while len(slots) < len(self._window):
+            slots.append(self.tree.insert("", "end"))
+        if len(slots) > len(self._window):
+            self.tree.delete(*slots[len(self._window):])
+            del slots[len(self._window):]
+
+        self._item_rows = {}
+        for iid, index in zip(slots, self._window):
+            row = self.rows[index]
+            tag = "odd" if index % 2 == 0 else "even"
+            self.tree.item(iid, values=self.row_values(row), tags=(tag,))
+            self._item_rows[iid] = row
+
+        # Show the overscan above the first visible row as scrolled-off content
+        if self._window:
+            self.tree.yview_moveto((self._offset - start) / len(self._window))
+        self._restore_selection()
+        if total:
+            self.scrollbar.set(self._offset / total, min(1.0, (self._offset + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _scroll_to(self, offset):
+        if offset != self._offset:
+            self._offset = offset
+            self._render_window()
+
+    def _on_scrollbar(self, *args):
+        if not self.virtual:
+            return self.tree.yview(*args)
+        visible = self._visible_count()
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = visible if args[2] == "pages" else 1
+            self._scroll_to(max(0, self._offset + int(args[1]) * step))
+
+    def _on_wheel(self, event):
+        if not self.virtual:
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(max(0, self._offset - 3))
+        else:
+            self._scroll_to(self._offset + 3)
+        return "break"
+
+    def _on_arrow(self, step):
+        """Moves the focus one row, scrolling the virtual window when it reaches an edge."""
+        if not self.virtual or not self.rows:
+            return None
+        slots = self.tree.get_children()
+        focus = self.tree.focus()
+        index = self._window[slots.index(focus)] if focus in slots else self._offset
+        index = max(0, min(len(self.rows) - 1, index + step))
+        self._selected_keys = {self.rows[index].get(self.key)}
+        visible = self._visible_count()
+        if index < self._offset:
+            self._offset = index
+        elif index >= self._offset + visible:
+            self._offset = index - visible + 1
+        self._render_window()
+        return "break"
+
+    # --- SELECTION ---
+
+    def _on_select(self, event=None):
+        # Rows scrolled out of the virtual window keep their selection
+        shown = {row.get(self.key) for row in self._item_rows.values()}
+        kept = {k for k in self._selected_keys if k not in shown}
+        self._selected_keys = kept | {row.get(self.key) for row in self._shown_selection()}
+
+    def _shown_selection(self):
+        """Row dicts of the selected Treeview items (only the materialized ones in virtual mode)."""
+        return [self._item_rows[iid] for iid in self.tree.selection() if iid in self._item_rows]
+
+    def _restore_selection(self):
+        """Re-selects items whose rows were selected before a re-render, so selection follows the data."""
+        if not self._selected_keys:
+            return
+        items = [iid for iid, row in self._item_rows.items() if row.get(self.key) in self._selected_keys]
+        if set(items) != set(self.tree.selection()):
+            self.tree.selection_set(items)
+        if items:
+            self.tree.focus(items[0])
+        elif self.tree.focus():
+            self.tree.focus("") # The focused row scrolled out of the window
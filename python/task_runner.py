@@ -0,0 +1,109 @@
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4        # Concurrent blocking calls (HTTP requests, file I/O)
+POLL_INTERVAL_MS = 25  # How often the Tk main thread drains finished work while anything is pending
+
+# ---------------- TASK RUNNER ---------------- #
+class TaskRunner:
+    """Runs blocking work on worker threads and delivers the results back on the Tk main thread.
+
+    Worker threads never touch Tk. Finished futures are put on a queue that the main
+    thread drains with root.after, so callbacks can update widgets directly.
+
+    Submissions may carry a key (e.g. "/commands"). At most one task per key is in
+    flight; a newer submission for a busy key replaces any queued one, and the result
+    of the in-flight task is discarded in favour of the newer request.
+    """
+
+    def __init__(self, root, max_workers=MAX_WORKERS, on_busy_change=None):
+        self.root = root
+        self.on_busy_change = on_busy_change
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        self._done = queue.Queue()
+        self._inflight = set()  # keys with a running task
+        self._queued = {}       # key -> newest (fn, on_success, on_error) waiting for the running task
+        self._pending = 0
+        self._poll_job = None
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def submit(self, fn, on_success=None, on_error=None, key=None):
+        """Schedules fn() on a worker. on_success(result) / on_error(exc) run on the main thread."""
+        if key is not None and key in self._inflight:
+            if key not in self._queued:
+                self._set_pending(self._pending + 1)
+            self._queued[key] = (fn, on_success, on_error)
+            return
+
+        self._set_pending(self._pending + 1)
+        self._start(fn, on_success, on_error, key)
+
+    def drain(self, timeout=5.0):
+        """Blocks until every submitted task has finished and its callback has run (tests/benchmarks)."""
+        while self._pending:
+            try:
+                item = self._done.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError("Timed out waiting for background tasks")
+            self._deliver(*item)
+
+    def shutdown(self):
+        """Stops accepting work and abandons anything not yet started."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- INTERNALS ---
+
+    def _start(self, fn, on_success, on_error, key):
+        if key is not None:
+            self._inflight.add(key)
+        future = self._executor.submit(fn)
+        future.add_done_callback(lambda f: self._done.put((f, key, on_success, on_error)))
+        self._ensure_polling()
+
+    def _ensure_polling(self):
+        if self._poll_job is None:
+            try:
+                self._poll_job = self.root.after(POLL_INTERVAL_MS, self._poll)
+            except tk.TclError:
+                pass  # Window already destroyed
+
+    def _poll(self):
+        self._poll_job = None
+        while True:
+            try:
+                item = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(*item)
+        if self._pending:
+            self._ensure_polling()
+
+    def _deliver(self, future, key, on_success, on_error):
+        if key is not None:
+            self._inflight.discard(key)
+            queued = self._queued.pop(key, None)
+            if queued:
+                # A newer request for this resource arrived; its result supersedes this one
+                self._set_pending(self._pending - 1)
+                self._start(*queued, key)
+                return
+
+        self._set_pending(self._pending - 1)
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            if on_error:
+                on_error(exc)
+        elif on_success:
+            on_success(future.result())
+
+    def _set_pending(self, count):
+        was_busy = self._pending > 0
+        self._pending = count
+        if self.on_busy_change and was_busy != (count > 0):
+            self.on_busy_change(count > 0)
@@ -1,18 +1,64 @@
 import unittest
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, MagicMock
 import json
+import threading
+import time
+from datetime import date
 from tkinter import Tk
 from command_manager import CommandManagerApp  # assuming your class is in this file
-from requests.exceptions import RequestException
+from task_runner import TaskRunner
+import api_client
+from search_index import SearchIndex
+from local_cache import LocalCache
+from api_client import ApiClient
+from requests.exceptions import HTTPError, RequestException, ConnectionError as RequestsConnectionError
+import csv
+import gzip
+import io
+import os
+import subprocess
+import sys
+import tempfile
+from exporter import export_records, COMMAND_FIELDS
+from record_store import command_store, device_store, CommandRecord
+import startup
+import cli
+from contextlib import redirect_stdout, redirect_stderr
+from mutation_queue import MutationQueue
+import instrumentation
+import asyncio
+import socket
+import reachability
+import fanout
+import benchmarks
+import change_feed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importer import iter_records, import_records, command_record, device_record, device_key
+
+
+def _write_temp(text, test, suffix=".json", compress=False):
+    """Writes text to a temporary file removed after the test; returns its path."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    data = text.encode("utf-8")
+    with os.fdopen(fd, "wb") as f:
+        f.write(gzip.compress(data) if compress else data)
+    test.addCleanup(os.remove, path)
+    return path
 
 class TestCommandManagerApp(unittest.TestCase):
     def setUp(self):
         self.root = Tk()
         self.commands = [{"id": 1, "command": "ls", "description": "list files", "last_used": "2025-01-01"}]
         self.devices = [{"id": 1, "device": "Router", "ip": "192.168.1.1"}]
-        self.app = CommandManagerApp(self.root, self.commands, self.devices, token="c2f2b8a9-ebda-4fbe-b46c-08736d08d609", username="tester")
+        # Keep the initial background refresh off the network
+        initial = {"success": True, "commands": self.commands, "devices": self.devices}
+        with patch.object(ApiClient, "get_conditional", return_value=(initial, None)), \
+             patch.object(ApiClient, "get_page", return_value=initial):
+            self.app = CommandManagerApp(self.root, self.commands, self.devices, token="c2f2b8a9-ebda-4fbe-b46c-08736d08d609", username="tester",
+                                         reachability_ms=0, live_updates=False)
+            self.app.runner.drain()
 
-    @patch("requests.get")
+    @patch("requests.Session.request")
     @patch("tkinter.messagebox.showerror")
     def test_fetch_data_success(self, mock_error, mock_get):
         mock_get.return_value.status_code = 200
@@ -22,7 +68,7 @@ class TestCommandManagerApp(unittest.TestCase):
         self.assertEqual(result["commands"], self.commands)
         mock_error.assert_not_called()
 
-    @patch("requests.get")
+    @patch("requests.Session.request")
     @patch("tkinter.messagebox.showerror")
     def test_fetch_data_failure(self, mock_error, mock_get):
         # Raise a RequestException so _fetch_data catches it
@@ -33,7 +79,7 @@ class TestCommandManagerApp(unittest.TestCase):
         self.assertIsNone(result)
         mock_error.assert_called_once_with("Connection Error", "Failed to connect to server: Connection failed")
 
-    @patch("requests.request")
+    @patch("requests.Session.request")
     @patch("ttkbootstrap.dialogs.Messagebox.show_info")
     @patch("tkinter.messagebox.showerror")
     def test_send_data_post_success(self, mock_error, mock_info, mock_request):
@@ -47,32 +93,1151 @@ class TestCommandManagerApp(unittest.TestCase):
         mock_error.assert_not_called()
 
     @patch("tkinter.filedialog.askopenfilename")
-    @patch("builtins.open", new_callable=mock_open, read_data=json.dumps([{"command": "new", "description": "desc"}]))
-    @patch.object(CommandManagerApp, "_send_data", return_value=True)
+    @patch("ttkbootstrap.dialogs.Messagebox.show_info")
+    @patch.object(CommandManagerApp, "_call", return_value={"success": True})
+    @patch.object(CommandManagerApp, "refresh_commands_table")
+    def test_import_commands_success(self, mock_refresh, mock_send, mock_info, mock_dialog):
+        mock_dialog.return_value = _write_temp(json.dumps([{"command": "new", "description": "desc"}]), self)
+        self.app.import_commands()
+        self.app.runner.drain()
+        mock_send.assert_called_once_with("/commands/import", {"commands": [{"command": "new", "description": "desc"}]})
+        mock_refresh.assert_called_once()
+        mock_info.assert_called_once()
+
+    @patch("tkinter.filedialog.askopenfilename")
+    @patch("ttkbootstrap.dialogs.Messagebox.show_info")
+    @patch.object(CommandManagerApp, "_call", return_value={"success": True})
     @patch.object(CommandManagerApp, "refresh_commands_table")
-    def test_import_commands_success(self, mock_refresh, mock_send, mock_file, mock_dialog):
-        mock_dialog.return_value = "dummy.json"
+    def test_import_commands_uploads_in_batches(self, mock_refresh, mock_send, mock_info, mock_dialog):
+        lines = "\n".join(json.dumps({"command": f"cmd{i}"}) for i in range(5))
+        mock_dialog.return_value = _write_temp(lines, self, suffix=".ndjson")
+        self.app.import_batch_size = 2
         self.app.import_commands()
-        mock_send.assert_called_once()
+        self.app.runner.drain()
+        self.assertEqual([len(c.args[1]["commands"]) for c in mock_send.call_args_list], [2, 2, 1])
+
+    @patch("tkinter.filedialog.askopenfilename")
+    @patch("ttkbootstrap.dialogs.Messagebox.show_info")
+    @patch.object(CommandManagerApp, "refresh_devices_table")
+    def test_import_devices_uses_bulk_route_and_skips_known_devices(self, mock_refresh, mock_info, mock_dialog):
+        devices = [{"device": "router", "ip": "192.168.1.1"}, {"device": "NAS", "ip": "10.0.0.5"},
+                   {"device": "NAS", "ip": "10.0.0.5"}, {"device": "Switch", "ip": "10.0.0.2"}]
+        mock_dialog.return_value = _write_temp(json.dumps(devices), self)
+        response = {"success": True, "duplicates": [], "errors": [{"index": 1, "device": "Switch", "message": "bad ip"}]}
+        with patch.object(CommandManagerApp, "_call", return_value=response) as mock_call:
+            self.app.import_devices()
+            self.app.runner.drain()
+        mock_call.assert_called_once_with("/devices/import", {"devices": [{"device": "NAS", "ip": "10.0.0.5"},
+                                                                          {"device": "Switch", "ip": "10.0.0.2"}]})
+        mock_info.assert_called_once()
+        summary = mock_info.call_args.args[1]
+        self.assertIn("1 imported", summary)
+        self.assertIn("2 duplicates", summary)
+        self.assertIn("Switch: bad ip", summary)
         mock_refresh.assert_called_once()
 
     @patch("tkinter.filedialog.asksaveasfilename")
-    @patch("builtins.open", new_callable=mock_open)
     @patch("ttkbootstrap.dialogs.Messagebox.show_info")
-    def test_export_commands_success(self, mock_info, mock_file, mock_dialog):
-        mock_dialog.return_value = "export.json"
+    def test_export_commands_success(self, mock_info, mock_dialog):
+        path = _write_temp("", self)
+        mock_dialog.return_value = path
         self.app.export_commands()
-        mock_file.assert_called_once_with("export.json", "w")
+        self.app.runner.drain()
+        with open(path) as f:
+            self.assertEqual(json.load(f), self.commands)
         mock_info.assert_called_once()
 
-    @patch.object(CommandManagerApp, "_fetch_data", return_value={"commands": [{"id": 2, "command": "echo", "description": "print"}]})
+    @patch.object(ApiClient, "get_conditional", return_value=({"success": True, "commands": [{"id": 2, "command": "echo", "description": "print"}]}, None))
     def test_refresh_commands_table_filters(self, mock_fetch):
+        self.app.revisions["commands"] = 1
         self.app.cmd_search_var.set("echo")
         self.app.cmd_filter_var.set("command")
         self.app.refresh_commands_table()
+        self.app.runner.drain()
+        items = self.app.cmd_tree.get_children()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(self.app.cmd_tree.item(items[0])["values"][1], "echo")
+
+    @patch.object(ApiClient, "get_conditional")
+    def test_fresh_login_payload_is_not_refetched(self, mock_get):
+        self.app.root.destroy()
+        self.root = Tk()
+        self.app = CommandManagerApp(self.root, self.commands, self.devices, token="t", username="tester",
+                                     revalidate=False, reachability_ms=0, live_updates=False)
+        self.app.runner.drain()
+        mock_get.assert_not_called()
+        self.assertEqual(len(self.app.cmd_tree.get_children()), 1)
+
+    @patch.object(ApiClient, "get_conditional", return_value=(None, 'W/"commands-3"'))
+    def test_refresh_sends_revision_and_skips_render_when_unchanged(self, mock_get):
+        self.app.revisions["commands"] = 3
+        self.app._etags["commands"] = 'W/"commands-3"'
+        with patch.object(CommandManagerApp, "render_commands_table") as mock_render:
+            self.app.refresh_commands_table()
+            self.app.runner.drain()
+        mock_get.assert_called_once_with("/commands", 'W/"commands-3"', {"since": 3})
+        mock_render.assert_not_called()
+
+    @patch.object(ApiClient, "get_conditional")
+    def test_refresh_merges_delta_into_snapshot(self, mock_get):
+        self.app.commands = [{"id": 1, "command": "ls"}, {"id": 2, "command": "pwd"}]
+        self.app.revisions["commands"] = 3
+        mock_get.return_value = ({"success": True, "delta": True, "revision": 5,
+                                  "commands": [{"id": 2, "command": "pwd -P"}, {"id": 7, "command": "top"}],
+                                  "removed": [1]}, 'W/"commands-5"')
+        self.app.refresh_commands_table()
+        self.app.runner.drain()
+        self.assertEqual([c["command"] for c in self.app.commands], ["pwd -P", "top"])
+        self.assertEqual(self.app.revisions["commands"], 5)
+
+    def test_render_reconciles_rows_and_keeps_selection(self):
+        self.app.commands = [{"id": 1, "command": "ls"}, {"id": 2, "command": "pwd"}, {"id": 3, "command": "top"}]
+        self.app.render_commands_table()
+        self.app.cmd_tree.selection_set("2")
+        self.app.cmd_tree.focus("2")
+
+        self.app.commands = [{"id": 2, "command": "pwd -P"}, {"id": 3, "command": "top"}, {"id": 4, "command": "df"}]
+        with patch.object(self.app.cmd_tree, "insert", wraps=self.app.cmd_tree.insert) as mock_insert:
+            self.app.render_commands_table()
+
+        self.assertEqual(self.app.cmd_tree.get_children(), ("2", "3", "4"))
+        mock_insert.assert_called_once() # Only the new row is inserted
+        self.assertEqual(self.app.cmd_tree.selection(), ("2",))
+        self.assertEqual(self.app.cmd_tree.item("2")["values"][1], "pwd -P")
+        self.assertEqual(self.app.cmd_tree.item("3")["tags"], ["even"])
+
+    def test_render_reorders_without_recreating_items(self):
+        self.app.commands = [{"id": i, "command": f"c{i}"} for i in range(1, 6)]
+        self.app.render_commands_table()
+        self.app.commands = list(reversed(self.app.commands))
+        with patch.object(self.app.cmd_tree, "insert", wraps=self.app.cmd_tree.insert) as mock_insert:
+            self.app.render_commands_table()
+        self.assertEqual(self.app.cmd_tree.get_children(), ("5", "4", "3", "2", "1"))
+        mock_insert.assert_not_called()
+
+    @patch.object(ApiClient, "get_conditional")
+    def test_sync_persists_snapshot_to_local_cache(self, mock_get):
+        self.app.cache = LocalCache(":memory:")
+        self.app.revisions["commands"] = 1
+        mock_get.return_value = ({"success": True, "revision": 4, "commands": [{"id": 9, "command": "uptime"}]}, 'W/"commands-4"')
+        self.app.refresh_commands_table()
+        self.app.runner.drain()
+        cached = self.app.cache.load_snapshot("tester", "commands")
+        self.assertEqual(cached["items"], [{"id": 9, "command": "uptime"}])
+        self.assertEqual((cached["revision"], cached["etag"]), (4, 'W/"commands-4"'))
+
+    @patch("tkinter.messagebox.showerror")
+    @patch.object(ApiClient, "get_conditional", side_effect=RequestsConnectionError("down"))
+    def test_background_revalidation_offline_keeps_snapshot(self, mock_get, mock_error):
+        self.app.revisions["commands"] = 1
+        self.app._sync_async("commands", self.app.render_commands_table, quiet=True)
+        self.app.runner.drain()
+        mock_error.assert_not_called()
+        self.assertIn("Offline", self.app.status_var.get())
+        self.assertEqual(self.app.commands, self.commands)
+
+    @patch.object(ApiClient, "get_page")
+    def test_list_without_revision_loads_in_pages(self, mock_page):
+        self.app.revisions["commands"] = None
+        self.app.cache = LocalCache(":memory:")
+        self.app.cmd_search_var.set("pw")
+        mock_page.side_effect = [{"success": True, "revision": 7, "commands": [{"id": 1, "command": "pwd"}], "next": "c1"},
+                                 {"success": True, "revision": 7, "commands": [{"id": 2, "command": "top"}, {"id": 3, "command": "pwd -P"}],
+                                  "next": None}]
+        self.app.refresh_commands_table()
+        self.app.runner.drain()
+        self.assertEqual([c.args for c in mock_page.call_args_list],
+                         [("/commands", api_client.FIRST_PAGE_SIZE, None), ("/commands", api_client.PAGE_SIZE, "c1")])
+        self.assertEqual([c["id"] for c in self.app.commands], [1, 2, 3])
+        self.assertEqual(self.app.cmd_tree.get_children(), ("1", "3")) # Appended rows honour the search
+        self.assertEqual(self.app.revisions["commands"], 7)
+        self.assertEqual(len(self.app.cache.load_snapshot("tester", "commands")["items"]), 3)
+
+    @patch("tkinter.messagebox.showerror")
+    @patch.object(ApiClient, "get_page")
+    def test_failed_page_forgets_revision(self, mock_page, mock_error):
+        self.app.revisions["commands"] = None
+        mock_page.side_effect = [{"success": True, "revision": 7, "commands": [{"id": 1, "command": "pwd"}], "next": "c1"},
+                                 RequestsConnectionError("down")]
+        self.app.refresh_commands_table()
+        self.app.runner.drain()
+        self.assertIsNone(self.app.revisions["commands"]) # The next sync reloads instead of asking for a delta
+        mock_error.assert_called_once()
+
+    def test_feed_change_applies_delta_from_our_revision(self):
+        self.app.revisions["commands"] = 3
+        self.app._on_feed_change({"kind": "commands", "since": 3, "revision": 4, "delta": True,
+                                  "commands": [{"id": 5, "command": "uptime"}], "removed": [1]})
+        self.assertEqual([c["id"] for c in self.app.commands], [5])
+        self.assertEqual(self.app.cmd_tree.get_children(), ("5",))
+        self.assertEqual(self.app.revisions["commands"], 4)
+        # Already applied (e.g. our own change confirmed first): ignored
+        self.app._on_feed_change({"kind": "commands", "since": 3, "revision": 4, "delta": True,
+                                  "commands": [{"id": 6, "command": "top"}], "removed": []})
+        self.assertEqual([c["id"] for c in self.app.commands], [5])
+
+    def test_feed_change_from_another_revision_fetches_delta(self):
+        self.app.revisions["commands"] = 3
+        with patch.object(CommandManagerApp, "_sync_async") as mock_sync:
+            self.app._on_feed_change({"kind": "commands", "since": 2, "revision": 5, "delta": True, "commands": [], "removed": []})
+        mock_sync.assert_called_once_with("commands", self.app.render_commands_table, quiet=True)
+        self.assertEqual(self.app.revisions["commands"], 3)
+
+    def test_any_field_filter_uses_search_index(self):
+        self.app.commands = [{"id": 1, "command": "ls", "description": "list nginx files"},
+                             {"id": 2, "command": "nginx -t", "description": "test config"}]
+        self.app.cmd_filter_var.set("any")
+        self.app.cmd_search_var.set("nginx")
+        self.app.render_commands_table()
+        self.assertEqual(self.app.cmd_tree.get_children(), ("1", "2"))
+
+    def test_search_scans_until_the_index_is_built_on_a_worker(self):
+        self.app.commands = [{"id": 1, "command": "ls"}, {"id": 2, "command": "nginx -t"}]
+        store = self.app._stores["commands"]
+        self.app.cmd_search_var.set("")
+        self.app.render_commands_table()
+        self.assertFalse(store.indexed) # A blank query never needs the index
+        self.app.cmd_search_var.set("nginx")
+        self.app.render_commands_table()
+        self.assertEqual(self.app.cmd_tree.get_children(), ("2",))
+        self.assertFalse(store.indexed)
+        self.app.runner.drain()
+        self.assertTrue(store.indexed)
+        self.app.render_commands_table()
+        self.assertEqual(self.app.cmd_tree.get_children(), ("2",))
+
+    def test_large_table_materializes_only_visible_window(self):
+        self.app.commands = [{"id": i, "command": f"cmd{i}"} for i in range(5000)]
+        self.app.render_commands_table()
+        self.assertTrue(self.app.cmd_table.virtual)
+        self.assertLess(len(self.app.cmd_tree.get_children()), 100)
+
+    @patch("tkinter.messagebox.askyesno", return_value=True)
+    @patch.object(CommandManagerApp, "_mutate_async")
+    def test_virtual_table_remove_resolves_scrolled_row(self, mock_send, mock_ask):
+        self.app.commands = [{"id": i, "command": f"cmd{i}"} for i in range(5000)]
+        self.app.render_commands_table()
+        self.app.cmd_table._scroll_to(4000)
+        # Items are recycled, so the first visible slot now shows row 4000
+        item = self.app.cmd_tree.get_children()[self.app.cmd_table.overscan]
+        self.app.cmd_tree.focus(item)
+        self.app.remove_command()
+        self.assertEqual(mock_send.call_args.args[2], {"id": 4000})
+
+    @patch("command_manager.FanoutWindow")
+    @patch("tkinter.messagebox.askyesno", return_value=True)
+    def test_virtual_table_run_keeps_selection_scrolled_out_of_view(self, mock_ask, mock_window):
+        self.app.devices = [{"id": i, "device": f"host{i}", "ip": f"10.0.{i // 256}.{i % 256}"} for i in range(5000)]
+        self.app.render_devices_table()
+        self.assertTrue(self.app.dev_table.virtual)
+        self.app.dev_tree.selection_set(self.app.dev_tree.get_children()[0]) # Row 0
+        self.app.dev_table._on_select()
+        self.app.dev_table._scroll_to(4000)
+        self.app.dev_tree.selection_add(self.app.dev_tree.get_children()[self.app.dev_table.overscan]) # Row 4000
+        self.assertEqual([d["id"] for d in self.app.dev_table.selected_rows()], [0, 4000])
+        self.app.cmd_tree.focus(self.app.cmd_tree.get_children()[0])
+        self.app.run_on_devices()
+        self.assertEqual([d["ip"] for d in mock_window.call_args.args[2]], ["10.0.0.0", "10.0.15.160"])
+
+    def _fill_and_save(self, values, button_text):
+        win = self.root.winfo_children()[-1]
+        widgets, stack = [], [win]
+        while stack:
+            w = stack.pop(0)
+            widgets.append(w)
+            stack.extend(w.winfo_children())
+        for entry, value in zip([w for w in widgets if w.winfo_class() == "TEntry"], values):
+            entry.insert(0, value)
+        next(w for w in widgets if w.winfo_class() == "TButton" and w.cget("text") == button_text).invoke()
+
+    def test_add_command_shows_row_before_server_confirms(self):
+        self.app.revisions["commands"] = 4
+        created = {"id": 2, "command": "pwd", "description": "where", "last_used": "2025-02-02"}
+        with patch.object(CommandManagerApp, "_call", return_value={"success": True, "command": created, "revision": 5}) as mock_call, \
+             patch.object(ApiClient, "get_conditional") as mock_get:
+            self.app.open_add_command_window()
+            self._fill_and_save(["pwd", "where"], "Save Command")
+            # Applied locally before the request completes
+            self.assertEqual(self.app.commands[-1]["command"], "pwd")
+            self.assertTrue(self.app.commands[-1]["id"].startswith("pending-"))
+            self.app.runner.drain()
+        mock_call.assert_called_once_with("/commands/add", {"command": "pwd", "description": "where"})
+        mock_get.assert_not_called() # No full reload
+        self.assertEqual(self.app.commands[-1], created)
+        self.assertEqual(self.app.cmd_tree.get_children(), ("1", "2"))
+        self.assertEqual(self.app.revisions["commands"], 5)
+        self.assertEqual([r["id"] for r in self.app._search("commands", "pwd", "command")], [2])
+
+    @patch("tkinter.messagebox.showerror")
+    def test_add_device_rolls_back_when_server_rejects(self, mock_error):
+        with patch.object(CommandManagerApp, "_call", return_value={"success": False, "message": "nope"}):
+            self.app.open_add_device_window()
+            self._fill_and_save(["Switch", "10.0.0.2"], "Save Device")
+            self.assertEqual(len(self.app.dev_tree.get_children()), 2)
+            self.app.runner.drain()
+        self.assertEqual(self.app.devices, self.devices)
+        self.assertEqual(self.app.dev_tree.get_children(), ("1",))
+        mock_error.assert_called_once_with("API Error", "nope")
+
+    @patch("tkinter.messagebox.askyesno", return_value=True)
+    @patch("tkinter.messagebox.showerror")
+    def test_remove_command_is_restored_in_place_on_connection_error(self, mock_error, mock_ask):
+        self.app.commands = [{"id": 1, "command": "ls"}, {"id": 2, "command": "pwd"}, {"id": 3, "command": "cd"}]
+        self.app.render_commands_table()
+        self.app.cmd_tree.focus("2")
+        with patch.object(CommandManagerApp, "_call", side_effect=RequestsConnectionError("down")):
+            self.app.remove_command()
+            self.assertEqual(self.app.cmd_tree.get_children(), ("1", "3"))
+            self.app.runner.drain()
+        self.assertEqual(self.app.cmd_tree.get_children(), ("1", "2", "3"))
+        self.assertEqual([r["id"] for r in self.app._search("commands", "", "command")], [1, 2, 3])
+        mock_error.assert_called_once()
+
+    @patch("ttkbootstrap.dialogs.Messagebox.show_info")
+    def test_copy_command_is_instant_and_queues_last_used(self, mock_info):
+        self.app.cmd_tree.focus("1")
+        with patch.object(CommandManagerApp, "_call") as mock_call:
+            self.app.copy_command(None)
+            self.app.copy_command(None)
+        self.assertEqual(self.root.clipboard_get(), "ls")
+        mock_info.assert_not_called()
+        mock_call.assert_not_called()
+        today = date.today().isoformat()
+        self.assertEqual(self.app.commands[0]["last_used"], today)
+        self.assertEqual(self.app.mutations.pending("commands", 1), {"last_used": today})
+        self.assertEqual(len(self.app.mutations), 1)
+
+    @patch.object(CommandManagerApp, "_fetch_data")
+    def test_search_filters_local_snapshot_without_fetching(self, mock_fetch):
+        self.app.commands = [{"id": 1, "command": "ls"}, {"id": 2, "command": "echo"}]
+        self.app.cmd_filter_var.set("command")
+        self.app.cmd_search_var.set("e")
+        self.app.cmd_search_var.set("ec")
+        # Each keystroke cancels the previous pending pass, so only one is queued
+        self.assertEqual(len(self.app._filter_jobs), 1)
+
+        time.sleep(self.app.search_debounce_ms / 1000 + 0.05)
+        self.root.update()
+
         items = self.app.cmd_tree.get_children()
         self.assertEqual(len(items), 1)
         self.assertEqual(self.app.cmd_tree.item(items[0])["values"][1], "echo")
+        mock_fetch.assert_not_called()
+
+    def test_check_reachability_fills_status_column(self):
+        with socket.create_server(("127.0.0.1", 0)) as server:
+            self.app.scanner.ports = (server.getsockname()[1],)
+            self.app.devices = [{"id": 1, "device": "local", "ip": "127.0.0.1"}]
+            self.app.render_devices_table()
+            self.app.check_reachability()
+            self.app.scanner.drain()
+        values = self.app.dev_tree.item(self.app.dev_tree.get_children()[0])["values"]
+        self.assertTrue(values[3].startswith("up "))
+
+    @patch("command_manager.FanoutWindow")
+    @patch("tkinter.messagebox.askyesno", return_value=True)
+    def test_run_on_devices_uses_selected_command_and_devices(self, mock_ask, mock_window):
+        self.app.cmd_tree.focus(self.app.cmd_tree.get_children()[0])
+        self.app.dev_tree.selection_set(self.app.dev_tree.get_children())
+        self.app.run_on_devices()
+        args = mock_window.call_args.args
+        self.assertEqual(args[1], "ls")
+        self.assertEqual([d["ip"] for d in args[2]], ["192.168.1.1"])
+        self.assertIs(args[3], self.app.transport)
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex(["command", "description"])
+        self.index.build([
+            {"id": 1, "command": "systemctl restart nginx", "description": "Reload web server"},
+            {"id": 2, "command": "docker ps", "description": "List running containers"},
+            {"id": 3, "command": "journalctl -u nginx", "description": "Web server logs"},
+        ])
+
+    def ids(self, query, field=None):
+        return [r["id"] for r in self.index.search(query, field)]
+
+    def test_substring_within_field(self):
+        self.assertEqual(self.ids("ngin", "command"), [1, 3])
+        self.assertEqual(self.ids("NGINX", "description"), [])
+
+    def test_multi_term_and_across_any_field(self):
+        self.assertEqual(self.ids("web logs"), [3])
+        self.assertEqual(self.ids("nginx reload"), [1])
+
+    def test_short_terms_and_empty_query(self):
+        self.assertEqual(self.ids("ps", "command"), [2])
+        self.assertEqual(self.ids("  "), [1, 2, 3])
+
+    def test_incremental_add_replace_and_remove(self):
+        self.index.add({"id": 4, "command": "kubectl get pods", "description": ""})
+        self.index.add({"id": 2, "command": "docker images", "description": "List images"})
+        self.index.remove(1)
+        self.assertEqual(self.ids("get pods"), [4])
+        self.assertEqual(self.ids("docker"), [2])   # Replaced in place
+        self.assertEqual(self.ids("restart"), [])
+        self.assertEqual(self.ids("nginx"), [3])
+
+    def test_matches_linear_scan(self):
+        records = [{"id": i, "command": f"cmd{i % 7} host-{i}", "description": f"d{i % 3}"} for i in range(300)]
+        self.index.build(records)
+        for query in ["cmd3", "host-1", "st-2", "d2 cmd1", "1"]:
+            expected = [r["id"] for r in records
+                        if all(any(t in r[f].lower() for f in ("command", "description")) for t in query.split())]
+            self.assertEqual(self.ids(query), expected, query)
+
+class TestRecordStore(unittest.TestCase):
+    def setUp(self):
+        self.store = device_store([{"id": str(i), "device": f"host-{i}", "ip": f"10.0.0.{i}"} for i in range(1, 6)])
+
+    def ids(self):
+        return [r["id"] for r in self.store]
+
+    def test_records_are_slotted_and_compare_like_dicts(self):
+        record = self.store.get("2")
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEqual(record, {"id": "2", "device": "host-2", "ip": "10.0.0.2"})
+        self.assertEqual(record.get("missing", "-"), "-")
+        with self.assertRaises(AttributeError):
+            record.ip = "10.0.0.99"
+        self.assertEqual(json.loads(json.dumps(self.store.to_dicts()))[1], record)
+
+    def test_lookup_and_remove_by_id(self):
+        self.assertEqual(self.store.position(4), 3) # Ids match as strings
+        self.assertEqual(self.store.remove("2", "4", "nope"), 2)
+        self.assertEqual(self.ids(), ["1", "3", "5"])
+        self.assertEqual(self.store.position("5"), 2)
+        self.assertIsNone(self.store.get("2"))
+
+    def test_delta_updates_in_place_and_removals_win(self):
+        self.store.apply_delta([{"id": "3", "device": "db", "ip": "10.0.0.3"}, {"id": "9", "device": "new", "ip": "x"},
+                                {"id": "8", "device": "gone", "ip": "y"}], ["1", "8"])
+        self.assertEqual(self.ids(), ["2", "3", "4", "5", "9"])
+        self.assertEqual(self.store.get("3")["device"], "db")
+
+    def test_search_index_is_patched_by_writes(self):
+        self.assertEqual([r["id"] for r in self.store.search("host-3")], ["3"])
+        snapshot = self.store.snapshot()
+        self.store.update("3", device="db-3")
+        self.store.append({"id": "6", "device": "host-36", "ip": "10.0.0.6"})
+        self.store.remove("1")
+        self.assertEqual([r["id"] for r in self.store.search("host-3")], ["6"])
+        self.assertEqual([r["id"] for r in self.store.search("db", "device")], ["3"])
+        self.assertEqual(snapshot[2]["device"], "host-3") # Earlier snapshots are unaffected
+
+    def test_scan_matches_search(self):
+        self.store.append({"id": "6", "device": "db 10", "ip": "10.0.1.6"})
+        for query, field in [("host", None), ("10 db", None), ("0.0.3", "ip"), ("", None), ("10.0.1", "device")]:
+            self.assertEqual(self.store.scan(query, field), self.store.search(query, field), query)
+
+    def test_index_built_off_the_store_is_installed_only_if_current(self):
+        generation, rows = self.store.generation, self.store.snapshot()
+        index = self.store.new_index(rows)
+        self.assertFalse(self.store.indexed)
+        self.assertTrue(self.store.install_index(index, generation))
+        self.assertEqual([r["id"] for r in self.store.search("host-3")], ["3"])
+        generation = self.store.generation
+        stale = self.store.new_index(self.store.snapshot())
+        self.store.update("3", device="db-3")
+        self.assertFalse(self.store.install_index(stale, generation))
+        self.assertEqual([r["id"] for r in self.store.search("db")], ["3"])
+
+    def test_sync_response_replaces_or_merges_and_removals_win(self):
+        self.store.apply_sync_response({"delta": True, "devices": [{"id": "7", "device": "tmp", "ip": "x"}], "removed": ["7", "2"]})
+        self.assertEqual(self.ids(), ["1", "3", "4", "5"])
+        self.store.apply_sync_response({"success": True, "revision": 2, "devices": [{"id": "9", "device": "db", "ip": "y"}]})
+        self.assertEqual(self.ids(), ["9"])
+
+    def test_extend_appends_new_ids_and_replaces_known_ones(self):
+        added = self.store.extend([{"id": "6", "device": "host-6", "ip": "10.0.0.6"}, {"id": "2", "device": "db", "ip": "10.0.0.2"}])
+        self.assertEqual([r["id"] for r in added], ["6"])
+        self.assertEqual(self.ids(), ["1", "2", "3", "4", "5", "6"])
+        self.assertEqual([r["id"] for r in self.store.search("db")], ["2"])
+        self.assertEqual([r["id"] for r in self.store.scan("host", rows=added)], ["6"])
+
+    def test_repeated_strings_are_shared(self):
+        day = "".join(["2024-", "01-01"])
+        store = command_store([{"id": 1, "command": "ls", "last_used": day}, {"id": 2, "command": "pwd", "last_used": "2024-01-01"}])
+        self.assertIs(store[0].last_used, store[1].last_used)
+        self.assertIsInstance(store[0], CommandRecord)
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LocalCache(":memory:")
+
+    def test_snapshot_round_trip_per_user_and_kind(self):
+        self.cache.save_snapshot("alice", "commands", [{"id": 1, "command": "ls"}], revision=7, etag='W/"commands-7"')
+        self.cache.save_snapshot("bob", "commands", [], revision=1)
+        snap = self.cache.load_snapshot("alice", "commands")
+        self.assertEqual(snap["items"], [{"id": 1, "command": "ls"}])
+        self.assertEqual(snap["revision"], 7)
+        self.assertEqual(snap["etag"], 'W/"commands-7"')
+        self.assertIsNone(self.cache.load_snapshot("alice", "devices"))
+
+    def test_snapshot_is_replaced(self):
+        self.cache.save_snapshot("alice", "devices", [{"id": "1"}], revision=1)
+        self.cache.save_snapshot("alice", "devices", [{"id": "2"}], revision=2)
+        self.assertEqual(self.cache.load_snapshot("alice", "devices")["items"], [{"id": "2"}])
+
+    def test_sessions(self):
+        self.assertIsNone(self.cache.last_session())
+        self.cache.save_session("alice", "t1")
+        time.sleep(0.01)
+        self.cache.save_session("bob", "t2")
+        self.assertEqual(self.cache.last_session(), ("bob", "t2"))
+        self.assertEqual(self.cache.load_session("alice"), "t1")
+        self.cache.clear_session("bob")
+        self.assertEqual(self.cache.last_session(), ("alice", "t1"))
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        cache = LocalCache(self.path)
+        cache.save_session("alice", "tok")
+        cache.save_snapshot("alice", "commands", [{"id": 1, "command": "systemctl restart nginx", "description": "web"},
+                                                  {"id": 2, "command": "docker ps", "description": "containers"},
+                                                  {"id": 3, "command": "docker ps -a", "description": "all"}], revision=4)
+        cache.close()
+
+    def run_cli(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            code = cli.main([*argv, "--cache", self.path])
+        return code, out.getvalue(), err.getvalue()
+
+    def test_search_reads_the_cache(self):
+        code, out, _ = self.run_cli("search", "commands", "nginx")
+        self.assertEqual((code, out), (0, "1\tsystemctl restart nginx\tweb\t\n"))
+        code, out, _ = self.run_cli("search", "commands", "docker", "--format", "json")
+        self.assertEqual([c["id"] for c in json.loads(out)], [2, 3])
+        self.assertEqual(self.run_cli("search", "devices", "x")[0], cli.EXIT_ERROR)
+
+    def test_print_resolves_id_exact_text_or_fails_when_ambiguous(self):
+        self.assertEqual(self.run_cli("print", "1")[1], "systemctl restart nginx\n")
+        self.assertEqual(self.run_cli("print", "docker", "ps")[1], "docker ps\n")
+        code, out, err = self.run_cli("print", "docker")
+        self.assertEqual((code, out), (cli.EXIT_AMBIGUOUS, ""))
+        self.assertIn("2 commands match", err)
+
+    def test_not_logged_in(self):
+        code, _, err = self.run_cli("search", "commands", "--user", "bob")
+        self.assertEqual(code, cli.EXIT_ERROR)
+        self.assertIn("run `login` first", err)
+
+    @patch("api_client.ApiClient.get_conditional")
+    @patch("api_client.ApiClient.send_json")
+    def test_add_sends_and_merges_delta_into_cache(self, mock_send, mock_get):
+        created = {"id": 4, "command": "uptime", "description": "", "last_used": "2024-01-01", "rev": 5}
+        mock_send.return_value = {"success": True, "message": "Command added", "command": created, "revision": 5}
+        mock_get.return_value = ({"success": True, "delta": True, "revision": 5, "commands": [created], "removed": []}, 'W/"c-5"')
+        code, out, _ = self.run_cli("add", "command", "uptime", "--format", "json")
+        self.assertEqual((code, json.loads(out)["command"]["id"]), (0, 4))
+        mock_send.assert_called_once_with("POST", "/commands/add", {"command": "uptime", "description": ""})
+        self.assertEqual(mock_get.call_args.args[2], {"since": 4})
+        self.assertEqual(self.run_cli("print", "uptime")[1], "uptime\n")
+
+    def test_add_accepts_shared_options_before_or_after_the_kind(self):
+        parser = cli.build_parser()
+        args = parser.parse_args(["add", "--user", "bob", "--format", "json", "--cache", "x.db", "command", "ls"])
+        self.assertEqual((args.user, args.format, args.cache, args.text), ("bob", "json", "x.db", "ls"))
+        args = parser.parse_args(["add", "device", "web", "10.0.0.1", "--user", "bob"])
+        self.assertEqual((args.user, args.format, args.cache), ("bob", "tsv", None))
+
+    @patch("api_client.ApiClient.get_conditional")
+    def test_refresh_falls_back_to_cache_when_offline(self, mock_get):
+        mock_get.side_effect = RequestsConnectionError("down")
+        code, out, err = self.run_cli("search", "commands", "nginx", "--refresh")
+        self.assertEqual((code, out.split("\t")[0]), (0, "1"))
+        self.assertIn("server unreachable", err)
+
+    def test_starts_without_gui_toolkits(self):
+        script = "import sys, cli; print(sorted(m for m in ('tkinter', 'ttkbootstrap', 'requests') if m in sys.modules))"
+        out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(out.stdout.strip(), "[]")
+
+class TestImporter(unittest.TestCase):
+    def test_reads_json_array_and_ndjson(self):
+        records = [{"command": "ls"}, {"command": "pwd", "description": "where"}]
+        array = _write_temp(json.dumps(records, indent=4), self)
+        ndjson = _write_temp("\n".join(json.dumps(r) for r in records) + "\n", self, suffix=".ndjson")
+        self.assertEqual(list(iter_records(array)), records)
+        self.assertEqual(list(iter_records(ndjson)), records)
+
+    def test_reads_gzip_across_chunk_boundaries(self):
+        records = [{"command": f"echo {'x' * 50} {i}"} for i in range(3000)]
+        path = _write_temp(json.dumps(records), self, suffix=".json.gz", compress=True)
+        with patch("importer.CHUNK_SIZE", 1000):
+            self.assertEqual(list(iter_records(path)), records)
+
+    def test_batches_skip_invalid_and_report_progress(self):
+        records = [{"command": f"c{i}"} for i in range(5)] + [{"description": "no command"}, "junk"]
+        path = _write_temp(json.dumps(records), self)
+        batches, fractions = [], []
+        report = import_records(path, command_record, lambda b: (batches.append(list(b)) or True, None),
+                                batch_size=2, progress=lambda r, f: fractions.append(f))
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+        self.assertEqual((report.imported, report.skipped, report.failed), (5, 2, 0))
+        self.assertEqual(fractions[-1], 1.0)
+
+    def test_failed_batch_is_reported_and_import_continues(self):
+        path = _write_temp(json.dumps([{"command": f"c{i}"} for i in range(4)]), self)
+        calls = []
+
+        def upload(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RequestException("timeout")
+            return True, None
+
+        report = import_records(path, command_record, upload, batch_size=2)
+        self.assertEqual((report.imported, report.failed), (2, 2))
+        self.assertEqual(report.batch_errors, [(1, "timeout")])
+
+    def test_cancel_stops_before_next_record(self):
+        path = _write_temp(json.dumps([{"command": f"c{i}"} for i in range(10)]), self)
+        cancel = threading.Event()
+
+        def upload(batch):
+            cancel.set()
+            return True, None
+
+        report = import_records(path, command_record, upload, batch_size=3, cancel=cancel)
+        self.assertTrue(report.cancelled)
+        self.assertEqual(report.imported, 3)
+
+    def test_dedupes_and_applies_per_record_outcome(self):
+        devices = [{"device": "Router", "ip": "1.1.1.1"}, {"device": "nas", "ip": "2.2.2.2"},
+                   {"device": "NAS ", "ip": "2.2.2.2"}, {"device": "AP", "ip": "3.3.3.3"}]
+        path = _write_temp(json.dumps(devices), self)
+        sent = []
+
+        def upload(batch):
+            sent.extend(batch)
+            return True, "ok", {"duplicates": 1, "errors": []}
+
+        report = import_records(path, device_record, upload, dedupe_key=device_key,
+                                existing=[{"device": "router", "ip": "1.1.1.1"}])
+        self.assertEqual([d["device"] for d in sent], ["nas", "AP"])
+        self.assertEqual((report.imported, report.duplicates), (1, 3))
+
+    def test_malformed_file_stops_with_error(self):
+        path = _write_temp('[{"command": "ok"}, {"command": ', self)
+        report = import_records(path, command_record, lambda b: (True, None))
+        self.assertEqual(report.imported, 1)
+        self.assertIn("Malformed JSON", report.error)
+
+
+class TestExporter(unittest.TestCase):
+    def setUp(self):
+        self.records = [{"id": i, "command": f"echo {i}", "description": "d,\"q\"", "last_used": "2025-01-01"}
+                        for i in range(2500)]
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_json_and_ndjson_round_trip_through_importer(self):
+        for name in ("out.json", "out.ndjson", "out.json.gz", "out.ndjson.gz"):
+            path = os.path.join(self.dir.name, name)
+            self.assertEqual(export_records(path, self.records, ["id"]), 2500)
+            self.assertEqual(list(iter_records(path)), self.records, name)
+
+    def test_exported_records_leave_out_the_server_revision(self):
+        store = command_store([{**r, "rev": 7} for r in self.records[:3]])
+        for name in ("out.json", "out.ndjson"):
+            path = os.path.join(self.dir.name, name)
+            export_records(path, store.snapshot(), COMMAND_FIELDS)
+            exported = list(iter_records(path))
+            self.assertEqual([sorted(r) for r in exported], [sorted(COMMAND_FIELDS)] * 3, name)
+            self.assertEqual(command_record(exported[0]), {"command": "echo 0", "description": 'd,"q"'})
+
+    def test_csv_writes_selected_fields(self):
+        path = os.path.join(self.dir.name, "out.csv")
+        export_records(path, self.records[:2], ["id", "command", "description"])
+        with open(path, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["id", "command", "description"])
+        self.assertEqual(rows[1], ["0", "echo 0", 'd,"q"'])
+
+    def test_cancel_leaves_existing_file_untouched(self):
+        path = os.path.join(self.dir.name, "out.json")
+        with open(path, "w") as f:
+            f.write("previous")
+        cancel = threading.Event()
+        result = export_records(path, self.records, ["id"], progress=lambda done, total: cancel.set(), cancel=cancel)
+        self.assertIsNone(result)
+        with open(path) as f:
+            self.assertEqual(f.read(), "previous")
+        self.assertEqual(os.listdir(self.dir.name), ["out.json"])
+
+
+class TestStartup(unittest.TestCase):
+    def test_login_screen_does_not_import_http_stack_or_main_app(self):
+        code = "import sys, auth_screen; print('requests' in sys.modules, 'command_manager' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        self.assertEqual(out.split(), ["False", "False"])
+
+    def test_report_lists_marks_in_order(self):
+        startup.mark("first")
+        startup.mark("second")
+        out = io.StringIO()
+        startup.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertLess(lines.index(next(l for l in lines if l.startswith("first"))),
+                        lines.index(next(l for l in lines if l.startswith("second"))))
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_stub_server_serves_login_and_conditional_lists(self):
+        stub = benchmarks.StubApi()
+        self.addCleanup(stub.close)
+        stub.load(commands=benchmarks.make_commands(3))
+        client = ApiClient(stub.url)
+        self.addCleanup(client.close)
+        login = client.send_json("POST", "/login", {"username": "u", "password": "p"})
+        self.assertEqual(len(login["commands"]), 3)
+        body, etag = client.get_conditional("/commands")
+        self.assertEqual(client.get_conditional("/commands", etag), (None, etag))
+
+    def test_stub_server_compresses_large_responses(self):
+        stub = benchmarks.StubApi()
+        self.addCleanup(stub.close)
+        stub.load(commands=benchmarks.make_commands(500))
+        client = ApiClient(stub.url)
+        self.addCleanup(client.close)
+        self.assertEqual(len(client.get_json("/commands")["commands"]), 500)
+        plain, _ = benchmarks.StubApi.encode({"commands": stub.data["commands"]})
+        self.assertLess(stub.bytes_sent, len(plain) / 4)
+
+    def test_stub_server_pages_lists(self):
+        stub = benchmarks.StubApi()
+        self.addCleanup(stub.close)
+        stub.load(commands=benchmarks.make_commands(5))
+        client = ApiClient(stub.url)
+        self.addCleanup(client.close)
+        login = client.send_json("POST", "/login", {"username": "u", "password": "p", "pageSize": 2})
+        self.assertEqual((len(login["commands"]), login["cursors"]["commands"]), (2, "2"))
+        page = client.get_page("/commands", 10, login["cursors"]["commands"])
+        self.assertEqual(([c["id"] for c in page["commands"]], page["next"]), ([3, 4, 5], None))
+
+    def test_compare_flags_regressions(self):
+        baseline = {"a": {"median_ms": 10.0}, "b": {"median_ms": 10.0}}
+        results = {"a": {"median_ms": 11.0}, "b": {"median_ms": 20.0}, "new": {"median_ms": 1.0}}
+        with patch("builtins.print"):
+            self.assertEqual(benchmarks.compare(results, baseline, 1.25), ["b"])
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.set_enabled, instrumentation.enabled)
+
+    def test_disabled_spans_record_nothing(self):
+        instrumentation.set_enabled(False)
+        with instrumentation.span("op", 10) as span:
+            span.size = 20
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    def test_spans_aggregate_into_histograms(self):
+        instrumentation.set_enabled(True)
+        for ms in (1, 2, 3, 200):
+            instrumentation.record("fetch /commands", ms, size=100)
+        with instrumentation.span("render commands") as span:
+            span.size = 5
+        stats = instrumentation.snapshot()
+        self.assertEqual(stats["fetch /commands"]["count"], 4)
+        self.assertEqual(stats["fetch /commands"]["p50_ms"], 2.5)
+        self.assertEqual(stats["fetch /commands"]["max_ms"], 200)
+        self.assertEqual(stats["fetch /commands"]["mean_size"], 100)
+        self.assertEqual(stats["render commands"]["max_size"], 5)
+
+    @patch("requests.Session.request")
+    def test_api_client_separates_network_and_decode(self, mock_request):
+        instrumentation.set_enabled(True)
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.content = b'{"success": true}'
+        mock_request.return_value.json.return_value = {"success": True}
+        ApiClient("http://x").get_json("/commands")
+        stats = instrumentation.snapshot()
+        self.assertEqual(stats["network GET /commands"]["mean_size"], 17)
+        self.assertEqual(stats["decode /commands"]["count"], 1)
+
+    def test_dump_writes_json(self):
+        instrumentation.set_enabled(True)
+        instrumentation.record("op", 1.0)
+        path = _write_temp("", self)
+        instrumentation.dump(path)
+        with open(path) as f:
+            self.assertIn("op", json.load(f)["operations"])
+
+
+class TestMutationQueue(unittest.TestCase):
+    def setUp(self):
+        self.root = MagicMock()
+        self.runner = TaskRunner(self.root)
+        self.addCleanup(self.runner.shutdown)
+        self.store = LocalCache(":memory:")
+        self.sent = []
+
+    def send(self, kind, updates):
+        self.sent.append((kind, updates))
+        return {"success": True, "revision": 2}
+
+    def make_queue(self, send=None, **kwargs):
+        return MutationQueue(self.root, self.runner, send or self.send, store=self.store, username="u", **kwargs)
+
+    def test_repeated_updates_coalesce_into_one_request_per_kind(self):
+        queue = self.make_queue()
+        for day in ("2025-01-01", "2025-01-02", "2025-01-03"):
+            queue.update("commands", 1, {"last_used": day})
+        queue.update("commands", 2, {"description": "x"})
+        queue.update("commands", 2, {"last_used": "2025-01-03"})
+        queue.update("devices", "7", {"ip": "10.0.0.7"})
+        self.assertEqual(len(queue), 3)
+        queue.flush()
+        self.runner.drain()
+        self.assertEqual(sorted(self.sent, key=lambda s: s[0]), [
+            ("commands", [{"id": 1, "last_used": "2025-01-03"}, {"id": 2, "description": "x", "last_used": "2025-01-03"}]),
+            ("devices", [{"id": "7", "ip": "10.0.0.7"}])])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(self.store.load_mutations("u"), [])
+
+    def test_flushes_when_full(self):
+        queue = self.make_queue(flush_size=2)
+        queue.update("commands", 1, {"last_used": "d"})
+        self.assertEqual(self.sent, [])
+        queue.update("commands", 2, {"last_used": "d"})
+        self.runner.drain()
+        self.assertEqual(len(self.sent), 1)
+
+    def test_pending_edits_survive_restart_and_are_replayed(self):
+        queue = self.make_queue()
+        queue.update("commands", 1, {"last_used": "2025-01-01"})
+        queue.update("commands", 1, {"last_used": "2025-01-02"})
+        self.runner.drain()
+
+        replay = self.make_queue()
+        self.assertEqual(replay.pending("commands", 1), {"last_used": "2025-01-02"})
+        self.root.after.assert_called_with(0, replay._on_timer)
+        replay._on_timer()
+        self.runner.drain()
+        self.assertEqual(self.sent, [("commands", [{"id": 1, "last_used": "2025-01-02"}])])
+
+    def test_unreachable_server_keeps_edits_and_backs_off(self):
+        def down(kind, updates):
+            raise RequestsConnectionError("down")
+
+        queue = self.make_queue(send=down, interval_ms=100)
+        queue.update("commands", 1, {"last_used": "d"})
+        queue.flush()
+        self.runner.drain()
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(self.root.after.call_args.args[0], 200)
+        self.assertEqual(len(self.store.load_mutations("u")), 1)
+
+    def test_edit_made_while_flush_in_flight_is_kept(self):
+        queue = self.make_queue()
+        release = threading.Event()
+
+        def slow(kind, updates):
+            release.wait(2)
+            return self.send(kind, updates)
+
+        queue.send = slow
+        queue.update("commands", 1, {"last_used": "old"})
+        queue.flush()
+        queue.update("commands", 1, {"last_used": "new"})
+        release.set()
+        self.runner.drain()
+        self.assertEqual(queue.pending("commands", 1), {"last_used": "new"})
+        self.assertEqual(self.store.load_mutations("u")[0][2], {"last_used": "new"})
+
+
+    def test_delivered_edits_are_not_replayed_after_a_slow_save(self):
+        save = self.store.save_mutation
+
+        def slow_save(*args):
+            time.sleep(0.2) # Lands after the delete if the two race on worker threads
+            save(*args)
+
+        self.store.save_mutation = slow_save
+        queue = self.make_queue()
+        queue.update("commands", 1, {"last_used": "2025-01-01"})
+        queue.flush()
+        self.runner.drain()
+        self.assertEqual(self.store.load_mutations("u"), [])
+        self.assertEqual(len(self.make_queue()), 0)
+
+class TestReachability(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.create_server(("", 0), backlog=512)
+        self.addCleanup(self.server.close)
+        self.open_port = self.server.getsockname()[1]
+        with socket.create_server(("127.0.0.1", 0)) as s:
+            self.closed_port = s.getsockname()[1] # Nothing listens here once closed
+
+    def test_probe_states(self):
+        found = reachability.sweep(["127.0.0.1", "300.1.1.1", "bad host"], ports=(self.closed_port, self.open_port))
+        self.assertEqual(found["127.0.0.1"].state, "up")
+        self.assertEqual(found["127.0.0.1"].port, self.open_port)
+        self.assertEqual(reachability.sweep(["127.0.0.1"], ports=(self.closed_port,))["127.0.0.1"].state, "closed")
+        self.assertEqual(found["300.1.1.1"].state, "invalid")
+        self.assertEqual(found["bad host"].state, "invalid")
+        self.assertTrue(reachability.label(found["127.0.0.1"]).startswith("up "))
+
+    def test_timeout_counts_as_down(self):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        with patch("asyncio.open_connection", hang):
+            start = time.monotonic()
+            found = reachability.sweep(["10.0.0.1", "10.0.0.2"], timeout=0.1)
+        self.assertEqual({s.state for s in found.values()}, {"down"})
+        self.assertLess(time.monotonic() - start, 1)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "needs 127/8 routed to loopback")
+    def test_many_hosts_with_bounded_concurrency(self):
+        hosts = [f"127.0.{i // 250}.{i % 250 + 1}" for i in range(400)]
+        found = reachability.sweep(hosts, ports=(self.open_port,), concurrency=64)
+        self.assertEqual(len(found), 400)
+        self.assertEqual({s.state for s in found.values()}, {"up"})
+
+    def test_scanner_delivers_on_main_thread_and_reuses_fresh_results(self):
+        batches = []
+        scanner = reachability.ReachabilityScanner(MagicMock(), batches.append, ports=(self.open_port,), interval_ms=0)
+        scanner.scan(["127.0.0.1", "127.0.0.1"])
+        scanner.drain()
+        self.assertEqual(list(batches[0]), ["127.0.0.1"])
+        self.assertEqual(scanner.status("127.0.0.1").state, "up")
+        scanner.scan(["127.0.0.1"]) # Within the TTL: nothing to probe
+        self.assertFalse(scanner.running)
+        scanner.scan(["127.0.0.1"], force=True)
+        self.assertTrue(scanner.running)
+        scanner.drain()
+        self.assertEqual(len(batches), 2)
+
+class TestChangeFeed(unittest.TestCase):
+    def test_parse_events_skips_heartbeats_and_joins_data(self):
+        lines = [": connected", "", "event: change", "data: {\"a\":", "data: 1}", "", ": heartbeat", "", "data:x", ""]
+        self.assertEqual(list(change_feed.parse_events(lines)), [("change", '{"a":\n1}'), ("message", "x")])
+
+    @patch.object(change_feed, "RECONNECT_MIN", 0.01)
+    def test_reconnects_from_latest_revisions(self):
+        queries = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                queries.append(self.path)
+                revision = len(queries)
+                body = f'event: change\ndata: {{"kind": "commands", "since": {revision - 1}, "revision": {revision}}}\n\n'.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body) # Then the connection drops
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        revisions = {"commands": 0, "devices": None}
+        def on_change(data):
+            revisions["commands"] = data["revision"]
+        feed = change_feed.ChangeFeed(MagicMock(), ApiClient(f"http://127.0.0.1:{server.server_port}"), on_change,
+                                      lambda: dict(revisions), read_timeout=2)
+        feed.start()
+        self.addCleanup(feed.stop)
+        deadline = time.monotonic() + 5
+        while revisions["commands"] < 3 and time.monotonic() < deadline:
+            feed.poll()
+            time.sleep(0.01)
+        self.assertEqual(queries[:3], ["/events?commands=0", "/events?commands=1", "/events?commands=2"])
+
+    def test_client_errors_stop_the_feed(self):
+        api = MagicMock()
+        api.stream.side_effect = HTTPError(response=MagicMock(status_code=404))
+        states = []
+        feed = change_feed.ChangeFeed(MagicMock(), api, None, dict, on_state=states.append)
+        feed.start()
+        feed._thread.join(2)
+        feed.poll()
+        self.assertFalse(feed.running)
+        self.assertEqual(api.stream.call_count, 1)
+        self.assertEqual(states, []) # Never went live, so nothing to report
+
+@unittest.skipIf(sys.platform == "win32", "LocalTransport commands below use sh")
+class TestFanout(unittest.TestCase):
+    def setUp(self):
+        self.transport = fanout.LocalTransport()
+
+    def test_streams_output_and_records_exit_codes(self):
+        lines = []
+        found = fanout.run(["r1", "r2", "r3"], 'echo "version on $FANOUT_HOST"; [ "$FANOUT_HOST" != r2 ] || exit 3',
+                           self.transport, on_output=lambda host, text: lines.append((host, text)))
+        self.assertEqual(found["r1"].status, "ok")
+        self.assertEqual((found["r2"].status, found["r2"].exit_code), ("failed", 3))
+        self.assertEqual(found["r3"].output, "version on r3\n")
+        self.assertIn(("r2", "version on r2\n"), lines)
+        self.assertGreaterEqual(found["r1"].duration_ms, 0)
+
+    def test_bounded_concurrency_and_per_host_timeout(self):
+        start = time.monotonic()
+        found = fanout.run([f"h{i}" for i in range(6)], "sleep 0.2", self.transport, parallel=3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.4) # Two waves of three
+        self.assertEqual({r.status for r in found.values()}, {"ok"})
+
+        found = fanout.run(["slow"], "echo started; sleep 10", self.transport, timeout=0.3)
+        self.assertEqual((found["slow"].status, found["slow"].output), ("timeout", "started\n"))
+        self.assertLess(found["slow"].duration_ms, 2000)
+
+    def test_local_transport_passes_host_as_a_variable(self):
+        host = "x&touch pwned;$(id)"
+        self.assertNotIn(host, " ".join(self.transport.argv(host, "true")))
+        found = fanout.run([host], 'echo "$FANOUT_HOST"', self.transport)
+        self.assertEqual(found[host].output, host + "\n")
+
+    def test_ssh_transport_argv(self):
+        argv = fanout.SshTransport(user="admin", port=2222).argv("10.0.0.1", "show version")
+        self.assertEqual(argv[-3:], ["--", "admin@10.0.0.1", "show version"])
+        self.assertIn("BatchMode=yes", argv)
+
+    def test_ssh_transport_rejects_hosts_that_read_as_options(self):
+        with self.assertRaises(ValueError):
+            fanout.SshTransport().argv("-oProxyCommand=x", "ls")
+        found = fanout.run(["-oProxyCommand=x"], "ls", fanout.SshTransport())
+        self.assertEqual(found["-oProxyCommand=x"].status, "error")
+
+    def test_job_delivers_batches_and_cancel_marks_remaining_hosts(self):
+        output, results, finished = [], [], []
+        job = fanout.FanoutJob(MagicMock(), ["a", "b", "c"], "echo $FANOUT_HOST; sleep 10", self.transport,
+                               output.extend, results.append, finished.append, parallel=1)
+        job.start()
+        time.sleep(0.3)
+        job.cancel()
+        job.drain(timeout=5)
+        self.assertEqual(output, [("a", "a\n")])
+        self.assertEqual(sorted(r.status for r in results), ["cancelled"] * 3)
+        self.assertEqual(len(finished), 1)
+
+    def test_run_history_is_persisted(self):
+        cache = LocalCache(":memory:")
+        found = fanout.run(["x", "y"], "exit 1", self.transport)
+        cache.save_run("alice", "exit 1", 100.0, sorted(found.values()))
+        cache.save_run("alice", "uptime", 200.0, [fanout.HostResult("x", "ok", 0, 12.5, "up 3 days\n")])
+        runs = cache.load_runs("alice")
+        self.assertEqual([(r["command"], r["host"], r["exit_code"]) for r in runs],
+                         [("uptime", "x", 0), ("exit 1", "x", 1), ("exit 1", "y", 1)])
+        self.assertEqual(runs[0]["duration_ms"], 12.5)
+        self.assertEqual(cache.load_runs("bob"), [])
+
+class TestApiClient(unittest.TestCase):
+    def setUp(self):
+        self.client = ApiClient(base_url="http://api.test/", token="abc")
+
+    @patch("requests.Session.request")
+    def test_token_sent_in_header_not_body(self, mock_request):
+        mock_request.return_value.json.return_value = {"success": True}
+        self.client.send_json("DELETE", "/commands/remove", {"id": 3})
+
+        args, kwargs = mock_request.call_args
+        self.assertEqual(args, ("DELETE", "http://api.test/commands/remove"))
+        self.assertEqual(kwargs["json"], {"id": 3})
+        self.assertEqual(self.client.session.headers["x-access-token"], "abc")
+
+    @patch("requests.Session.request")
+    def test_per_endpoint_timeouts(self, mock_request):
+        self.client.get_json("/commands")
+        self.assertEqual(mock_request.call_args.kwargs["timeout"], api_client.DEFAULT_TIMEOUT)
+        self.client.send_json("POST", "/commands/import", {"commands": []})
+        self.assertEqual(mock_request.call_args.kwargs["timeout"], api_client.ENDPOINT_TIMEOUTS["/commands/import"])
+
+    def test_session_retries_only_idempotent_gets(self):
+        retry = self.client.session.get_adapter("http://api.test").max_retries
+        self.assertEqual(retry.total, api_client.GET_RETRIES)
+        self.assertIn("GET", retry.allowed_methods)
+        self.assertNotIn("POST", retry.allowed_methods)
+
+    @patch("requests.Session.request")
+    def test_large_bulk_bodies_are_gzipped(self, mock_request):
+        mock_request.return_value.json.return_value = {"success": True}
+        commands = [{"command": f"echo {i}", "description": "x" * 20} for i in range(100)]
+        self.client.send_json("POST", "/commands/import", {"commands": commands})
+        kwargs = mock_request.call_args.kwargs
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(kwargs["data"])), {"commands": commands})
+        self.client.send_json("POST", "/commands/import", {"commands": commands[:1]}) # Too small to bother
+        self.assertEqual(mock_request.call_args.kwargs["json"], {"commands": commands[:1]})
+
+    def test_decode_body_follows_content_type(self):
+        resp = MagicMock(headers={"Content-Type": "application/json; charset=utf-8"})
+        resp.json.return_value = {"success": True}
+        self.assertEqual(api_client.decode_body(resp), {"success": True})
+        if api_client.msgpack:
+            binary = MagicMock(headers={"Content-Type": "application/msgpack"},
+                               content=api_client.msgpack.packb({"commands": [{"id": 1}]}))
+            self.assertEqual(api_client.decode_body(binary), {"commands": [{"id": 1}]})
+
+    @patch("requests.Session.request")
+    def test_get_page_sends_limit_and_cursor(self, mock_request):
+        mock_request.return_value.json.return_value = {"success": True}
+        self.client.get_page("/commands", 50, "abc", sort="last_used")
+        self.assertEqual(mock_request.call_args.kwargs["params"], {"limit": 50, "after": "abc", "sort": "last_used"})
+        self.client.get_page("/commands", 50)
+        self.assertEqual(mock_request.call_args.kwargs["params"], {"limit": 50})
+
+    def test_clearing_token_removes_header(self):
+        self.client.set_token(None)
+        self.assertNotIn("x-access-token", self.client.session.headers)
+
+    @patch("requests.Session.request")
+    def test_conditional_get_handles_not_modified(self, mock_request):
+        mock_request.return_value.status_code = 304
+        data, etag = ApiClient().get_conditional("/devices", 'W/"devices-4"', {"since": 4})
+        self.assertIsNone(data)
+        self.assertEqual(etag, 'W/"devices-4"')
+        self.assertEqual(mock_request.call_args.kwargs["headers"], {"If-None-Match": 'W/"devices-4"'})
+
+class TestTaskRunner(unittest.TestCase):
+    def setUp(self):
+        # The runner only needs root.after; drain() delivers callbacks without a Tk event loop
+        self.runner = TaskRunner(MagicMock())
+
+    def tearDown(self):
+        self.runner.shutdown()
+
+    def test_results_and_errors_delivered_to_callbacks(self):
+        results, errors = [], []
+        self.runner.submit(lambda: 42, on_success=results.append)
+        self.runner.submit(lambda: 1 / 0, on_error=errors.append)
+        self.runner.drain()
+        self.assertEqual(results, [42])
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+        self.assertFalse(self.runner.busy)
+
+    def test_newer_keyed_request_supersedes_in_flight_one(self):
+        gate = threading.Event()
+        results = []
+        self.runner.submit(lambda: gate.wait() and "first", on_success=results.append, key="/commands")
+        self.runner.submit(lambda: "second", on_success=results.append, key="/commands")
+        self.runner.submit(lambda: "third", on_success=results.append, key="/commands")
+        gate.set()
+        self.runner.drain()
+        # Only the newest request's result is applied; "second" never ran
+        self.assertEqual(results, ["third"])
+
+    def test_busy_callback_toggles_once_per_burst(self):
+        states = []
+        self.runner.on_busy_change = states.append
+        self.runner.submit(lambda: None)
+        self.runner.submit(lambda: None)
+        self.runner.drain()
+        self.assertEqual(states, [True, False])
 
 if __name__ == "__main__":
     unittest.main()
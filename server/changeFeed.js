@@ -0,0 +1,52 @@
+// changeFeed.js
+
+/**
+ * In-process notifications of list changes, for the /events stream.
+ *
+ * commitChange publishes { kind, revision } for a user after each committed
+ * mutation; every open /events connection of that user is subscribed and sends
+ * the client the delta since the revision it last sent. Only changes made by
+ * this process are announced here; /events also re-checks the revisions on each
+ * heartbeat, so changes made by another process arrive within one heartbeat.
+ */
+
+const { EventEmitter } = require('events');
+
+class ChangeFeed {
+    constructor() {
+        this.emitter = new EventEmitter();
+        this.emitter.setMaxListeners(0); // One listener per open connection
+    }
+
+    /**
+     * Announces that a user's list reached `revision`.
+     */
+    publish(userId, kind, revision) {
+        this.emitter.emit(String(userId), { kind, revision });
+    }
+
+    /**
+     * Calls listener({ kind, revision }) on each change of the user's lists.
+     * @returns {Function} Unsubscribes the listener.
+     */
+    subscribe(userId, listener) {
+        const key = String(userId);
+        this.emitter.on(key, listener);
+        return () => this.emitter.off(key, listener);
+    }
+
+    /**
+     * Open subscriptions of a user (diagnostics and tests).
+     */
+    listeners(userId) {
+        return this.emitter.listenerCount(String(userId));
+    }
+}
+
+// Shared by commitChange and the /events route
+const changeFeed = new ChangeFeed();
+
+module.exports = {
+    ChangeFeed,
+    changeFeed,
+};
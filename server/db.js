@@ -1,6 +1,7 @@
 // db.js
 
 const { MongoClient } = require('mongodb');
+const { ensureItemIndexes } = require('./items');
 
 // NOTE: Hardcoding credentials is a security risk. Use environment variables (process.env) instead!
 const uri = '<MOngoDBLink>';
@@ -8,6 +9,16 @@ const dbName = 'commandBase';
 
 let db;
 
+/**
+ * Creates the indexes the API's hot queries rely on (no-op when they already exist).
+ * @param {Object} database Connected database.
+ */
+async function ensureIndexes(database) {
+    // checkToken resolves the token on every data request
+    await database.collection('users').createIndex({ token: 1 }, { name: 'token_1' });
+    await ensureItemIndexes(database);
+}
+
 /**
  * Connects to MongoDB Atlas and stores the database object.
  * @returns {Promise<Object>} The connected database object.
@@ -23,6 +34,7 @@ async function connectToMongo() {
             useUnifiedTopology: true 
         });
         db = client.db(dbName);
+        await ensureIndexes(db);
         console.log(`Connected to MongoDB Atlas: ${dbName}`);
         return db;
     } catch (err) {
@@ -46,5 +58,6 @@ const dbMiddleware = (req, res, next) => {
 
 module.exports = { 
     connectToMongo,
+    ensureIndexes,
     dbMiddleware,
 };
\ No newline at end of file
@@ -0,0 +1,150 @@
+// items.js
+
+/**
+ * Storage for users' commands and devices.
+ *
+ * Each item is its own document in the `commands` or `devices` collection, keyed
+ * by { owner: <user _id>, id }. The user document keeps only the small per-list
+ * state: `revisions.<kind>`, `nextIds.<kind>` (the last id handed out) and the
+ * bounded `tombstones.<kind>`. Adding, updating or removing an item therefore
+ * touches one item document plus the user's counters, however long the list is.
+ */
+
+const { ObjectId } = require('mongodb');
+
+const KINDS = ['commands', 'devices'];
+
+// Largest page a client may ask for
+const PAGE_LIMIT = 1000;
+
+/**
+ * Page orders: `created` is insertion order (the order full lists use); `last_used`
+ * is most recently used first. Each ends on _id, so the order is total and a
+ * cursor can resume exactly after the last item of a page.
+ */
+const PAGE_SORTS = {
+    created: { kinds: KINDS, sort: { _id: 1 } },
+    last_used: { kinds: ['commands'], sort: { last_used: -1, _id: 1 } },
+};
+
+// Fields never sent to clients
+const ITEM_PROJECTION = { _id: 0, owner: 0 };
+
+// Commands have integer ids; devices have string ids (kept for API compatibility)
+const ID_FORMAT = {
+    commands: n => n,
+    devices: n => String(n),
+};
+
+/**
+ * Client-facing id for the n-th item of a list.
+ */
+const formatId = (kind, n) => ID_FORMAT[kind](n);
+
+/**
+ * Creates the item indexes: unique (owner, id) for lookups and id allocation,
+ * (owner, last_used, _id) for recently-used queries and pages, (owner, _id) for
+ * pages in insertion order and (owner, rev) for delta fetches.
+ * @param {Object} database Connected database.
+ */
+async function ensureItemIndexes(database) {
+    for (const kind of KINDS) {
+        const items = database.collection(kind);
+        await items.createIndex({ owner: 1, id: 1 }, { name: 'owner_1_id_1', unique: true });
+        await items.createIndex({ owner: 1, last_used: -1, _id: 1 }, { name: 'owner_1_last_used_-1__id_1' });
+        await items.createIndex({ owner: 1, _id: 1 }, { name: 'owner_1__id_1' });
+        await items.createIndex({ owner: 1, rev: 1 }, { name: 'owner_1_rev_1' });
+    }
+}
+
+/**
+ * Loads a user's items matching `filter`, in insertion order, without storage fields.
+ */
+const findItems = (db, owner, kind, filter = {}) =>
+    db.collection(kind).find({ owner, ...filter }, { projection: ITEM_PROJECTION }).sort({ _id: 1 }).toArray();
+
+/**
+ * Opaque page cursor: the sort values and _id of the last item of a page.
+ */
+const encodeCursor = (sort, doc) => Buffer.from(JSON.stringify(
+    Object.keys(sort).map(field => (field === '_id' ? String(doc._id) : doc[field] ?? null))
+)).toString('base64url');
+
+/**
+ * Decodes a cursor made by encodeCursor for `sort`; returns null when it is malformed.
+ */
+function decodeCursor(sort, cursor) {
+    let values;
+    try {
+        values = JSON.parse(Buffer.from(String(cursor), 'base64url').toString());
+    } catch {
+        return null;
+    }
+    const fields = Object.keys(sort);
+    if (!Array.isArray(values) || values.length !== fields.length || !/^[0-9a-f]{24}$/.test(values[values.length - 1])) {
+        return null;
+    }
+    values[values.length - 1] = new ObjectId(values[values.length - 1]);
+    return values;
+}
+
+/**
+ * Filter for the items after `values` in `sort` order (keyset pagination): for
+ * { a: -1, _id: 1 } that is a < A, or a = A and _id > ID. Nulls sort lowest.
+ */
+function afterFilter(sort, values) {
+    const fields = Object.keys(sort);
+    const branches = fields.map((field, i) => {
+        const branch = Object.fromEntries(fields.slice(0, i).map((f, j) => [f, values[j]]));
+        const value = values[i];
+        if (sort[field] > 0) {
+            branch[field] = value === null ? { $ne: null } : { $gt: value };
+        } else if (value === null) {
+            return null; // Nothing sorts below null
+        } else {
+            return { ...branch, $or: [{ [field]: { $lt: value } }, { [field]: null }] };
+        }
+        return branch;
+    }).filter(Boolean);
+    return branches.length === 1 ? branches[0] : { $or: branches };
+}
+
+/**
+ * Loads one page of a user's items.
+ * @param {string} order A PAGE_SORTS key.
+ * @param {string} [after] Cursor from the previous page's `next`.
+ * @returns {Promise<{items: Object[], next: string|null}>} `next` is null on the last page.
+ */
+async function findPage(db, owner, kind, { order = 'created', after, limit }) {
+    const { sort } = PAGE_SORTS[order];
+    const filter = { owner };
+    if (after) {
+        Object.assign(filter, afterFilter(sort, decodeCursor(sort, after)));
+    }
+    const docs = await db.collection(kind)
+        .find(filter, { projection: { owner: 0 } })
+        .sort(sort)
+        .limit(limit + 1) // One extra tells whether another page follows
+        .toArray();
+    const page = docs.slice(0, limit);
+    const next = docs.length > limit ? encodeCursor(sort, page[page.length - 1]) : null;
+    return { items: page.map(({ _id, ...item }) => item), next };
+}
+
+/**
+ * Stored form of a client-facing item.
+ */
+const toDocument = (owner, item) => ({ owner, ...item });
+
+module.exports = {
+    KINDS,
+    PAGE_LIMIT,
+    PAGE_SORTS,
+    ITEM_PROJECTION,
+    formatId,
+    ensureItemIndexes,
+    findItems,
+    decodeCursor,
+    findPage,
+    toDocument,
+};
@@ -0,0 +1,137 @@
+// loadTest.js
+
+/**
+ * Load test for the data routes against the in-memory MongoDB stand-in (memoryDb.js).
+ *
+ *     node loadTest.js [--users 50] [--items 2000] [--requests 5000] [--concurrency 32]
+ *
+ * Seeds users with `--items` commands and devices each (in the old embedded
+ * layout, then migrated into the item collections), then replays a mix of
+ * revalidations (If-None-Match), delta fetches and adds with every user's token,
+ * once with the token cache and once without it. For each run it prints requests
+ * per second and, per request, the database reads, documents examined and bytes
+ * returned by the database.
+ */
+
+const express = require('express');
+const { MemoryDb } = require('./memoryDb');
+const { ensureIndexes } = require('./db');
+const { tokenCache } = require('./tokenCache');
+const { migrateUsers } = require('./migrate');
+const dataRoutes = require('./routes/dataRoutes');
+
+function parseArgs(argv) {
+    const args = { users: 50, items: 2000, requests: 5000, concurrency: 32 };
+    for (let i = 0; i < argv.length; i += 2) {
+        const key = argv[i].replace(/^--/, '');
+        if (!(key in args)) throw new Error(`Unknown option ${argv[i]}`);
+        args[key] = parseInt(argv[i + 1]);
+    }
+    return args;
+}
+
+async function seed(db, users, items) {
+    const tokens = [];
+    for (let u = 0; u < users; u++) {
+        const token = `load-token-${u}`;
+        await db.collection('users').insertOne({
+            username: `load${u}`,
+            password: 'x',
+            token,
+            commands: Array.from({ length: items }, (_, i) => ({
+                id: i + 1, command: `show interface ${i}`, description: `Command ${i} for load testing`,
+                last_used: '2025-01-01', rev: 1
+            })),
+            devices: Array.from({ length: items }, (_, i) => ({ id: String(i + 1), device: `router-${i}`, ip: `10.0.${i >> 8}.${i & 255}`, rev: 1 })),
+            revisions: { commands: 1, devices: 1 }
+        });
+        tokens.push(token);
+    }
+    await ensureIndexes(db);
+    await migrateUsers(db);
+    return tokens;
+}
+
+function listen(app) {
+    return new Promise(resolve => {
+        const server = app.listen(0, '127.0.0.1', () => resolve(server));
+    });
+}
+
+/**
+ * One request of the mix: mostly revalidations and delta fetches, like idle clients, plus some writes.
+ */
+async function request(base, token, i, etags) {
+    const headers = { 'x-access-token': token, 'Content-Type': 'application/json' };
+    const kind = i % 2 ? 'devices' : 'commands';
+    const roll = i % 20;
+    if (roll < 12) {
+        const etag = etags.get(`${token}|${kind}`);
+        const resp = await fetch(`${base}/${kind}`, { headers: etag ? { ...headers, 'If-None-Match': etag } : headers });
+        etags.set(`${token}|${kind}`, resp.headers.get('etag'));
+        await resp.arrayBuffer();
+        return resp.status;
+    }
+    if (roll < 19) {
+        const resp = await fetch(`${base}/${kind}?since=1`, { headers });
+        await resp.arrayBuffer();
+        return resp.status;
+    }
+    const body = kind === 'commands' ? { command: `uptime ${i}` } : { device: `switch-${i}`, ip: `10.9.${i >> 8 & 255}.${i & 255}` };
+    const resp = await fetch(`${base}/${kind}/add`, { method: 'POST', headers, body: JSON.stringify(body) });
+    await resp.arrayBuffer();
+    return resp.status;
+}
+
+async function run(args, useCache) {
+    const db = new MemoryDb();
+    const tokens = await seed(db, args.users, args.items);
+    db.resetStats();
+    tokenCache.clear();
+    tokenCache.ttlMs = useCache ? 30000 : 0;
+
+    const app = express();
+    app.use(express.json());
+    app.use((req, res, next) => { req.db = db; next(); });
+    app.use('/', dataRoutes);
+    const server = await listen(app);
+    const base = `http://127.0.0.1:${server.address().port}`;
+
+    const etags = new Map();
+    const statuses = {};
+    let next = 0;
+    const started = process.hrtime.bigint();
+    await Promise.all(Array.from({ length: args.concurrency }, async () => {
+        while (next < args.requests) {
+            const i = next++;
+            const status = await request(base, tokens[i % tokens.length], i, etags);
+            statuses[status] = (statuses[status] || 0) + 1;
+        }
+    }));
+    const seconds = Number(process.hrtime.bigint() - started) / 1e9;
+    server.close();
+
+    const { finds, updates, examined, bytesReturned } = db.stats();
+    const per = n => (n / args.requests).toFixed(2);
+    console.log(`${useCache ? 'token cache on ' : 'token cache off'}  ${(args.requests / seconds).toFixed(0).padStart(7)} req/s` +
+        `  finds/req ${per(finds)}  updates/req ${per(updates)}  examined/req ${per(examined)}` +
+        `  db KB/req ${(bytesReturned / 1024 / args.requests).toFixed(1)}  statuses ${JSON.stringify(statuses)}`);
+}
+
+async function main() {
+    const args = parseArgs(process.argv.slice(2));
+    console.log(`${args.users} users x ${args.items} commands/devices, ${args.requests} requests, concurrency ${args.concurrency}`);
+    const sample = new MemoryDb();
+    const started = process.hrtime.bigint();
+    await seed(sample, 1, args.items);
+    const ms = Number(process.hrtime.bigint() - started) / 1e6;
+    const userDoc = JSON.stringify(sample.collection('users').docs[0]).length;
+    console.log(`seed + migrate one user: ${ms.toFixed(0)} ms, user document afterwards: ${userDoc} bytes`);
+    await run(args, false);
+    await run(args, true);
+}
+
+main().catch(err => {
+    console.error(err);
+    process.exit(1);
+});
@@ -0,0 +1,502 @@
+// memoryDb.js
+
+/**
+ * In-memory stand-in for the parts of the MongoDB driver this API uses, for load
+ * tests and local experiments without a database server.
+ *
+ * Supports findOne / find (equality, $in, $nin, $ne, $gt/$gte/$lt/$lte, $exists and $or filters,
+ * dotted paths into arrays, inclusion or exclusion projections and $slice, sort and
+ * limit), insertOne / insertMany, updateOne / updateMany ($set with `$` / `$[name]`
+ * positional paths, $setOnInsert, $inc, $unset, $push with $each/$slice, $pull,
+ * upserts), replaceOne, deleteOne / deleteMany, findOneAndUpdate, bulkWrite,
+ * createIndex (compound and unique) and sessions whose transactions simply run
+ * the callback. Documents get ObjectId _ids, like the real server. Each collection counts the documents it examines and the bytes it
+ * returns, so a load test can show what a route costs the database.
+ */
+
+const { ObjectId } = require('mongodb');
+
+/**
+ * Deep copy of a stored value; ObjectIds are immutable and shared.
+ */
+function clone(value) {
+    if (value === null || typeof value !== 'object' || value instanceof ObjectId) return value;
+    if (value instanceof Date) return new Date(value);
+    if (Array.isArray(value)) return value.map(clone);
+    return Object.fromEntries(Object.entries(value).map(([key, v]) => [key, clone(v)]));
+}
+
+/**
+ * All values found at a dotted path, descending into arrays along the way.
+ */
+function valuesAt(value, parts) {
+    if (!parts.length) return [value];
+    if (Array.isArray(value)) return value.flatMap(el => valuesAt(el, parts));
+    if (value === null || typeof value !== 'object' || !(parts[0] in value)) return [undefined];
+    return valuesAt(value[parts[0]], parts.slice(1));
+}
+
+const sameValue = (a, b) => a === b || (a === undefined && b === null) || String(a) === String(b) && typeof a === typeof b;
+
+const OPERATORS = {
+    $in: (v, c) => c.some(x => sameValue(v, x)),
+    $ne: (v, c) => !sameValue(v, c),
+    $nin: (v, c) => !c.some(x => sameValue(v, x)),
+    $gt: (v, c) => v !== undefined && v !== null && v > c,
+    $gte: (v, c) => v !== undefined && v !== null && v >= c,
+    $lt: (v, c) => v !== undefined && v !== null && v < c,
+    $lte: (v, c) => v !== undefined && v !== null && v <= c,
+};
+
+const isOperator = cond => cond !== null && typeof cond === 'object' && !(cond instanceof ObjectId) &&
+    Object.keys(cond).some(k => k.startsWith('$'));
+
+function matches(doc, filter) {
+    return Object.entries(filter).every(([path, cond]) => {
+        if (path === '$or') return cond.some(branch => matches(doc, branch));
+        const values = valuesAt(doc, path.split('.'));
+        if (!isOperator(cond)) {
+            return values.some(v => sameValue(v, cond));
+        }
+        return Object.entries(cond).every(([op, arg]) => {
+            if (op === '$exists') return values.some(v => v !== undefined) === Boolean(arg);
+            return values.some(v => OPERATORS[op](v, arg));
+        });
+    });
+}
+
+function includePath(src, dst, parts) {
+    const [head, ...rest] = parts;
+    if (src === null || typeof src !== 'object' || !(head in src)) return;
+    const value = src[head];
+    if (!rest.length) {
+        dst[head] = clone(value);
+    } else if (Array.isArray(value)) {
+        const items = dst[head] || (dst[head] = value.map(() => ({})));
+        value.forEach((el, i) => includePath(el, items[i], rest));
+    } else if (value !== null && typeof value === 'object') {
+        includePath(value, dst[head] || (dst[head] = {}), rest);
+    }
+}
+
+function project(doc, projection) {
+    if (!projection || !Object.keys(projection).length) return clone(doc);
+    const specs = Object.entries(projection).filter(([path]) => path !== '_id');
+    if (specs.length && specs.every(([, spec]) => spec === 0)) {
+        const out = clone(doc);
+        specs.forEach(([path]) => { delete out[path]; });
+        if (projection._id === 0) delete out._id;
+        return out;
+    }
+    const out = projection._id === 0 ? {} : { _id: doc._id };
+    for (const [path, spec] of specs) {
+        if (spec !== null && typeof spec === 'object' && '$slice' in spec) {
+            const list = doc[path];
+            if (Array.isArray(list)) {
+                out[path] = clone(spec.$slice < 0 ? list.slice(spec.$slice) : list.slice(0, spec.$slice));
+            }
+        } else if (spec) {
+            includePath(doc, out, path.split('.'));
+        }
+    }
+    return out;
+}
+
+// Sort order of a field value: null and missing sort before everything else, as in MongoDB
+const missing = value => value === undefined || value === null;
+
+function compare(a, b, sort) {
+    for (const [field, direction] of Object.entries(sort)) {
+        const x = a[field], y = b[field];
+        if (missing(x) || missing(y)) {
+            if (missing(x) !== missing(y)) return missing(x) ? -direction : direction;
+            continue;
+        }
+        if (x < y) return -direction;
+        if (x > y) return direction;
+    }
+    return 0;
+}
+
+/**
+ * Resolves an update path to [container, key] pairs, expanding `$` (first array
+ * element matched by the query filter) and `$[name]` (elements matching arrayFilters).
+ */
+function targets(doc, parts, filter, arrayFilters, prefix = []) {
+    let node = doc;
+    for (let i = 0; i < parts.length - 1; i++) {
+        const part = parts[i];
+        if (part === '$' || part.startsWith('$[')) {
+            const path = prefix.concat(parts.slice(0, i)).join('.');
+            const rest = parts.slice(i + 1);
+            let picked;
+            if (part === '$') {
+                const conds = Object.entries(filter).filter(([p]) => p.startsWith(`${path}.`));
+                const index = node.findIndex(el => conds.every(([p, c]) => matches(el, { [p.slice(path.length + 1)]: c })));
+                picked = index < 0 ? [] : [node[index]];
+            } else {
+                const name = part.slice(2, -1);
+                const conds = arrayFilters.flatMap(f => Object.entries(f)).filter(([p]) => p.startsWith(`${name}.`));
+                picked = node.filter(el => conds.every(([p, c]) => matches(el, { [p.slice(name.length + 1)]: c })));
+            }
+            return picked.flatMap(el => targets(el, rest, {}, arrayFilters));
+        }
+        if (node[part] === undefined || node[part] === null) node[part] = {};
+        node = node[part];
+    }
+    return [[node, parts[parts.length - 1]]];
+}
+
+function applyUpdate(doc, filter, update, arrayFilters) {
+    const each = (op, fn) => Object.entries(update[op] || {}).forEach(([path, value]) => {
+        targets(doc, path.split('.'), filter, arrayFilters).forEach(([node, key]) => fn(node, key, value));
+    });
+    each('$set', (node, key, value) => { node[key] = clone(value); });
+    each('$inc', (node, key, value) => { node[key] = (node[key] || 0) + value; });
+    each('$unset', (node, key) => { delete node[key]; });
+    each('$pull', (node, key, cond) => {
+        if (Array.isArray(node[key])) node[key] = node[key].filter(el => !matches(el, cond));
+    });
+    each('$push', (node, key, spec) => {
+        const many = spec !== null && typeof spec === 'object' && '$each' in spec;
+        const list = (node[key] || (node[key] = []));
+        list.push(...clone(many ? spec.$each : [spec]));
+        if (many && spec.$slice !== undefined) {
+            node[key] = spec.$slice < 0 ? list.slice(spec.$slice) : list.slice(0, spec.$slice);
+        }
+    });
+}
+
+/**
+ * The equality fields of a filter, as the seed of an upserted document.
+ */
+const upsertSeed = filter => Object.fromEntries(Object.entries(filter).filter(([path, cond]) => !path.includes('.') && !isOperator(cond)));
+
+class DuplicateKeyError extends Error {
+    constructor(index) {
+        super(`E11000 duplicate key error index: ${index}`);
+        this.code = 11000;
+    }
+}
+
+class MemoryCursor {
+    constructor(collection, filter, projection) {
+        this.collection = collection;
+        this.filter = filter;
+        this.projection = projection;
+        this.sortSpec = null;
+        this.limitCount = 0;
+    }
+
+    sort(spec) {
+        this.sortSpec = spec;
+        return this;
+    }
+
+    limit(count) {
+        this.limitCount = count;
+        return this;
+    }
+
+    async toArray() {
+        const { collection } = this;
+        collection.stats.finds++;
+        let docs = collection.scan(this.filter);
+        if (this.sortSpec) {
+            const sort = this.sortSpec;
+            docs = docs.slice().sort((a, b) => compare(a, b, sort));
+        }
+        if (this.limitCount) docs = docs.slice(0, this.limitCount);
+        const out = docs.map(doc => project(doc, this.projection));
+        collection.stats.bytesReturned += out.reduce((sum, doc) => sum + JSON.stringify(doc).length, 0);
+        return out;
+    }
+}
+
+// Bucket key of indexed values (null and missing fields share one)
+const keyOf = values => values.map(v => (v === undefined || v === null ? 'null' : `${typeof v}:${String(v)}`)).join('|');
+
+class MemoryCollection {
+    constructor() {
+        this.docs = [];
+        this.indexes = [{ name: '_id_', keys: ['_id'], unique: true }];
+        this.buckets = new Map([['_id', new Map()]]); // 'field,field' (an index's leading field, or all its fields) -> value key -> documents
+        this.resetStats();
+    }
+
+    bucket(doc) {
+        this.buckets.forEach((byValue, fields) => {
+            const key = keyOf(fields.split(',').map(f => doc[f]));
+            if (!byValue.has(key)) byValue.set(key, new Set());
+            byValue.get(key).add(doc);
+        });
+    }
+
+    unbucket(doc) {
+        this.buckets.forEach((byValue, fields) => byValue.get(keyOf(fields.split(',').map(f => doc[f])))?.delete(doc));
+    }
+
+    add(doc) {
+        this.docs.push(doc);
+        this.bucket(doc);
+    }
+
+    drop(doc) {
+        this.docs.splice(this.docs.indexOf(doc), 1);
+        this.unbucket(doc);
+    }
+
+    /**
+     * Runs `change` on a stored document, keeping its buckets current.
+     */
+    modify(doc, change) {
+        this.unbucket(doc);
+        try {
+            change();
+        } finally {
+            this.bucket(doc);
+        }
+    }
+
+    resetStats() {
+        this.stats = { finds: 0, updates: 0, examined: 0, bytesReturned: 0 };
+    }
+
+    async createIndex(spec, options = {}) {
+        const keys = Object.keys(spec);
+        const name = options.name || keys.map(key => `${key}_${spec[key]}`).join('_');
+        if (!this.indexes.some(index => index.name === name)) {
+            this.indexes.push({ name, keys, unique: Boolean(options.unique) });
+            [keys[0], keys.join(',')].forEach(fields => {
+                if (!this.buckets.has(fields)) this.buckets.set(fields, new Map());
+            });
+            this.docs.forEach(doc => { this.unbucket(doc); this.bucket(doc); });
+        }
+        return name;
+    }
+
+    /**
+     * Documents matching a filter, counting as examined only those an index on the
+     * filter's leading fields would have visited (every document when none applies).
+     */
+    scan(filter) {
+        let prefix = {};
+        for (const { keys } of this.indexes) {
+            const used = {};
+            for (const key of keys) {
+                if (!(key in filter)) break;
+                used[key] = filter[key];
+                if (isOperator(filter[key])) break; // A range ends the usable prefix
+            }
+            if (Object.keys(used).length > Object.keys(prefix).length) prefix = used;
+        }
+        const fields = Object.keys(prefix);
+        const exact = fields.filter(field => !isOperator(prefix[field]));
+        let candidates = this.docs;
+        if (exact.length) {
+            const key = this.buckets.has(exact.join(',')) ? exact : exact.slice(0, 1);
+            const pool = this.buckets.get(key.join(',')).get(keyOf(key.map(f => prefix[f])));
+            candidates = [...(pool || [])].filter(doc => matches(doc, prefix));
+        }
+        this.stats.examined += candidates.length;
+        return candidates.filter(doc => matches(doc, filter));
+    }
+
+    find(filter = {}, options = {}) {
+        return new MemoryCursor(this, filter, options.projection);
+    }
+
+    first(filter) {
+        return this.scan(filter)[0] || null;
+    }
+
+    checkUnique(doc, except) {
+        for (const index of this.indexes) {
+            if (!index.unique) continue;
+            const key = Object.fromEntries(index.keys.map(k => [k, doc[k]]));
+            const pool = this.buckets.get(index.keys.join(',')).get(keyOf(index.keys.map(k => doc[k]))) || [];
+            if ([...pool].some(other => other !== except && other !== doc && index.keys.every(k => sameValue(other[k], key[k])))) {
+                throw new DuplicateKeyError(index.name);
+            }
+        }
+    }
+
+    async findOne(filter, options = {}) {
+        this.stats.finds++;
+        const doc = this.first(filter);
+        if (!doc) return null;
+        const out = project(doc, options.projection);
+        this.stats.bytesReturned += JSON.stringify(out).length;
+        return out;
+    }
+
+    async insertOne(doc) {
+        const copy = clone(doc);
+        if (copy._id === undefined) copy._id = new ObjectId();
+        this.checkUnique(copy);
+        this.add(copy);
+        doc._id = copy._id;
+        return { acknowledged: true, insertedId: copy._id };
+    }
+
+    async insertMany(docs) {
+        for (const doc of docs) await this.insertOne(doc);
+        return { acknowledged: true, insertedCount: docs.length };
+    }
+
+    upsert(filter, update) {
+        const doc = { ...upsertSeed(filter), _id: new ObjectId() };
+        applyUpdate(doc, filter, { ...update, $set: { ...update.$setOnInsert, ...update.$set } }, []);
+        this.checkUnique(doc);
+        this.add(doc);
+        return doc;
+    }
+
+    async updateOne(filter, update, options = {}) {
+        this.stats.updates++;
+        const doc = this.first(filter);
+        if (!doc) {
+            if (!options.upsert) return { matchedCount: 0, modifiedCount: 0, upsertedCount: 0 };
+            const created = this.upsert(filter, update);
+            return { matchedCount: 0, modifiedCount: 0, upsertedCount: 1, upsertedId: created._id };
+        }
+        const before = clone(doc);
+        this.modify(doc, () => {
+            applyUpdate(doc, filter, update, options.arrayFilters || []);
+            try {
+                this.checkUnique(doc);
+            } catch (err) {
+                Object.keys(doc).forEach(key => { delete doc[key]; });
+                Object.assign(doc, before);
+                throw err;
+            }
+        });
+        return { matchedCount: 1, modifiedCount: 1, upsertedCount: 0 };
+    }
+
+    async updateMany(filter, update, options = {}) {
+        this.stats.updates++;
+        const docs = this.scan(filter);
+        docs.forEach(doc => this.modify(doc, () => applyUpdate(doc, filter, update, options.arrayFilters || [])));
+        return { matchedCount: docs.length, modifiedCount: docs.length };
+    }
+
+    async replaceOne(filter, replacement, options = {}) {
+        this.stats.updates++;
+        const doc = this.first(filter);
+        if (!doc) {
+            if (!options.upsert) return { matchedCount: 0, modifiedCount: 0, upsertedCount: 0 };
+            const created = { ...clone(replacement), _id: new ObjectId() };
+            this.checkUnique(created);
+            this.add(created);
+            return { matchedCount: 0, modifiedCount: 0, upsertedCount: 1, upsertedId: created._id };
+        }
+        const replaced = { ...clone(replacement), _id: doc._id };
+        this.checkUnique(replaced, doc);
+        this.drop(doc);
+        this.add(replaced);
+        return { matchedCount: 1, modifiedCount: 1, upsertedCount: 0 };
+    }
+
+    async deleteOne(filter) {
+        this.stats.updates++;
+        const doc = this.first(filter);
+        if (!doc) return { deletedCount: 0 };
+        this.drop(doc);
+        return { deletedCount: 1 };
+    }
+
+    async deleteMany(filter) {
+        this.stats.updates++;
+        const doomed = new Set(this.scan(filter));
+        this.docs = this.docs.filter(doc => !doomed.has(doc));
+        doomed.forEach(doc => this.unbucket(doc));
+        return { deletedCount: doomed.size };
+    }
+
+    async findOneAndUpdate(filter, update, options = {}) {
+        this.stats.updates++;
+        let doc = this.first(filter);
+        if (!doc) {
+            if (!options.upsert) return null;
+            doc = this.upsert(filter, update);
+            if (options.returnDocument !== 'after') return null;
+        } else {
+            const before = project(doc, options.projection);
+            this.modify(doc, () => applyUpdate(doc, filter, update, options.arrayFilters || []));
+            if (options.returnDocument !== 'after') return before;
+        }
+        const out = project(doc, options.projection);
+        this.stats.bytesReturned += JSON.stringify(out).length;
+        return out;
+    }
+
+    async bulkWrite(operations) {
+        const result = { insertedCount: 0, matchedCount: 0, modifiedCount: 0, deletedCount: 0, upsertedCount: 0 };
+        for (const op of operations) {
+            const [type, args] = Object.entries(op)[0];
+            let r;
+            if (type === 'insertOne') {
+                await this.insertOne(args.document);
+                result.insertedCount++;
+                continue;
+            } else if (type === 'updateOne') {
+                r = await this.updateOne(args.filter, args.update, args);
+            } else if (type === 'replaceOne') {
+                r = await this.replaceOne(args.filter, args.replacement, args);
+            } else if (type === 'deleteOne') {
+                r = await this.deleteOne(args.filter);
+            } else {
+                throw new Error(`Unsupported bulkWrite operation ${type}`);
+            }
+            result.matchedCount += r.matchedCount || 0;
+            result.modifiedCount += r.modifiedCount || 0;
+            result.deletedCount += r.deletedCount || 0;
+            result.upsertedCount += r.upsertedCount || 0;
+        }
+        return result;
+    }
+}
+
+/**
+ * Session whose transactions run the callback directly: the stand-in is a single
+ * process and never rolls back, which is enough for load tests.
+ */
+class MemorySession {
+    async withTransaction(fn) {
+        return fn(this);
+    }
+
+    async endSession() {}
+}
+
+class MemoryDb {
+    constructor() {
+        this.collections = new Map();
+        this.client = { startSession: () => new MemorySession() };
+    }
+
+    collection(name) {
+        if (!this.collections.has(name)) this.collections.set(name, new MemoryCollection());
+        return this.collections.get(name);
+    }
+
+    /**
+     * Sum of every collection's counters.
+     */
+    stats() {
+        const total = { finds: 0, updates: 0, examined: 0, bytesReturned: 0 };
+        this.collections.forEach(collection => {
+            Object.keys(total).forEach(key => { total[key] += collection.stats[key]; });
+        });
+        return total;
+    }
+
+    resetStats() {
+        this.collections.forEach(collection => collection.resetStats());
+    }
+}
+
+module.exports = {
+    MemoryDb,
+};
@@ -0,0 +1,123 @@
+// migrate.js
+
+/**
+ * Moves commands and devices from the arrays embedded in user documents into the
+ * `commands` and `devices` collections (see items.js).
+ *
+ *     node migrate.js
+ *
+ * Safe to re-run and to run while the server is up: users already migrated are
+ * skipped, and checkToken migrates any remaining user on first use. Items whose id
+ * repeats an earlier one in the same list (possible when two adds raced under
+ * the old storage) get fresh ids instead of overwriting it.
+ */
+
+const { KINDS, formatId, toDocument } = require('./items');
+const { tokenCache } = require('./tokenCache');
+
+// Storage layout version kept on each user document; 2 = items in their own collections
+const STORAGE_VERSION = 2;
+// Attempts when the user's lists change while being copied
+const MIGRATE_ATTEMPTS = 5;
+
+const isMigrated = user => (user?.storage || 1) >= STORAGE_VERSION;
+
+/**
+ * Copies one list into its collection and returns the highest id it now holds.
+ */
+async function copyItems(db, userId, kind, items) {
+    const taken = new Set();
+    const ids = [];
+    let maxId = items.reduce((max, item) => Math.max(max, parseInt(item.id) || 0), 0);
+    const operations = items.map(item => {
+        let id = item.id;
+        if (id === undefined || id === null || taken.has(String(id))) {
+            id = formatId(kind, ++maxId);
+        }
+        taken.add(String(id));
+        ids.push(id);
+        return {
+            replaceOne: {
+                filter: { owner: userId, id },
+                replacement: toDocument(userId, { ...item, id }),
+                upsert: true
+            }
+        };
+    });
+    if (operations.length) {
+        await db.collection(kind).bulkWrite(operations, { ordered: true });
+    }
+    // Drop copies left by an earlier attempt of items removed since
+    await db.collection(kind).deleteMany({ owner: userId, id: { $nin: ids } });
+    return maxId;
+}
+
+/**
+ * Migrates one user's embedded lists. Returns true if the user needed migrating.
+ * @param {Object} db Connected database.
+ * @param {Object} userId The user's _id.
+ */
+async function migrateUser(db, userId) {
+    const users = db.collection('users');
+
+    for (let attempt = 0; attempt < MIGRATE_ATTEMPTS; attempt++) {
+        const doc = await users.findOne({ _id: userId }, { projection: { storage: 1, revisions: 1, nextIds: 1, commands: 1, devices: 1 } });
+        if (!doc || isMigrated(doc)) {
+            return false;
+        }
+
+        const nextIds = {};
+        for (const kind of KINDS) {
+            const maxId = await copyItems(db, userId, kind, doc[kind] || []);
+            nextIds[`nextIds.${kind}`] = Math.max(doc.nextIds?.[kind] || 0, maxId);
+        }
+
+        // Only drop the arrays if nothing changed them while they were copied
+        const unchanged = Object.fromEntries(KINDS.map(kind => [`revisions.${kind}`, doc.revisions?.[kind] ?? null]));
+        const result = await users.updateOne(
+            { _id: userId, storage: doc.storage ?? null, ...unchanged },
+            { $set: { storage: STORAGE_VERSION, ...nextIds }, $unset: Object.fromEntries(KINDS.map(kind => [kind, ''])) }
+        );
+        if (result.matchedCount > 0) {
+            tokenCache.invalidateUser(userId);
+            return true;
+        }
+    }
+    throw new Error(`User ${userId} kept changing during migration`);
+}
+
+/**
+ * Migrates every user still on the embedded layout.
+ * @returns {Promise<number>} Users migrated.
+ */
+async function migrateUsers(db) {
+    const pending = await db.collection('users')
+        .find({ storage: { $exists: false } }, { projection: { _id: 1 } })
+        .toArray();
+    let migrated = 0;
+    for (const { _id } of pending) {
+        if (await migrateUser(db, _id)) migrated++;
+    }
+    return migrated;
+}
+
+module.exports = {
+    STORAGE_VERSION,
+    isMigrated,
+    migrateUser,
+    migrateUsers,
+};
+
+if (require.main === module) {
+    const { connectToMongo } = require('./db');
+    connectToMongo()
+        .then(async db => {
+            const migrated = await migrateUsers(db);
+            console.log(`Migrated ${migrated} users`);
+            process.exit(0);
+        })
+        .catch(err => {
+            console.error('Migration failed:', err);
+            process.exit(1);
+        });
+}
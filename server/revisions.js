@@ -0,0 +1,132 @@
+// revisions.js
+
+const { tokenCache } = require('./tokenCache');
+const { changeFeed } = require('./changeFeed');
+const { findItems } = require('./items');
+
+/**
+ * Per-user revision counters for the commands and devices lists.
+ *
+ * Every mutation bumps `revisions.<kind>` on the user document and stamps the
+ * touched items with that revision (`rev`). Removals leave a tombstone so a
+ * client can ask for "everything since revision N" and learn about deletes too.
+ * Items live in their own collections (see items.js), so the counter bump and the
+ * item writes share one transaction.
+ */
+
+// Tombstones kept per list; clients older than the oldest one get a full list
+const TOMBSTONE_LIMIT = 1000;
+
+const currentRevision = (user, kind) => user?.revisions?.[kind] || 0;
+
+/**
+ * Weak ETag for a user's list at a given revision.
+ */
+const etagFor = (kind, rev) => `W/"${kind}-${rev}"`;
+
+// Thrown inside a transaction to roll it back when the change matched nothing
+class NoMatch extends Error {}
+
+/**
+ * Atomically applies a mutation to a user's commands/devices and bumps its revision.
+ *
+ * The revision bump (and id allocation) on the user document and the item writes
+ * run in one transaction, so readers never see items stamped with a revision the
+ * counter has not reached. Concurrent mutations of the same list conflict on the
+ * counter and are retried by the driver.
+ *
+ * @param {Object} db Connected database.
+ * @param {Object} userId The user's _id.
+ * @param {string} kind 'commands' or 'devices'.
+ * @param {Function} write async ({ rev, firstId, session }) => boolean; performs the item writes at
+ *     revision `rev` (passing `session` to each) and returns false when the target item does not exist.
+ * @param {number} [allocate=0] New item ids to reserve; they run from `firstId` upward.
+ * @returns {Promise<{rev: number, matched: boolean}>} The new revision, and whether `write` found its target.
+ */
+async function commitChange(db, userId, kind, write, allocate = 0) {
+    const users = db.collection('users');
+    const session = db.client.startSession();
+    let outcome;
+
+    try {
+        await session.withTransaction(async () => {
+            const inc = { [`revisions.${kind}`]: 1 };
+            if (allocate) inc[`nextIds.${kind}`] = allocate;
+            const doc = await users.findOneAndUpdate(
+                { _id: userId },
+                { $inc: inc },
+                { session, returnDocument: 'after', projection: { revisions: 1, nextIds: 1 } }
+            );
+            const rev = currentRevision(doc, kind);
+            const firstId = (doc?.nextIds?.[kind] || 0) - allocate + 1;
+            if (await write({ rev, firstId, session }) === false) {
+                throw new NoMatch();
+            }
+            outcome = { rev, matched: true };
+        });
+    } catch (err) {
+        if (!(err instanceof NoMatch)) throw err;
+        const doc = await users.findOne({ _id: userId }, { projection: { revisions: 1 } });
+        outcome = { rev: currentRevision(doc, kind), matched: false };
+    } finally {
+        await session.endSession();
+    }
+
+    if (outcome.matched) {
+        // Cached token lookups carry the old revision; open /events streams send the change
+        tokenCache.invalidateUser(userId);
+        changeFeed.publish(userId, kind, outcome.rev);
+    }
+    return outcome;
+}
+
+/**
+ * Records removed item ids as tombstones at revision `rev`, inside commitChange's transaction.
+ */
+const pushTombstones = (db, userId, kind, ids, rev, session) => db.collection('users').updateOne(
+    { _id: userId },
+    { $push: { [`tombstones.${kind}`]: { $each: ids.map(id => ({ id, rev })), $slice: -TOMBSTONE_LIMIT } } },
+    { session }
+);
+
+/**
+ * Builds the GET response for a user's list, honoring If-None-Match and `?since=<rev>`.
+ * `user` carries the revisions and tombstones, read before the items so the items
+ * are at least as new as the revision reported. Returns a null body when the
+ * client's copy is current (caller should answer 304).
+ */
+async function listResponse(db, user, kind, ifNoneMatch, since) {
+    const rev = currentRevision(user, kind);
+    const etag = etagFor(kind, rev);
+    if (ifNoneMatch === etag) {
+        return { etag, body: null };
+    }
+
+    const tombstones = user.tombstones?.[kind] || [];
+    // Once tombstones have been trimmed, deltas older than the oldest one are incomplete
+    const floor = tombstones.length >= TOMBSTONE_LIMIT ? tombstones[0].rev : 0;
+    const sinceRev = parseInt(since);
+
+    if (!isNaN(sinceRev) && sinceRev >= floor && sinceRev <= rev) {
+        return {
+            etag,
+            body: {
+                success: true,
+                revision: rev,
+                delta: true,
+                [kind]: await findItems(db, user._id, kind, { rev: { $gt: sinceRev } }),
+                removed: tombstones.filter(t => t.rev > sinceRev).map(t => t.id)
+            }
+        };
+    }
+    return { etag, body: { success: true, revision: rev, [kind]: await findItems(db, user._id, kind) } };
+}
+
+module.exports = {
+    TOMBSTONE_LIMIT,
+    currentRevision,
+    etagFor,
+    commitChange,
+    pushTombstones,
+    listResponse,
+};
@@ -0,0 +1,100 @@
+// routeTest.js
+
+/**
+ * Route tests for the data routes against the in-memory MongoDB stand-in (memoryDb.js).
+ *
+ *     node --test routeTest.js      (or: npm test)
+ */
+
+const test = require('node:test');
+const assert = require('node:assert');
+const express = require('express');
+const { MemoryDb } = require('./memoryDb');
+const { ensureIndexes } = require('./db');
+const { tokenCache } = require('./tokenCache');
+const dataRoutes = require('./routes/dataRoutes');
+
+const TOKEN = 'route-test-token';
+
+/**
+ * Starts the data routes on a free port for one user with two commands and one device.
+ * @returns {Promise<{db: MemoryDb, call: Function, close: Function}>}
+ */
+async function startServer() {
+    const db = new MemoryDb();
+    await db.collection('users').insertOne({
+        username: 'routes',
+        password: 'x',
+        token: TOKEN,
+        commands: [
+            { id: 1, command: 'ls', description: 'list', last_used: '2025-01-01', rev: 1 },
+            { id: 2, command: 'pwd', description: '', last_used: '2025-01-01', rev: 1 }
+        ],
+        devices: [{ id: '1', device: 'router-1', ip: '10.0.0.1', rev: 1 }],
+        revisions: { commands: 1, devices: 1 }
+    });
+    await ensureIndexes(db);
+    tokenCache.clear();
+
+    const app = express();
+    app.use(express.json());
+    app.use((req, res, next) => { req.db = db; next(); });
+    app.use('/', dataRoutes);
+    const server = await new Promise(resolve => {
+        const s = app.listen(0, '127.0.0.1', () => resolve(s));
+    });
+    const base = `http://127.0.0.1:${server.address().port}`;
+
+    const call = async (method, path, body) => {
+        const resp = await fetch(base + path, {
+            method,
+            headers: { 'x-access-token': TOKEN, 'Content-Type': 'application/json' },
+            body: body && JSON.stringify(body)
+        });
+        return { status: resp.status, body: await resp.json() };
+    };
+    return { db, call, close: () => server.close() };
+}
+
+test('bulk update rejects values the single-item routes would not store', async () => {
+    const { call, close } = await startServer();
+    try {
+        const { status, body } = await call('PUT', '/commands/bulk-update', { updates: [
+            { id: 1, command: '' },
+            { id: 2, command: null, description: 'kept out' },
+            { id: 2, last_used: 5 },
+            { id: 1, description: 'changed' },
+            { id: 9, description: 'gone' }
+        ] });
+        assert.strictEqual(status, 200);
+        assert.strictEqual(body.updated, 1);
+        assert.deepStrictEqual(body.missing, [9]);
+        assert.deepStrictEqual(body.invalid, [
+            { id: 1, field: 'command' }, { id: 2, field: 'command' }, { id: 2, field: 'last_used' }
+        ]);
+
+        const { body: list } = await call('GET', '/commands');
+        const byId = Object.fromEntries(list.commands.map(c => [c.id, c]));
+        assert.deepStrictEqual([byId[1].command, byId[1].description], ['ls', 'changed']);
+        assert.deepStrictEqual([byId[2].command, byId[2].description, byId[2].last_used], ['pwd', '', '2025-01-01']);
+    } finally {
+        close();
+    }
+});
+
+test('bulk update of devices requires a non-empty name and ip', async () => {
+    const { call, close } = await startServer();
+    try {
+        const { body } = await call('PUT', '/devices/bulk-update', { updates: [
+            { id: '1', ip: '' },
+            { id: '1', device: { name: 'x' } }
+        ] });
+        assert.strictEqual(body.updated, 0);
+        assert.deepStrictEqual(body.invalid, [{ id: '1', field: 'ip' }, { id: '1', field: 'device' }]);
+
+        const { body: list } = await call('GET', '/devices');
+        assert.deepStrictEqual([list.devices[0].device, list.devices[0].ip], ['router-1', '10.0.0.1']);
+    } finally {
+        close();
+    }
+});
@@ -1,6 +1,8 @@
 const express = require('express');
 const router = express.Router();
 const { v4: uuidv4 } = require('uuid');
+const { PAGE_LIMIT, findItems, findPage } = require('../items');
+const { STORAGE_VERSION, isMigrated, migrateUser } = require('../migrate');
 import bcrypt from 'bcrypt';
 
 /**
@@ -22,7 +24,7 @@ router.get('/users', async (req, res) => {
         // NOTE: In a production application, sensitive data like passwords should never be returned, 
         // and this endpoint should be heavily restricted.
         const users = await db.collection('users').find({}).project({ password: 0 }).toArray();
-        res.json(users);
+        res.json(users.map(user => ({ ...user, _id: String(user._id) }))); // Plain ids, for MessagePack too
     } catch (err) {
         console.error('Fetch Users Error:', err);
         res.status(500).json({ error: 'Failed to fetch users' });
@@ -32,6 +34,8 @@ router.get('/users', async (req, res) => {
 /**
  * POST /login
  * Authenticates the user and returns their token and initial data (commands, devices).
+ * With `pageSize` in the body only the first page of each list is returned, plus
+ * `cursors` to fetch the rest from GET /commands and /devices (`?limit=&after=`).
  */
 router.post('/login', async (req, res) => {
     const username = req.body.username?.trim();
@@ -50,13 +54,23 @@ router.post('/login', async (req, res) => {
         });
 
         if (user) {
+            if (!isMigrated(user)) {
+                await migrateUser(db, user._id);
+            }
+            // Read after the revisions, so the lists are at least as new as them
+            const pageSize = parseInt(req.body.pageSize);
+            const paged = pageSize >= 1 && pageSize <= PAGE_LIMIT;
+            const load = kind => (paged ? findPage(db, user._id, kind, { limit: pageSize }) : findItems(db, user._id, kind));
+            const [commands, devices] = await Promise.all([load('commands'), load('devices')]);
             // Success: Return necessary user data
             res.json({
                 success: true,
                 username: user.username,
                 token: user.token,
-                commands: user.commands || [], // Ensure commands array exists
-                devices: user.devices || []     // Ensure devices array exists
+                commands: paged ? commands.items : commands,
+                devices: paged ? devices.items : devices,
+                revisions: user.revisions || {}, // Lets the client ask for deltas from here on
+                ...(paged && { cursors: { commands: commands.next, devices: devices.next } })
             });
         } else {
             // Failure: Invalid credentials
@@ -102,8 +116,7 @@ router.post('/signup', async (req, res) => {
             username: username,
             password: hashedPassword, // password now hashed securely
             token: generateToken(),
-            commands: [],
-            devices: [],
+            storage: STORAGE_VERSION, // Commands and devices live in their own collections
             createdAt: new Date()
         };
 
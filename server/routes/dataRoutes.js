@@ -1,9 +1,19 @@
 
 const express = require('express');
 const router = express.Router();
+const { currentRevision, etagFor, commitChange, pushTombstones, listResponse } = require('../revisions');
+const { tokenCache } = require('../tokenCache');
+const { changeFeed } = require('../changeFeed');
+const { KINDS, PAGE_LIMIT, PAGE_SORTS, formatId, decodeCursor, findPage, toDocument } = require('../items');
+const { STORAGE_VERSION, isMigrated, migrateUser } = require('../migrate');
+
+// The only user fields checkToken loads; routes fetch the list fields they need themselves
+const TOKEN_PROJECTION = { _id: 1, username: 1, revisions: 1, storage: 1 };
 
 /**
- * Middleware to check for a valid token and attach the user object to the request.
+ * Middleware to check for a valid token and attach the user ({ _id, username, revisions }) to the request.
+ * Resolved tokens are cached (see tokenCache.js); a miss is one indexed, projected lookup.
+ * Users still on the embedded-array layout are migrated first (see migrate.js).
  * * FIX: Added optional chaining (?. ) to req.body and req.query to prevent the
  * "Cannot read properties of undefined (reading 'token')" TypeError.
  */
@@ -16,11 +26,19 @@ const checkToken = async (req, res, next) => {
     }
 
     try {
-        const user = await req.db.collection('users').findOne({ token });
+        let user = tokenCache.get(token);
         if (!user) {
-            return res.status(404).json({ success: false, message: 'Invalid token or user not found' });
+            user = await req.db.collection('users').findOne({ token }, { projection: TOKEN_PROJECTION });
+            if (!user) {
+                return res.status(404).json({ success: false, message: 'Invalid token or user not found' });
+            }
+            if (!isMigrated(user)) {
+                await migrateUser(req.db, user._id);
+                user.storage = STORAGE_VERSION;
+            }
+            tokenCache.set(token, user);
         }
-        req.user = user; // Attach user object to request
+        req.user = user; // Attach the lean user object to request
         next();
     } catch (err) {
         console.error('Token validation error:', err);
@@ -31,6 +49,147 @@ const checkToken = async (req, res, next) => {
 // Apply token check to all routes in this file
 router.use(checkToken);
 
+/**
+ * Loads only the given fields of the authenticated user's document.
+ */
+const loadUser = (req, projection) => req.db.collection('users').findOne({ _id: req.user._id }, { projection });
+
+/**
+ * Sends one page of a user's commands/devices: `?limit=<n>[&sort=created|last_used][&after=<cursor>]`.
+ * The body carries the list's revision (read before the page, so a later `?since=`
+ * delta covers anything that changes while the client walks the pages) and `next`,
+ * the cursor of the following page (null on the last one).
+ */
+const sendPage = async (req, res, kind) => {
+    const limit = parseInt(req.query.limit);
+    const order = req.query.sort || 'created';
+    const after = req.query.after;
+
+    if (!(limit >= 1 && limit <= PAGE_LIMIT)) {
+        return res.status(400).json({ success: false, message: `limit must be between 1 and ${PAGE_LIMIT}` });
+    }
+    if (!PAGE_SORTS[order]?.kinds.includes(kind)) {
+        return res.status(400).json({ success: false, message: `Unsupported sort for ${kind}: ${order}` });
+    }
+    if (after && !decodeCursor(PAGE_SORTS[order].sort, after)) {
+        return res.status(400).json({ success: false, message: 'Invalid cursor' });
+    }
+
+    try {
+        const doc = await loadUser(req, { revisions: 1 });
+        const { items, next } = await findPage(req.db, req.user._id, kind, { order, after, limit });
+        res.json({ success: true, revision: currentRevision(doc, kind), [kind]: items, next });
+    } catch (err) {
+        console.error(`Page ${kind} Error:`, err);
+        res.status(500).json({ success: false, message: `Server error while loading ${kind}` });
+    }
+};
+
+/**
+ * Sends a user's commands/devices list, or only the changes since `?since=<revision>`.
+ * Answers 304 when If-None-Match carries the current ETag, straight from the
+ * revision checkToken resolved, without reading the list. With `?limit=` it sends
+ * one page instead (see sendPage).
+ */
+const sendList = async (req, res, kind) => {
+    if (req.query?.limit !== undefined) {
+        return sendPage(req, res, kind);
+    }
+    const ifNoneMatch = req.headers['if-none-match'];
+    if (ifNoneMatch && ifNoneMatch === etagFor(kind, currentRevision(req.user, kind))) {
+        res.set('ETag', ifNoneMatch);
+        return res.status(304).end();
+    }
+
+    let response;
+    try {
+        const doc = await loadUser(req, { revisions: 1, [`tombstones.${kind}`]: 1 });
+        response = await listResponse(req.db, doc || { _id: req.user._id }, kind, ifNoneMatch, req.query?.since);
+    } catch (err) {
+        console.error(`List ${kind} Error:`, err);
+        return res.status(500).json({ success: false, message: `Server error while loading ${kind}` });
+    }
+    const { etag, body } = response;
+    res.set('ETag', etag);
+    if (!body) {
+        return res.status(304).end();
+    }
+    res.json(body);
+};
+
+// Largest batch accepted by the bulk-update routes
+const BULK_UPDATE_LIMIT = 500;
+
+// Field validators for the bulk-update routes, matching what add/update accept
+const requiredText = value => typeof value === 'string' && value.trim() !== '';
+const text = value => typeof value === 'string';
+
+/**
+ * Builds a handler that applies many field updates to a user's commands/devices in
+ * one transaction (one revision bump), for clients that queue and coalesce edits.
+ * Body: { updates: [{ id, <field>: value, ... }] }. Ids that no longer exist are
+ * reported under `missing`, and updates with a value their field does not accept
+ * under `invalid` ({ id, field }); neither fails the batch or is written.
+ *
+ * @param {string} kind 'commands' or 'devices'.
+ * @param {Object<string, Function>} fields Fields a client may change, each with its validator.
+ * @param {Function} parseId Normalizes a client-supplied id to its stored type.
+ */
+const bulkUpdate = (kind, fields, parseId) => async (req, res) => {
+    const { updates } = req.body;
+    const db = req.db;
+    const user = req.user;
+
+    if (!Array.isArray(updates) || !updates.length || updates.length > BULK_UPDATE_LIMIT) {
+        return res.status(400).json({ success: false, message: `Between 1 and ${BULK_UPDATE_LIMIT} updates are required` });
+    }
+
+    try {
+        const ids = updates.map(update => parseId(update?.id)).filter(id => id !== null);
+        const found = await db.collection(kind)
+            .find({ owner: user._id, id: { $in: ids } }, { projection: { _id: 0, id: 1 } })
+            .toArray();
+        const existing = new Set(found.map(item => String(item.id)));
+        const missing = [];
+        const invalid = [];
+
+        // Several updates to one item are merged (later values win): one write per item
+        const merged = new Map();
+        updates.forEach(update => {
+            const id = parseId(update?.id);
+            if (id === null || !existing.has(String(id))) {
+                missing.push(update?.id ?? null);
+                return;
+            }
+            const given = Object.keys(fields).filter(field => update[field] !== undefined);
+            const bad = given.find(field => !fields[field](update[field]));
+            if (bad) {
+                invalid.push({ id: update.id, field: bad });
+                return;
+            }
+            const values = merged.get(id) || {};
+            given.forEach(field => { values[field] = update[field]; });
+            merged.set(id, values);
+        });
+
+        const changes = [...merged].filter(([, values]) => Object.keys(values).length);
+        if (!changes.length) {
+            return res.json({ success: true, message: '0 items updated', updated: 0, missing, invalid, revision: user.revisions?.[kind] || 0 });
+        }
+
+        const { rev } = await commitChange(db, user._id, kind, async ({ rev, session }) => {
+            await db.collection(kind).bulkWrite(changes.map(([id, values]) => ({
+                updateOne: { filter: { owner: user._id, id }, update: { $set: { ...values, rev } } }
+            })), { session });
+        });
+
+        res.json({ success: true, message: `${changes.length} items updated`, updated: changes.length, missing, invalid, revision: rev });
+    } catch (err) {
+        console.error(`Bulk ${kind} Update Error:`, err);
+        res.status(500).json({ success: false, message: `Server error during ${kind} update` });
+    }
+};
+
 // ================= COMMANDS CRUD =================
 
 // C: CREATE - Add Single Command
@@ -44,34 +203,27 @@ router.post('/commands/add', async (req, res) => {
     }
 
     try {
-        // Determine the next ID based on existing commands
-        const lastCommand = user.commands.length > 0 ? user.commands[user.commands.length - 1] : { id: 0 };
-        // Use an integer ID for easier sorting/comparison
-        const newId = parseInt(lastCommand.id) + 1; 
-
         const newCommand = {
-            id: newId,
+            id: null, // Allocated atomically by commitChange
             command: command,
             description: description || '',
             last_used: new Date().toISOString().split('T')[0]
         };
 
-        await db.collection('users').updateOne(
-            { _id: user._id },
-            { $push: { commands: newCommand } }
-        );
+        const { rev } = await commitChange(db, user._id, 'commands', async ({ rev, firstId, session }) => {
+            Object.assign(newCommand, { id: formatId('commands', firstId), rev });
+            await db.collection('commands').insertOne(toDocument(user._id, newCommand), { session });
+        }, 1);
 
-        res.json({ success: true, message: 'Command added', command: newCommand });
+        res.json({ success: true, message: 'Command added', command: newCommand, revision: rev });
     } catch (err) {
         console.error('Command Add Error:', err);
         res.status(500).json({ success: false, message: 'Server error during command addition' });
     }
 });
 
-// R: READ - Get All Commands
-router.get('/commands', (req, res) => {
-    res.json({ success: true, commands: req.user.commands || [] });
-});
+// R: READ - Get All Commands (or the delta since ?since=<revision>, or one page with ?limit=)
+router.get('/commands', (req, res) => sendList(req, res, 'commands'));
 
 // U: UPDATE - Update Command details by ID
 router.put('/commands/update', async (req, res) => {
@@ -89,32 +241,38 @@ router.put('/commands/update', async (req, res) => {
 
     try {
         const updateFields = {};
-        if (command) updateFields['commands.$.command'] = command;
-        if (description !== undefined) updateFields['commands.$.description'] = description;
-        if (last_used) updateFields['commands.$.last_used'] = last_used; 
+        if (command) updateFields.command = command;
+        if (description !== undefined) updateFields.description = description;
+        if (last_used) updateFields.last_used = last_used; 
         
         if (Object.keys(updateFields).length === 0) {
             return res.status(400).json({ success: false, message: 'No fields provided for update' });
         }
 
-        const result = await db.collection('users').updateOne(
-            // 1. Find the user AND the command within the array
-            { _id: user._id, 'commands.id': commandId }, 
-            // 2. Use the positional operator ($) to update the matched element
-            { $set: updateFields }
-        );
+        const { rev, matched } = await commitChange(db, user._id, 'commands', async ({ rev, session }) => {
+            const result = await db.collection('commands').updateOne(
+                { owner: user._id, id: commandId },
+                { $set: { ...updateFields, rev } },
+                { session }
+            );
+            return result.matchedCount > 0;
+        });
 
-        if (result.modifiedCount === 0) {
+        if (!matched) {
             return res.status(404).json({ success: false, message: 'Command not found or no change applied' });
         }
 
-        res.json({ success: true, message: `Command ID ${commandId} updated successfully` });
+        res.json({ success: true, message: `Command ID ${commandId} updated successfully`, revision: rev });
     } catch (err) {
         console.error('Command Update Error:', err);
         res.status(500).json({ success: false, message: 'Server error during command update' });
     }
 });
 
+// U: UPDATE - Apply many queued command edits (e.g. last_used bumps) at once
+router.put('/commands/bulk-update', bulkUpdate('commands', { command: requiredText, description: text, last_used: text },
+    id => (Number.isInteger(parseInt(id)) ? parseInt(id) : null)));
+
 // D: DELETE - Remove Command by ID
 router.delete('/commands/remove', async (req, res) => {
     // We will use the ID for the most reliable removal
@@ -129,17 +287,18 @@ router.delete('/commands/remove', async (req, res) => {
     }
 
     try {
-        // Use $pull to remove the item matching the ID from the array
-        const result = await db.collection('users').updateOne(
-            { _id: user._id },
-            { $pull: { commands: { id: commandId } } }
-        );
-
-        if (result.modifiedCount === 0) {
+        // Remove the command's document, leaving a tombstone for delta sync
+        const { rev, matched } = await commitChange(db, user._id, 'commands', async ({ rev, session }) => {
+            const result = await db.collection('commands').deleteOne({ owner: user._id, id: commandId }, { session });
+            if (!result.deletedCount) return false;
+            await pushTombstones(db, user._id, 'commands', [commandId], rev, session);
+        });
+
+        if (!matched) {
             return res.status(404).json({ success: false, message: 'Command not found or already removed' });
         }
 
-        res.json({ success: true, message: `Command ID ${commandId} removed successfully` });
+        res.json({ success: true, message: `Command ID ${commandId} removed successfully`, revision: rev });
     } catch (err) {
         console.error('Command Remove Error:', err);
         res.status(500).json({ success: false, message: 'Server error during command removal' });
@@ -158,22 +317,19 @@ router.post('/commands/import', async (req, res) => {
     }
 
     try {
-        const lastCommand = user.commands.length > 0 ? user.commands[user.commands.length - 1] : { id: 0 };
-        const startingId = parseInt(lastCommand.id) + 1;
-
-        const importedCommands = commands.map((cmd, index) => ({
-            id: startingId + index,
+        const importedCommands = commands.map(cmd => ({
+            id: null,
             last_used: cmd.last_used || new Date().toISOString().split('T')[0],
             command: cmd.command,
             description: cmd.description || ''
         }));
 
-        await db.collection('users').updateOne(
-            { _id: user._id },
-            { $push: { commands: { $each: importedCommands } } }
-        );
+        const { rev } = await commitChange(db, user._id, 'commands', async ({ rev, firstId, session }) => {
+            importedCommands.forEach((cmd, index) => Object.assign(cmd, { id: formatId('commands', firstId + index), rev }));
+            await db.collection('commands').insertMany(importedCommands.map(cmd => toDocument(user._id, cmd)), { session });
+        }, importedCommands.length);
 
-        res.json({ success: true, message: `${importedCommands.length} commands imported`, commands: importedCommands });
+        res.json({ success: true, message: `${importedCommands.length} commands imported`, commands: importedCommands, revision: rev });
     } catch (err) {
         console.error('Command Import Error:', err);
         res.status(500).json({ success: false, message: 'Server error during command import' });
@@ -194,31 +350,95 @@ router.post('/devices/add', async (req, res) => {
     }
 
     try {
-        // Generate new device ID (assuming your existing IDs are strings)
-        const lastDevice = user.devices.length > 0 ? user.devices[user.devices.length - 1] : { id: "0" };
-        const newId = (parseInt(lastDevice.id) + 1).toString();
-
+        // Device IDs are strings, allocated atomically by commitChange
         const newDevice = {
-            id: newId,
+            id: null,
             device,
             ip
         };
 
-        await db.collection('users').updateOne(
-            { _id: user._id },
-            { $push: { devices: newDevice } }
-        );
+        const { rev } = await commitChange(db, user._id, 'devices', async ({ rev, firstId, session }) => {
+            Object.assign(newDevice, { id: formatId('devices', firstId), rev });
+            await db.collection('devices').insertOne(toDocument(user._id, newDevice), { session });
+        }, 1);
 
-        res.json({ success: true, message: 'Device added', device: newDevice });
+        res.json({ success: true, message: 'Device added', device: newDevice, revision: rev });
     } catch (err) {
         console.error('Device Add Error:', err);
         res.status(500).json({ success: false, message: 'Server error during device addition' });
     }
 });
 
-// R: READ - Get All Devices
-router.get('/devices', (req, res) => {
-    res.json({ success: true, devices: req.user.devices || [] });
+// R: READ - Get All Devices (or the delta since ?since=<revision>, or one page with ?limit=)
+router.get('/devices', (req, res) => sendList(req, res, 'devices'));
+
+// C: CREATE - Import Multiple Devices
+/**
+ * Adds a batch of devices in one write. Entries missing a name or IP are reported
+ * per item, and devices whose name/IP pair already exists (in the user's list or
+ * earlier in the batch) are skipped, so re-running an import does not duplicate it.
+ * Only the user's devices sharing an IP with the batch are read for that check.
+ */
+router.post('/devices/import', async (req, res) => {
+    const { devices } = req.body;
+    const db = req.db;
+    const user = req.user;
+
+    if (!Array.isArray(devices) || !devices.length) {
+        return res.status(400).json({ success: false, message: 'An array of devices is required' });
+    }
+
+    try {
+        const deviceKey = (name, ip) => `${String(name).trim().toLowerCase()}|${String(ip).trim()}`;
+        const ips = devices.filter(dev => dev?.ip).flatMap(dev => [String(dev.ip), String(dev.ip).trim()]);
+        const existingDevices = await db.collection('devices')
+            .find({ owner: user._id, ip: { $in: [...new Set(ips)] } }, { projection: { _id: 0, device: 1, ip: 1 } })
+            .toArray();
+        const seen = new Set(existingDevices.map(d => deviceKey(d.device, d.ip)));
+        const accepted = [];
+        const duplicates = [];
+        const errors = [];
+
+        devices.forEach((dev, index) => {
+            if (!dev || !dev.device || !dev.ip) {
+                errors.push({ index, device: dev?.device || null, message: 'Device name and IP are required' });
+                return;
+            }
+            const key = deviceKey(dev.device, dev.ip);
+            if (seen.has(key)) {
+                duplicates.push({ index, device: dev.device, ip: dev.ip });
+                return;
+            }
+            seen.add(key);
+            accepted.push({ device: String(dev.device), ip: String(dev.ip) });
+        });
+
+        if (!accepted.length) {
+            return res.json({
+                success: true, message: '0 devices imported', devices: [], duplicates, errors,
+                revision: currentRevision(user, 'devices')
+            });
+        }
+
+        const importedDevices = accepted.map(dev => ({
+            id: null,
+            device: dev.device,
+            ip: dev.ip
+        }));
+
+        const { rev } = await commitChange(db, user._id, 'devices', async ({ rev, firstId, session }) => {
+            importedDevices.forEach((dev, index) => Object.assign(dev, { id: formatId('devices', firstId + index), rev }));
+            await db.collection('devices').insertMany(importedDevices.map(dev => toDocument(user._id, dev)), { session });
+        }, importedDevices.length);
+
+        res.json({
+            success: true, message: `${importedDevices.length} devices imported`,
+            devices: importedDevices, duplicates, errors, revision: rev
+        });
+    } catch (err) {
+        console.error('Device Import Error:', err);
+        res.status(500).json({ success: false, message: 'Server error during device import' });
+    }
 });
 
 
@@ -237,23 +457,27 @@ router.put('/devices/update', async (req, res) => {
 
     try {
         const updateFields = {};
-        if (device) updateFields['devices.$.device'] = device;
-        if (ip) updateFields['devices.$.ip'] = ip;
+        if (device) updateFields.device = device;
+        if (ip) updateFields.ip = ip;
         
         if (Object.keys(updateFields).length === 0) {
             return res.status(400).json({ success: false, message: 'No fields provided for update' });
         }
 
-        const result = await db.collection('users').updateOne(
-            { _id: user._id, 'devices.id': deviceId }, 
-            { $set: updateFields }
-        );
+        const { rev, matched } = await commitChange(db, user._id, 'devices', async ({ rev, session }) => {
+            const result = await db.collection('devices').updateOne(
+                { owner: user._id, id: deviceId },
+                { $set: { ...updateFields, rev } },
+                { session }
+            );
+            return result.matchedCount > 0;
+        });
 
-        if (result.modifiedCount === 0) {
+        if (!matched) {
             return res.status(404).json({ success: false, message: 'Device not found or no change applied' });
         }
 
-        res.json({ success: true, message: `Device ID ${deviceId} updated successfully` });
+        res.json({ success: true, message: `Device ID ${deviceId} updated successfully`, revision: rev });
     } catch (err) {
         console.error('Device Update Error:', err);
         res.status(500).json({ success: false, message: 'Server error during device update' });
@@ -261,6 +485,10 @@ router.put('/devices/update', async (req, res) => {
 });
 
 
+// U: UPDATE - Apply many queued device edits at once
+router.put('/devices/bulk-update', bulkUpdate('devices', { device: requiredText, ip: requiredText },
+    id => (id === undefined || id === null ? null : id.toString())));
+
 // D: DELETE - Remove Device by ID
 router.delete('/devices/remove', async (req, res) => {
     const { id } = req.body;
@@ -274,22 +502,109 @@ router.delete('/devices/remove', async (req, res) => {
     }
 
     try {
-        // Use $pull to remove the item matching the ID from the array
-        const result = await db.collection('users').updateOne(
-            { _id: user._id },
-            { $pull: { devices: { id: deviceId } } }
-        );
-
-        if (result.modifiedCount === 0) {
+        // Remove the device's document, leaving a tombstone for delta sync
+        const { rev, matched } = await commitChange(db, user._id, 'devices', async ({ rev, session }) => {
+            const result = await db.collection('devices').deleteOne({ owner: user._id, id: deviceId }, { session });
+            if (!result.deletedCount) return false;
+            await pushTombstones(db, user._id, 'devices', [deviceId], rev, session);
+        });
+
+        if (!matched) {
             return res.status(404).json({ success: false, message: 'Device not found or already removed' });
         }
 
-        res.json({ success: true, message: `Device ID ${deviceId} removed successfully` });
+        res.json({ success: true, message: `Device ID ${deviceId} removed successfully`, revision: rev });
     } catch (err) {
         console.error('Device Remove Error:', err);
         res.status(500).json({ success: false, message: 'Server error during device removal' });
     }
 });
 
+// ================= CHANGE FEED =================
+
+// Milliseconds between heartbeats on an /events stream; each one also re-checks the revisions
+const EVENT_HEARTBEAT_MS = parseInt(process.env.EVENT_HEARTBEAT_MS) || 25000;
+
+/**
+ * GET /events?commands=<rev>&devices=<rev> - Server-Sent Events stream of the user's list changes.
+ *
+ * Sends a `change` event, { kind, since, revision, delta, [kind]: items, removed },
+ * whenever a list moves past the revision last sent on this stream: the same body
+ * as `GET /<kind>?since=<since>`, so it is a full list (no `delta`) when the
+ * tombstones no longer reach back that far. The stream starts from the revisions
+ * in the query, so a reconnecting client first receives what it missed; a list
+ * left out of the query is followed from its current revision. Changes that
+ * arrive while an event is being built are coalesced into the next one.
+ */
+router.get('/events', async (req, res) => {
+    let current;
+    try {
+        current = await loadUser(req, { revisions: 1 });
+    } catch (err) {
+        console.error('Events Error:', err);
+        return res.status(500).json({ success: false, message: 'Server error while opening the change feed' });
+    }
+
+    const sent = {}; // kind -> revision the client has (as far as this stream knows)
+    const pending = new Set(); // Kinds that may have moved past sent[kind]
+    for (const kind of KINDS) {
+        const since = parseInt(req.query[kind]);
+        sent[kind] = isNaN(since) ? currentRevision(current, kind) : since;
+        if (sent[kind] !== currentRevision(current, kind)) pending.add(kind);
+    }
+
+    res.set({
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no' // Proxies must not buffer the stream
+    });
+    res.flushHeaders();
+    res.write(': connected\n\n');
+
+    let closed = false;
+    let sending = false;
+    const send = async () => {
+        if (sending || closed) return;
+        sending = true;
+        try {
+            while (pending.size && !closed) {
+                const kinds = [...pending];
+                pending.clear();
+                const doc = await loadUser(req, { revisions: 1 });
+                for (const kind of kinds) {
+                    if (currentRevision(doc, kind) === sent[kind]) continue;
+                    const listed = await loadUser(req, { revisions: 1, [`tombstones.${kind}`]: 1 });
+                    const { body: { success, ...change } } = await listResponse(req.db, listed, kind, null, sent[kind]);
+                    if (closed) return;
+                    res.write(`event: change\ndata: ${JSON.stringify({ kind, since: sent[kind], ...change })}\n\n`);
+                    sent[kind] = change.revision;
+                }
+            }
+        } catch (err) {
+            console.error('Events Error:', err);
+            res.end(); // The client reconnects and resumes from its revisions
+        } finally {
+            sending = false;
+        }
+    };
+
+    const unsubscribe = changeFeed.subscribe(req.user._id, ({ kind }) => {
+        pending.add(kind);
+        send();
+    });
+    const heartbeat = setInterval(() => {
+        res.write(': heartbeat\n\n');
+        KINDS.forEach(kind => pending.add(kind)); // Catches changes committed by other server processes
+        send();
+    }, EVENT_HEARTBEAT_MS);
+    res.on('close', () => {
+        closed = true;
+        clearInterval(heartbeat);
+        unsubscribe();
+    });
+    send();
+});
+
 
 module.exports = router;
\ No newline at end of file
@@ -3,6 +3,7 @@
 const express = require('express');
 const cors = require('cors');
 const { connectToMongo, dbMiddleware } = require('./db');
+const { wireFormat } = require('./wireFormat');
 const authRoutes = require('./routes/authRoutes');
 const dataRoutes = require('./routes/dataRoutes');
 
@@ -11,12 +12,15 @@ const port = 3030;
 
 // Middleware
 app.use(cors());
-app.use(express.json());
+app.use(express.json()); // Also inflates gzip/deflate/br request bodies (see wireFormat.js)
 app.use(express.urlencoded({ extended: true }));
 
 // Apply database middleware to all requests that need it
 app.use(dbMiddleware); 
 
+// Compress responses and send MessagePack to clients that ask for it
+app.use(wireFormat);
+
 // --- Route Handlers ---
 
 // Base route for authentication (e.g., /login)
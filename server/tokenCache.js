@@ -0,0 +1,88 @@
+// tokenCache.js
+
+/**
+ * In-process cache of resolved access tokens.
+ *
+ * checkToken used to load the whole user document (every command and device) on
+ * each request just to authenticate. It now stores the lean identity it needs,
+ * { _id, username, revisions }, here: an LRU map with a TTL, so repeated requests
+ * with the same token skip the database. Every mutation invalidates the user's
+ * entry (see commitChange), so the cached revisions are exact for this process;
+ * changes made by another process become visible within the TTL.
+ */
+
+// Tokens kept before the least recently used one is dropped
+const TOKEN_CACHE_SIZE = parseInt(process.env.TOKEN_CACHE_SIZE) || 10000;
+// Milliseconds a resolved token is trusted; 0 disables the cache
+const TOKEN_CACHE_TTL_MS = parseInt(process.env.TOKEN_CACHE_TTL_MS ?? 30000);
+
+class TokenCache {
+    /**
+     * @param {number} maxSize Entries kept (least recently used evicted first).
+     * @param {number} ttlMs Lifetime of an entry in milliseconds; 0 disables caching.
+     */
+    constructor(maxSize = TOKEN_CACHE_SIZE, ttlMs = TOKEN_CACHE_TTL_MS) {
+        this.maxSize = maxSize;
+        this.ttlMs = ttlMs;
+        this.entries = new Map(); // token -> { user, expires }, in recency order (a Map keeps insertion order)
+        this.tokensByUser = new Map(); // String(_id) -> token, for invalidation on mutation
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    /**
+     * Returns the cached user for a token, or undefined if absent or expired.
+     */
+    get(token) {
+        const entry = this.entries.get(token);
+        if (!entry || entry.expires <= Date.now()) {
+            if (entry) this.delete(token);
+            this.misses++;
+            return undefined;
+        }
+        // Re-insert to mark as most recently used
+        this.entries.delete(token);
+        this.entries.set(token, entry);
+        this.hits++;
+        return entry.user;
+    }
+
+    set(token, user) {
+        if (!this.ttlMs) return;
+        this.delete(token);
+        this.entries.set(token, { user, expires: Date.now() + this.ttlMs });
+        this.tokensByUser.set(String(user._id), token);
+        while (this.entries.size > this.maxSize) {
+            this.delete(this.entries.keys().next().value);
+        }
+    }
+
+    delete(token) {
+        const entry = this.entries.get(token);
+        if (!entry) return;
+        this.entries.delete(token);
+        const key = String(entry.user._id);
+        if (this.tokensByUser.get(key) === token) this.tokensByUser.delete(key);
+    }
+
+    /**
+     * Drops the entry of a user whose document changed (revisions, or the token itself).
+     */
+    invalidateUser(userId) {
+        const token = this.tokensByUser.get(String(userId));
+        if (token !== undefined) this.delete(token);
+    }
+
+    clear() {
+        this.entries.clear();
+        this.tokensByUser.clear();
+    }
+}
+
+// Shared by checkToken and commitChange
+const tokenCache = new TokenCache();
+
+module.exports = {
+    TokenCache,
+    tokenCache,
+};